@@ -1,22 +1,83 @@
 import os
+import io
+import sys
 import json
 import re
+import time
+import queue
+import asyncio
+import contextlib
+import threading
+import contextvars
+import weakref
+import sqlite3
+import codecs
+import zlib
+import math
+from collections import namedtuple, OrderedDict, deque
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor, Future
+import charset_normalizer
+import httpx
 import requests
-from urllib.parse import quote_plus
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import quote_plus, urlsplit, urlunsplit, parse_qsl, urlencode
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, g, abort
+from werkzeug.exceptions import HTTPException
+from werkzeug.datastructures import EnvironHeaders
+from werkzeug.routing import Map, Rule
+from werkzeug.http import parse_options_header
+from jinja2 import ChoiceLoader, FileSystemLoader, PrefixLoader
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from markupsafe import escape
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Task.uncancel() (stoppable) and create_task(context=) (AsgiApp) are 3.11+
+if sys.version_info < (3, 11):
+    sys.exit('Local AI Box needs Python 3.11 or newer')
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'local-ai-stable-key-2026')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///local.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///local.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 OLLAMA_BASE = os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
 SD_BASE = os.environ.get('SD_HOST', 'http://localhost:7860')
 
+# Prompt budget per chat turn (see build_context)
+CONTEXT_DEFAULT_TOKENS = int(os.environ.get('CONTEXT_DEFAULT_TOKENS', 4096))
+CONTEXT_RESPONSE_TOKENS = int(os.environ.get('CONTEXT_RESPONSE_TOKENS', 1024))
+CONTEXT_MAX_MESSAGES = int(os.environ.get('CONTEXT_MAX_MESSAGES', 60))
+CONTEXT_SUMMARIES = os.environ.get('CONTEXT_SUMMARIES', '0') == '1'
+
+# Upstream HTTP connection pools (see HttpPools)
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 16))
+HTTP_STREAM_POOL_SIZE = int(os.environ.get('HTTP_STREAM_POOL_SIZE', 256))  # async token streams
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_KEEPALIVE = os.environ.get('HTTP_KEEPALIVE', '1') != '0'
+
+# SQLite connection tuning (see set_sqlite_pragmas)
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')  # safe with WAL; FULL for paranoia
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_CACHE_MB = int(os.environ.get('SQLITE_CACHE_MB', 32))
+
+# Keyset page sizes for the sidebar, message history and image gallery
+CONVERSATION_PAGE = int(os.environ.get('CONVERSATION_PAGE', 50))
+MESSAGE_PAGE = int(os.environ.get('MESSAGE_PAGE', 40))
+IMAGE_PAGE = int(os.environ.get('IMAGE_PAGE', 50))
+MAX_PAGE = 200
+DB_WRITE_BATCH = int(os.environ.get('DB_WRITE_BATCH', 64))  # max writes per group commit
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))  # seconds a logged-in user's row is reused
+# Usernames that see process-wide /api/stats (every user's pools, backends and queues)
+STATS_ADMINS = frozenset(u.strip() for u in os.environ.get('STATS_ADMINS', '').split(',') if u.strip())
+
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
@@ -38,6 +99,15 @@ class User(UserMixin, db.Model):
     def check_password(self, pw):
         return check_password_hash(self.password_hash, pw)
 
+    def info(self):
+        """Read-only snapshot served as current_user (see UserDirectory)."""
+        return SessionUser(self.id, self.username, self.default_model, self.default_personality)
+
+
+class SessionUser(UserMixin, namedtuple('SessionUser', 'id username default_model default_personality')):
+    """current_user for requests after login; load the User row to change settings."""
+    __slots__ = ()
+
 
 class Conversation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -47,9 +117,13 @@ class Conversation(db.Model):
     personality = db.Column(db.String(120), default='default')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    summary = db.Column(db.Text, default='')         # rolling summary of messages that left the window
+    summary_upto = db.Column(db.Integer, default=0)  # last Message.id folded into summary
     messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan',
                                order_by='Message.created_at')
 
+    __table_args__ = (db.Index('ix_conversation_user_updated', 'user_id', 'updated_at'),)
+
 
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -58,6 +132,8 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index('ix_message_conversation_created', 'conversation_id', 'created_at'),)
+
 
 class Backend(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -67,6 +143,7 @@ class Backend(db.Model):
     base_url = db.Column(db.String(500), nullable=False)
     api_key = db.Column(db.String(500), default='')
     is_default = db.Column(db.Boolean, default=False)
+    pool = db.Column(db.String(120), default='')  # backends with the same pool name serve the same models
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # kind presets
@@ -78,6 +155,15 @@ class Backend(db.Model):
         'custom':   {'url': 'http://localhost:8000',  'name': 'Custom (OpenAI-compatible)'},
     }
 
+    def info(self):
+        """Plain snapshot, safe to hand to other threads and the stream engine."""
+        return BackendInfo(self.id, self.name, self.kind, self.base_url, self.api_key or '', bool(self.is_default),
+                           self.pool or '')
+
+
+# peers: the other members of the backend's pool, filled in by BackendDirectory
+BackendInfo = namedtuple('BackendInfo', 'id name kind base_url api_key is_default pool peers', defaults=((),))
+
 
 class GeneratedImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -93,16 +179,875 @@ class GeneratedImage(db.Model):
     filename = db.Column(db.String(300), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index('ix_generated_image_user_created', 'user_id', 'created_at'),)
+
+
+class WebCacheEntry(db.Model):
+    """Persisted WebCache entry (only written when WEB_CACHE_PERSIST=1)."""
+    key = db.Column(db.String(1024), primary_key=True)
+    value = db.Column(db.Text, nullable=False)  # JSON
+    etag = db.Column(db.String(300))
+    last_modified = db.Column(db.String(100))
+    expires_at = db.Column(db.Float, nullable=False)
+
+
+class UserDirectory:
+    """SessionUser snapshots by id, so authenticating a request (every SSE and poll
+    included) doesn't query the user row.
+
+    Entries live for USER_CACHE_TTL seconds and are dropped by the settings route.
+    The cache is per process: other workers see a change once their entry expires.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(user_id)
+        if hit and hit[0] > now:
+            return hit[1]
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        info = user.info()
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, info)
+        return info
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+user_directory = UserDirectory(USER_CACHE_TTL)
+
 
 @login_manager.user_loader
 def load_user(uid):
-    return db.session.get(User, int(uid))
+    return user_directory.get(int(uid))
+
+# ─── Storage ──────────────────────────────────────────────────────────
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_conn, _record):
+    """WAL lets readers run alongside the single writer; busy_timeout makes writers queue instead of failing."""
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    cur = dbapi_conn.cursor()
+    cur.execute('PRAGMA journal_mode=WAL')
+    cur.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+    cur.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cur.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}')
+    cur.execute('PRAGMA temp_store=MEMORY')
+    cur.close()
+
+
+class WriteBatcher:
+    """Group commit for writes made off the request thread.
+
+    Callers submit `fn(conn)`; a single writer thread runs everything queued at
+    that moment in one transaction, so concurrent streams finishing together
+    share a commit instead of contending for SQLite's write lock. If a batch
+    fails, its writes are retried one transaction each so one bad write does
+    not take the others down.
+    """
+
+    def __init__(self, max_batch):
+        self.max_batch = max_batch
+        self._engine = None
+        self._queue = queue.SimpleQueue()
+        self.batches = 0
+        self.writes = 0
+
+    def start(self, engine):
+        self._engine = engine
+        threading.Thread(target=self._writer, name='db-writer', daemon=True).start()
+
+    def submit(self, fn):
+        """Queue fn(conn); returns a concurrent Future with its result."""
+        fut = Future()
+        self._queue.put((fn, fut))
+        return fut
+
+    def run(self, fn):
+        return self.submit(fn).result()
+
+    async def arun(self, fn):
+        return await asyncio.wrap_future(self.submit(fn))
+
+    def _writer(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get())
+            try:
+                with self._engine.begin() as conn:
+                    results = [fn(conn) for fn, _ in batch]
+            except Exception:
+                for fn, fut in batch:
+                    self._run_one(fn, fut)
+            else:
+                for (_, fut), result in zip(batch, results):
+                    fut.set_result(result)
+            self.batches += 1
+            self.writes += len(batch)
+
+    def _run_one(self, fn, fut):
+        try:
+            with self._engine.begin() as conn:
+                result = fn(conn)
+        except Exception as e:
+            fut.set_exception(e)
+        else:
+            fut.set_result(result)  # only once committed, like a batch
+
+    def stats(self):
+        return {'writes': self.writes, 'batches': self.batches,
+                'avg_batch': round(self.writes / self.batches, 2) if self.batches else 0}
+
+
+db_writes = WriteBatcher(DB_WRITE_BATCH)
+
+# ─── Async stream engine ──────────────────────────────────────────────
+
+class AppError(Exception):
+    """Rejects a streaming request before the stream starts (rendered as a JSON error)."""
+
+    def __init__(self, message, status=400, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after  # seconds, sent as Retry-After (429/503)
+
+    def response(self):
+        body = {'error': self.message}
+        headers = {}
+        if self.retry_after is not None:
+            body['retry_after'] = self.retry_after
+            headers['Retry-After'] = str(self.retry_after)
+        return Response(json.dumps(body), self.status, headers=headers, mimetype='application/json')
+
+
+ENGINE_READ_AHEAD = 64  # items an engine stream may run ahead of a slow WSGI consumer
+
+
+class StreamEngine:
+    """One background asyncio loop that multiplexes every upstream token stream.
+
+    WSGI views consume async generators through iterate(); under ASGI (asgi_app)
+    the same generators run directly on the server's loop.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='stream-engine', daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def iterate(self, agen):
+        """Drive an async generator on the engine loop and yield its items in this thread.
+
+        Closing the returned iterator cancels the async side, which closes the upstream response.
+        At most ENGINE_READ_AHEAD items wait in the handoff; past that the async side
+        awaits a free slot, so a slow client slows the upstream read instead of
+        buffering without limit.
+        """
+        loop = self.loop
+        q = queue.SimpleQueue()
+        slots = asyncio.Semaphore(ENGINE_READ_AHEAD)
+
+        async def pump():
+            try:
+                async for item in agen:
+                    await slots.acquire()
+                    q.put((True, item))
+            except BaseException as e:
+                q.put((False, e))
+                raise
+            q.put((False, None))
+
+        fut = asyncio.run_coroutine_threadsafe(pump(), loop)
+        try:
+            while True:
+                ok, item = q.get()
+                if ok:
+                    loop.call_soon_threadsafe(slots.release)
+                    yield item
+                elif item is None:
+                    return
+                else:
+                    raise item
+        finally:
+            fut.cancel()
+
+
+engine = StreamEngine()
+
+# User id for async handlers (there is no Flask request context on the loop)
+stream_user_id = contextvars.ContextVar('stream_user_id', default=None)
+
+
+async def run_sync(fn, *args, **kwargs):
+    """Run blocking work (DB, requests) in a worker thread with an app context."""
+    def call():
+        with app.app_context():
+            return fn(*args, **kwargs)
+    return await asyncio.to_thread(call)
+
+
+class StreamHandle:
+    """A running stream that its client may stop (POST /api/streams/<id>/stop).
+
+    stop() only cancels the stream's task while it is armed, i.e. awaiting the
+    next upstream item, so the cancellation always lands where stoppable()
+    catches it.
+    """
+
+    def __init__(self, user_id, stream_id):
+        self.user_id = user_id
+        self.stream_id = stream_id
+        self.stopped = False
+        self._task = None
+        self._loop = None
+
+    def arm(self):
+        self._task = asyncio.current_task()
+        self._loop = self._task.get_loop()
+
+    def disarm(self):
+        self._task = None
+
+    def stop(self):
+        self.stopped = True
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._cancel)
+
+    def _cancel(self):
+        # Runs on the stream's loop, so arm/disarm can't race it
+        if self._task:
+            self._task.cancel()
+
+
+class ActiveStreams:
+    """Running streams by (user id, client-chosen X-Stream-Id)."""
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def open(self, user_id, stream_id):
+        """Register a handle for the stream's lifetime (None when the client sent no id)."""
+        if not stream_id:
+            yield None
+            return
+        handle = StreamHandle(user_id, stream_id)
+        key = (user_id, stream_id)
+        with self._lock:
+            self._streams[key] = handle
+        try:
+            yield handle
+        finally:
+            with self._lock:
+                if self._streams.get(key) is handle:
+                    del self._streams[key]
+
+    def stop(self, user_id, stream_id):
+        with self._lock:
+            handle = self._streams.get((user_id, stream_id))
+        if handle:
+            handle.stop()
+        return handle is not None
+
+    def __len__(self):
+        return len(self._streams)
+
+
+active_streams = ActiveStreams()
+
+
+def request_stream_id():
+    return request.headers.get('X-Stream-Id', '')[:64] or None
+
+
+def request_stream_resume():
+    """The client will reconnect after a drop (X-Stream-Resume: 1), so a detached
+    generation is worth keeping for STREAM_RESUME_GRACE; otherwise a disconnect
+    aborts it at once."""
+    return request.headers.get('X-Stream-Resume') == '1'
+
+
+async def stoppable(events, handle):
+    """Yield from events until the handle is stopped; the interrupted generator closes its upstream."""
+    if handle is None:
+        async for item in events:
+            yield item
+        return
+    try:
+        while not handle.stopped:
+            handle.arm()
+            try:
+                item = await events.__anext__()
+            except StopAsyncIteration:
+                return
+            except asyncio.CancelledError:
+                if not handle.stopped:
+                    raise  # client disconnect / shutdown, not a stop request
+                asyncio.current_task().uncancel()
+                return
+            finally:
+                handle.disarm()
+            yield item
+    finally:
+        await events.aclose()
+
+
+STREAM_BUFFER_EVENTS = int(os.environ.get('STREAM_BUFFER_EVENTS', 1024))  # replayable events per generation
+STREAM_RESUME_GRACE = float(os.environ.get('STREAM_RESUME_GRACE', 15))     # seconds a detached generation keeps running
+
+
+class SSEEvent(dict):
+    """An event with an SSE id, sent as an `id:` line so the client can resume from it."""
+
+    __slots__ = ('id',)
+
+    def __init__(self, data, event_id):
+        super().__init__(data)
+        self.id = event_id
+
+
+class Generation:
+    """A resumable stream: runs as its own task and keeps its newest events in a ring buffer.
+
+    Followers replay from the buffer and then wait for live events. When the
+    last follower drops, the generation keeps going for STREAM_RESUME_GRACE
+    seconds; after that it is cancelled like a disconnected stream. A follower
+    further behind than the buffer gets one 'resync' event carrying the text of
+    everything that was evicted.
+    """
+
+    def __init__(self, registry, key, events):
+        self.registry = registry
+        self.key = key
+        self.events = events
+        self.buffer = deque(maxlen=STREAM_BUFFER_EVENTS)
+        self.seq = 0
+        self.evicted = {'text': [], 'reasoning': []}
+        self.finished = False
+        self.followers = 0
+        self.task = None
+        self._changed = None
+        self._expiry = None
+
+    def event_id(self, seq):
+        return f'{self.key[1]}:{seq}'
+
+    def parse_event_id(self, value):
+        """Sequence number from a Last-Event-ID header (0 = from the start)."""
+        stream_id, _, seq = (value or '').rpartition(':')
+        return int(seq) if stream_id == self.key[1] and seq.isdigit() else 0
+
+    def _append(self, ev):
+        if len(self.buffer) == self.buffer.maxlen:
+            _, old = self.buffer[0]
+            for key, parts in (('token', self.evicted['text']), ('reasoning', self.evicted['reasoning'])):
+                if isinstance(old.get(key), str):
+                    parts.append(old[key])
+        self.seq += 1
+        self.buffer.append((self.seq, ev))
+        self._wake()
+
+    def _wake(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _run(self):
+        try:
+            async for ev in self.events:
+                self._append(ev)
+        except Exception as e:
+            self._append({'error': str(e)})
+        finally:
+            self.finished = True
+            self._wake()
+            await self.events.aclose()
+            asyncio.get_running_loop().call_later(STREAM_RESUME_GRACE, self.registry.discard, self)
+
+    def _expire(self):
+        if not self.followers and not self.finished:
+            self.task.cancel()
+
+    async def follow(self, after=0):
+        """Events after sequence number `after` (as SSEEvents), then live ones until the end."""
+        loop = asyncio.get_running_loop()
+        if self.task is None:
+            self._changed = asyncio.Event()
+            self.task = loop.create_task(self._run())
+        self.followers += 1
+        if self._expiry:
+            self._expiry.cancel()
+            self._expiry = None
+        try:
+            while True:
+                while after < self.seq:
+                    first = self.seq - len(self.buffer) + 1
+                    if after + 1 < first:
+                        after = first - 1
+                        yield {'resync': {k: ''.join(v) for k, v in self.evicted.items()}}
+                        continue
+                    seq, ev = self.buffer[after + 1 - first]
+                    after = seq
+                    yield SSEEvent(ev, self.event_id(seq))
+                changed = self._changed
+                if self.finished:
+                    return
+                await changed.wait()
+        finally:
+            self.followers -= 1
+            if not self.followers and not self.finished:
+                self._expiry = loop.call_later(STREAM_RESUME_GRACE, self._expire)
+
+
+class Generations:
+    """Resumable generations by (user id, client stream id)."""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def start(self, user_id, stream_id, events):
+        gen = Generation(self, (user_id, stream_id), events)
+        with self._lock:
+            self._items[gen.key] = gen
+        return gen
+
+    def get(self, user_id, stream_id):
+        return self._items.get((user_id, stream_id))
+
+    def discard(self, gen):
+        with self._lock:
+            if self._items.get(gen.key) is gen:
+                del self._items[gen.key]
+
+    def stats(self, user_id=None):
+        with self._lock:
+            items = [gen for gen in self._items.values() if user_id is None or gen.key[0] == user_id]
+        return {'live': sum(1 for gen in items if not gen.finished),
+                'detached': sum(1 for gen in items if not gen.finished and gen.task and not gen.followers)}
+
+
+generations = Generations()
+
+
+# Admission caps and queue limits are per process: each worker admits up to them on
+# its own, so N workers let a backend see up to N * LLM_BACKEND_CONCURRENCY streams
+LLM_USER_CONCURRENCY = int(os.environ.get('LLM_USER_CONCURRENCY', 4))        # generations one user runs at once
+LLM_BACKEND_CONCURRENCY = int(os.environ.get('LLM_BACKEND_CONCURRENCY', 8))  # per backend (per pool member)
+LLM_GLOBAL_CONCURRENCY = int(os.environ.get('LLM_GLOBAL_CONCURRENCY', 0))    # 0 = no global cap
+LLM_QUEUE_MAX = int(os.environ.get('LLM_QUEUE_MAX', 64))                     # waiting generations, all users
+LLM_USER_QUEUE_MAX = int(os.environ.get('LLM_USER_QUEUE_MAX', 8))            # waiting generations per user
+# Share of slots by request class: interactive chat ahead of app batches ahead of summaries
+ADMISSION_WEIGHTS = {'chat': 2, 'app': 1, 'background': 0.5}
+
+
+class AdmissionTicket:
+    """One generation's claim on an LLM slot; wait() queues it, release() frees it."""
+
+    def __init__(self, control, user_id, backend, weight):
+        self.control = control
+        self.user_id = user_id
+        # Backend rows are per user, so the cap is keyed by server URL(s): users sharing a GPU share its slots
+        if backend is None:
+            self.backend_key, self.backend_limit = None, 0
+        else:
+            members = (backend,) + backend.peers
+            self.backend_key = tuple(sorted({b.base_url.rstrip('/') for b in members}))
+            self.backend_limit = LLM_BACKEND_CONCURRENCY * len(self.backend_key)
+        self.weight = ADMISSION_WEIGHTS.get(weight, 1)
+        self.tag = 0.0
+        self.state = 'new'  # waiting | running | done
+        self.started_at = None
+        self._waiter = None
+
+    async def wait(self):
+        """Yield queue positions until a slot is granted (nothing if one is free).
+
+        Raises AppError(429) when the queue is full. Closing the iterator early
+        gives the place (or slot) back.
+        """
+        admitted = False
+        try:
+            self.control.enqueue(self)
+            last = None
+            while True:
+                with self.control.lock:
+                    if self.state == 'running':
+                        admitted = True
+                        return
+                    position = self.control.position(self)
+                    loop = asyncio.get_running_loop()
+                    self._waiter = (loop, loop.create_future())
+                if position != last:
+                    last = position
+                    yield position
+                await self._waiter[1]
+        finally:
+            if not admitted:
+                self.release()
+
+    def release(self):
+        self.control.release(self)
+
+    def wake(self):
+        if self._waiter:
+            loop, fut = self._waiter
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(None))
+
+
+class Admission:
+    """Concurrency caps per user, per backend and overall, with a weighted fair queue.
+
+    Waiting tickets are ordered by start-time fair queueing: each gets the tag
+    max(virtual time, the user's previous tag) + 1/weight, and the lowest
+    eligible tag runs next. A user queueing a batch therefore interleaves with
+    everyone else instead of going ahead of them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.running = 0
+        self.user_running = {}
+        self.backend_running = {}
+        self._last_tag = {}
+        self._vtime = 0.0
+        self._avg_hold = 10.0  # seconds a slot is held, smoothed; drives Retry-After
+        self.admitted = 0
+        self.rejected = 0
+
+    def ticket(self, user_id, backend=None, weight='chat'):
+        return AdmissionTicket(self, user_id, backend, weight)
+
+    def check(self, user_id):
+        """Raise AppError(429) now if a new generation for this user would overflow the queue."""
+        with self.lock:
+            self._check(user_id)
+
+    def _check(self, user_id):
+        user_waiting = sum(1 for t in self.waiting if t.user_id == user_id)
+        if len(self.waiting) >= LLM_QUEUE_MAX or user_waiting >= LLM_USER_QUEUE_MAX:
+            self.rejected += 1
+            slots = LLM_GLOBAL_CONCURRENCY or max(self.running, 1)
+            retry_after = min(max(math.ceil(self._avg_hold * (len(self.waiting) + 1) / slots), 1), 120)
+            raise AppError('Too many generations queued, try again shortly', 429, retry_after)
+
+    def enqueue(self, ticket):
+        with self.lock:
+            self._check(ticket.user_id)
+            ticket.tag = max(self._vtime, self._last_tag.get(ticket.user_id, 0.0)) + 1 / ticket.weight
+            self._last_tag[ticket.user_id] = ticket.tag
+            ticket.state = 'waiting'
+            self.waiting.append(ticket)
+            self._dispatch()
+
+    def position(self, ticket):
+        return 1 + sum(1 for t in self.waiting if t.tag < ticket.tag)
+
+    def release(self, ticket):
+        with self.lock:
+            if ticket.state == 'waiting':
+                self.waiting.remove(ticket)
+            elif ticket.state == 'running':
+                self.running -= 1
+                self.user_running[ticket.user_id] -= 1
+                if ticket.backend_key is not None:
+                    self.backend_running[ticket.backend_key] -= 1
+                    if not self.backend_running[ticket.backend_key]:
+                        del self.backend_running[ticket.backend_key]
+                self._avg_hold += (time.monotonic() - ticket.started_at - self._avg_hold) * 0.2
+            ticket.state = 'done'
+            if not self.user_running.get(ticket.user_id) and all(t.user_id != ticket.user_id for t in self.waiting):
+                # An idle user starts again from the virtual time, so their entries can go
+                self.user_running.pop(ticket.user_id, None)
+                self._last_tag.pop(ticket.user_id, None)
+            self._dispatch()
+
+    def _eligible(self, t):
+        return (self.user_running.get(t.user_id, 0) < LLM_USER_CONCURRENCY
+                and (t.backend_key is None or self.backend_running.get(t.backend_key, 0) < t.backend_limit)
+                and (not LLM_GLOBAL_CONCURRENCY or self.running < LLM_GLOBAL_CONCURRENCY))
+
+    def _dispatch(self):
+        while True:
+            ready = [t for t in self.waiting if self._eligible(t)]
+            if not ready:
+                break
+            t = min(ready, key=lambda t: t.tag)
+            self.waiting.remove(t)
+            t.state = 'running'
+            t.started_at = time.monotonic()
+            self.running += 1
+            self.user_running[t.user_id] = self.user_running.get(t.user_id, 0) + 1
+            if t.backend_key is not None:
+                self.backend_running[t.backend_key] = self.backend_running.get(t.backend_key, 0) + 1
+            self._vtime = t.tag
+            self.admitted += 1
+            t.wake()
+        for t in self.waiting:
+            t.wake()  # positions may have moved
+
+    def user_stats(self, user_id):
+        with self.lock:
+            return {'running': self.user_running.get(user_id, 0),
+                    'waiting': sum(1 for t in self.waiting if t.user_id == user_id)}
+
+    def stats(self):
+        with self.lock:
+            return {'running': self.running, 'waiting': len(self.waiting), 'admitted': self.admitted,
+                    'rejected': self.rejected, 'avg_hold_s': round(self._avg_hold, 1),
+                    'limits': {'user': LLM_USER_CONCURRENCY, 'backend': LLM_BACKEND_CONCURRENCY,
+                               'global': LLM_GLOBAL_CONCURRENCY}}
+
+
+admission = Admission()
+
+# Ticket held by the current stream_route handler, so platform.astream doesn't queue twice
+stream_ticket = contextvars.ContextVar('stream_ticket', default=None)
+
+
+async def admitted(ticket, events):
+    """Wait for the ticket's slot (without queue events), stream, then free the slot."""
+    async for _ in ticket.wait():
+        pass
+    try:
+        async for item in events:
+            yield item
+    finally:
+        ticket.release()
+
+
+async def as_user(events, user_id, stream_id=None, backend=None):
+    stream_user_id.set(user_id)
+    ticket = admission.ticket(user_id, backend, 'app')
+    stream_ticket.set(ticket)
+    try:
+        async for position in ticket.wait():
+            yield {'status': 'queued', 'position': position}
+        with active_streams.open(user_id, stream_id) as handle:
+            async for item in stoppable(events, handle):
+                yield item
+            if handle and handle.stopped:
+                yield {'done': True, 'stopped': True}
+    finally:
+        ticket.release()
+
+
+def sse_frame(data):
+    return f"data: {json.dumps(data)}\n\n"
+
+
+SSE_FLUSH_MS = float(os.environ.get('SSE_FLUSH_MS', 20))        # max delay before coalesced tokens go out
+SSE_FLUSH_BYTES = int(os.environ.get('SSE_FLUSH_BYTES', 256))   # ...or as soon as this much text is pending
+SSE_GZIP = os.environ.get('SSE_GZIP', '1') == '1'               # allow gzip for clients that ask for it
+SSE_QUEUE = 64                                                  # events read ahead of a slow client
+
+
+class SSEWriter:
+    """Encodes one response's event stream as SSE bytes.
+
+    Clients opt in with an `X-Stream-Format` request header listing `compact`
+    and/or `gzip`; without it every event is one `data: {json}` frame, as
+    before. In compact mode consecutive token events are merged and flushed
+    every SSE_FLUSH_MS or SSE_FLUSH_BYTES, token frames are a bare JSON string
+    and keys that ride along with tokens (conversation_id) are sent only when
+    they change.
+    """
+
+    COALESCE = ('token', 'reasoning')
+
+    def __init__(self, compact=False, gzip=False):
+        self.compact = compact
+        self.gzip = gzip
+        self._deflate = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+        self._extras = {}  # keys last sent with a token frame
+
+    @classmethod
+    def negotiate(cls, headers):
+        options = {o.strip().lower() for o in headers.get('X-Stream-Format', '').split(',')}
+        gzip = SSE_GZIP and 'gzip' in options and 'gzip' in headers.get('Accept-Encoding', '').lower()
+        return cls('compact' in options, gzip)
+
+    @property
+    def headers(self):
+        """Response headers for the negotiated format (besides the content type)."""
+        headers = [('Cache-Control', 'no-cache'), ('Vary', 'X-Stream-Format')]
+        if self.compact:
+            headers.append(('X-Stream-Format', 'compact'))
+        if self.gzip:
+            headers.append(('Content-Encoding', 'gzip'))
+        return headers
+
+    def encode(self, text, final=False):
+        data = text.encode()
+        if self._deflate:
+            data = self._deflate.compress(data) + self._deflate.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        return data
+
+    def frame(self, ev, event_id=None):
+        prefix = f'id: {event_id}\n' if event_id else ''
+        if not self.compact:
+            return prefix + sse_frame(ev)
+        return f"{prefix}data: {json.dumps(ev, separators=(',', ':'))}\n\n"
+
+    def text_frame(self, key, text, extras, event_id=None):
+        if key == 'token' and extras == self._extras:
+            prefix = f'id: {event_id}\n' if event_id else ''
+            return f"{prefix}data: {json.dumps(text)}\n\n"
+        if key == 'token':
+            self._extras = extras
+        return self.frame({key: text, **extras}, event_id)
+
+    async def frames(self, events):
+        """Encoded chunks for an async event generator.
+
+        Errors before the first chunk propagate (so AppError can still become a
+        JSON response); later ones end the stream with an error frame.
+        """
+        started = False
+        chunks = self._coalesce(events) if self.compact else self._plain(events)
+        try:
+            async for text in chunks:
+                started = True
+                yield self.encode(text)
+        except Exception as e:
+            if not started:
+                raise
+            yield self.encode(self.frame({'error': str(e)}), final=True)
+            return
+        finally:
+            # Close explicitly (not at GC) so an abandoned stream releases its upstream now
+            await chunks.aclose()
+            await events.aclose()
+        if self.gzip:
+            yield self.encode('', final=True)
+
+    async def _plain(self, events):
+        async for ev in events:
+            yield self.frame(ev, getattr(ev, 'id', None))
+
+    async def _coalesce(self, events):
+        loop = asyncio.get_running_loop()
+        q = asyncio.Queue(SSE_QUEUE)
+
+        async def produce():
+            # One task runs the whole generator, so context vars it sets (as_user) persist
+            try:
+                async for ev in events:
+                    await q.put((True, ev))
+            except Exception as e:
+                await q.put((False, e))
+            else:
+                await q.put((False, None))
+
+        producer = asyncio.create_task(produce())
+        key, extras, parts, size, deadline = None, None, [], 0, None
+        last_id = None  # SSE id of the newest merged event
+        try:
+            while True:
+                try:
+                    ok, ev = q.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                    try:
+                        ok, ev = await asyncio.wait_for(q.get(), timeout)
+                    except asyncio.TimeoutError:
+                        yield self.text_frame(key, ''.join(parts), extras, last_id)
+                        key, parts, size, deadline = None, [], 0, None
+                        continue
+                if not ok:
+                    if parts:
+                        yield self.text_frame(key, ''.join(parts), extras, last_id)
+                    if ev is not None:
+                        raise ev
+                    return
+
+                ev_key = next((k for k in self.COALESCE if isinstance(ev.get(k), str)), None)
+                ev_extras = {k: v for k, v in ev.items() if k != ev_key} if ev_key else None
+                out = ''
+                if parts and (ev_key != key or ev_extras != extras):
+                    out = self.text_frame(key, ''.join(parts), extras, last_id)
+                    key, parts, size, deadline = None, [], 0, None
+                if ev_key is None:
+                    yield out + self.frame(ev, getattr(ev, 'id', None))  # status/done/etc. go out immediately
+                    continue
+                if not parts:
+                    key, extras, deadline = ev_key, ev_extras, loop.time() + SSE_FLUSH_MS / 1000
+                parts.append(ev[ev_key])
+                size += len(ev[ev_key])
+                last_id = getattr(ev, 'id', None)
+                if size >= SSE_FLUSH_BYTES or loop.time() >= deadline:
+                    out += self.text_frame(key, ''.join(parts), extras, last_id)
+                    key, parts, size, deadline = None, [], 0, None
+                if out:
+                    yield out
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+
+def stream_response(events):
+    """Serve an async event generator as SSE from a WSGI view.
+
+    The first chunk is awaited before responding so an AppError raised by the
+    handler still becomes a normal JSON error response.
+    """
+    writer = SSEWriter.negotiate(request.headers)
+    chunks = engine.iterate(writer.frames(events))
+    try:
+        first = [next(chunks)]
+    except StopIteration:
+        first = []
+    except AppError as e:
+        return e.response()
+
+    def body():
+        try:
+            yield from first
+            yield from chunks
+        finally:
+            chunks.close()
+
+    return Response(body(), mimetype='text/event-stream', headers=writer.headers)
+
+
+# Flask rule -> AsyncRoute; served natively by asgi_app, by the matching Flask view under WSGI.
+# open(data, **view_args) runs in a request context and returns the event generator.
+AsyncRoute = namedtuple('AsyncRoute', 'methods open')
+ASYNC_ROUTES = {}
+
 
 # ─── Apps (dynamic loader) ────────────────────────────────────────────
 
 import importlib.util
 
 APPS_DIR = os.path.join(os.path.dirname(__file__), 'apps')
+APPS_MANIFEST_CACHE = os.environ.get('APPS_MANIFEST_CACHE', '')  # JSON file; reuses parsed manifests by mtime
+APPS_EAGER = os.environ.get('APPS_EAGER', '0') == '1'            # import every backend at startup
+APPS_REPORT = os.environ.get('APPS_REPORT', '0') == '1'          # print per-app load timings
+APPS_HOT_RELOAD = os.environ.get('APPS_HOT_RELOAD', '0') == '1'  # watch apps/ and swap changed apps live
+APPS_RELOAD_INTERVAL = float(os.environ.get('APPS_RELOAD_INTERVAL', 1.0))
+APP_API_METHODS = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE']
 
 
 class Platform:
@@ -111,15 +1056,50 @@ class Platform:
     def __init__(self, flask_app):
         self._app = flask_app
 
+    AppError = AppError
+    SSEWriter = SSEWriter
+
     def stream(self, messages, data=None):
         data = data or {}
-        backend = get_active_backend(data.get('backend_id'))
-        model = data.get('model', current_user.default_model)
-        if not backend:
-            raise RuntimeError('No backend configured')
-        if backend.kind == 'ollama':
-            return stream_ollama(backend, model, messages)
-        return stream_openai_compat(backend, model, messages)
+        backend, model = resolve_stream_target(current_user.id, data)
+        ticket = admission.ticket(current_user.id, backend, 'app')
+        return engine.iterate(admitted(ticket, astream_backend(backend, model, messages)))
+
+    async def astream(self, messages, data=None):
+        """Async stream(); use from handlers registered with stream_route()."""
+        data = data or {}
+        user_id = stream_user_id.get()
+        backend, model = await run_sync(resolve_stream_target, user_id, data)
+        upstream = astream_backend(backend, model, messages)
+        if stream_ticket.get() is None:  # stream_route handlers already hold a slot
+            upstream = admitted(admission.ticket(user_id, backend, 'app'), upstream)
+        async for item in upstream:
+            yield item
+
+    def stream_route(self, flask_app, rule, methods=('POST',)):
+        """Register an async SSE handler: `async def handler(data)` yielding event dicts.
+
+        Raise AppError before the first event to reject the request. Under ASGI the
+        handler runs on the event loop without holding a thread per stream.
+        """
+        def decorator(handler):
+            def open_stream(data, **view_args):
+                return as_user(handler(data, **view_args), current_user.id, request_stream_id(),
+                               get_active_backend(data.get('backend_id')))
+
+            @login_required
+            def view(**view_args):
+                try:
+                    events = open_stream(request.get_json(silent=True) or {}, **view_args)
+                except AppError as e:
+                    return e.response()
+                return stream_response(events)
+
+            flask_app.add_url_rule(rule, endpoint=handler.__name__, view_func=view, methods=list(methods))
+            # Lazily loaded apps keep their stream routes with the app version
+            getattr(flask_app, 'async_routes', ASYNC_ROUTES)[rule] = AsyncRoute(frozenset(methods), open_stream)
+            return handler
+        return decorator
 
     def complete(self, messages, data=None):
         tokens = []
@@ -131,7 +1111,11 @@ class Platform:
         return ''.join(tokens)
 
     def sse(self, data):
-        return f"data: {json.dumps(data)}\n\n"
+        return sse_frame(data)
+
+    def sse_writer(self):
+        """SSEWriter for the current request's negotiated stream format (stream_route uses it automatically)."""
+        return SSEWriter.negotiate(request.headers)
 
     def web_search(self, query, num_results=5):
         return web_search(query, num_results)
@@ -143,93 +1127,562 @@ class Platform:
         backend = get_active_backend(backend_id)
         if not backend:
             return []
+        models, _ = backend_monitor.models(backend)
+        return [m['name'] for m in models]
+
+
+class AppRegistry:
+    """Installed app manifests by id, with the hub card list and prefix lookups precomputed.
+
+    Reads go through plain dicts/tuples that are rebuilt on add/remove, so the
+    hub page and per-request lookups never rescan manifests.
+    """
+
+    def __init__(self):
+        self.manifests = {}
+        self._cards = ()
+        self._prefixes = ()   # (api_prefix, app_id), longest prefix first
+
+    def add(self, manifest):
+        self.manifests[manifest['id']] = manifest
+        self._reindex()
+
+    def remove(self, app_id):
+        self.manifests.pop(app_id, None)
+        self._reindex()
+
+    def _reindex(self):
+        self._cards = tuple(sorted((
+            {'id': app_id, 'name': m.get('name', app_id), 'icon': m.get('icon', ''),
+             'description': m.get('description', ''), 'page': m.get('routes', {}).get('page')}
+            for app_id, m in self.manifests.items()), key=lambda card: card['name'].lower()))
+        self._prefixes = tuple(sorted(
+            ((m['routes']['api_prefix'].rstrip('/'), app_id) for app_id, m in self.manifests.items()
+             if m.get('routes', {}).get('api_prefix')), key=lambda p: -len(p[0])))
+
+    def cards(self):
+        return self._cards
+
+    def owner(self, path):
+        """Id of the app whose api_prefix contains path, or None."""
+        for prefix, app_id in self._prefixes:
+            if path == prefix or path.startswith(prefix + '/'):
+                return app_id
+        return None
+
+    def get(self, app_id, default=None):
+        return self.manifests.get(app_id, default)
+
+    def __contains__(self, app_id):
+        return app_id in self.manifests
+
+    def __iter__(self):
+        return iter(self.manifests)
+
+    def __len__(self):
+        return len(self.manifests)
+
+    def items(self):
+        return self.manifests.items()
+
+
+APPS = AppRegistry()
+
+# App templates are served from Flask's Jinja environment as '<app_id>/<template>',
+# so they are compiled once, cached, and re-checked by mtime when auto-reload is on.
+app_template_loader = PrefixLoader({})
+
+
+def install_app_template_loader(flask_app):
+    flask_app.jinja_env.loader = ChoiceLoader([flask_app.jinja_env.loader, app_template_loader])
+
+
+class AppRoutes:
+    """The `app` handed to an app's register(): records rules into the app's own url map.
+
+    Flask's url_map is closed once the first request is served, so lazily
+    loaded apps route through a catch-all on their api_prefix instead.
+    Anything other than routing is delegated to the real Flask app.
+    """
+
+    def __init__(self, flask_app, installed):
+        self._flask_app = flask_app
+        self._installed = installed
+
+    @property
+    def async_routes(self):
+        return self._installed.async_routes
+
+    def add_url_rule(self, rule, endpoint=None, view_func=None, methods=None, **options):
+        endpoint = endpoint or view_func.__name__
+        options.pop('provide_automatic_options', None)
+        self._installed.url_map.add(Rule(rule, endpoint=endpoint, methods=methods or ['GET'], **options))
+        self._installed.views[endpoint] = view_func
+
+    def route(self, rule, **options):
+        def decorator(f):
+            self.add_url_rule(rule, options.pop('endpoint', None), f, **options)
+            return f
+        return decorator
+
+    def get(self, rule, **options):
+        return self.route(rule, methods=['GET'], **options)
+
+    def post(self, rule, **options):
+        return self.route(rule, methods=['POST'], **options)
+
+    def put(self, rule, **options):
+        return self.route(rule, methods=['PUT'], **options)
+
+    def delete(self, rule, **options):
+        return self.route(rule, methods=['DELETE'], **options)
+
+    def __getattr__(self, name):
+        return getattr(self._flask_app, name)
+
+
+class InstalledApp:
+    """One version of an app folder: manifest read at startup, backend imported on first use.
+
+    Hot reload builds a new InstalledApp and swaps it in; requests already
+    running hold on to the old one, which is torn down once they finish.
+    """
+
+    def __init__(self, app_id, app_dir, manifest, fingerprint=None):
+        self.id = app_id
+        self.dir = app_dir
+        self.manifest = manifest
+        self.fingerprint = fingerprint
+        self.url_map = Map()
+        self.views = {}
+        self.async_routes = {}
+        self.context = {}
+        self.module = None
+        self.loaded = False
+        self.eager = False     # registered straight onto Flask; cannot be swapped
+        self.error = None
+        self.manifest_ms = 0.0
+        self.load_ms = None
+        self.active = 0
+        self.retired = False
+        self._lock = threading.Lock()
+
+    @property
+    def backend_file(self):
+        return self.manifest.get('entry', {}).get('backend')
+
+    @property
+    def api_prefix(self):
+        return self.manifest.get('routes', {}).get('api_prefix', '').rstrip('/')
+
+    def load(self, target, platform):
+        """Import the backend and call register(target, platform)."""
+        t0 = time.perf_counter()
         try:
-            if backend.kind == 'ollama':
-                resp = requests.get(f'{backend.base_url}/api/tags', timeout=5)
-                resp.raise_for_status()
-                return [m['name'] for m in resp.json().get('models', [])]
+            if self.backend_file:
+                spec = importlib.util.spec_from_file_location(
+                    f'app_{self.id}', os.path.join(self.dir, self.backend_file)
+                )
+                mod = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(mod)
+                if hasattr(mod, 'register'):
+                    mod.register(target, platform)
+                if hasattr(mod, 'get_template_context'):
+                    self.context = mod.get_template_context()
+                self.module = mod
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+            raise
+        self.load_ms = round((time.perf_counter() - t0) * 1000, 2)
+        self.error = None
+        self.loaded = True
+        if APPS_REPORT:
+            print(f'App {self.id}: backend loaded in {self.load_ms} ms', file=sys.stderr)
+
+    def ensure(self, flask_app, platform):
+        """Load once, routing into this app's own url map; concurrent first requests wait."""
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.load(AppRoutes(flask_app, self), platform)
+        return self
+
+    def acquire(self):
+        with self._lock:
+            self.active += 1
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            drained = self.retired and self.active == 0
+        if drained:
+            self._teardown()
+
+    def retire(self):
+        """Stop taking new requests; tear down once the in-flight ones finish."""
+        with self._lock:
+            self.retired = True
+            drained = self.active == 0
+        if drained:
+            self._teardown()
+
+    def _teardown(self):
+        teardown = getattr(self.module, 'teardown', None)
+        if teardown:
+            try:
+                teardown()
+            except Exception as e:
+                print(f'App {self.id}: teardown failed: {e}', file=sys.stderr)
+
+    def dispatch(self):
+        """Run the app view matching the current request."""
+        endpoint, args = self.url_map.bind_to_environ(request.environ).match()
+        return self.views[endpoint](**args)
+
+    def match(self, path, method):
+        """(rule string, view args) for an ASGI request, or raises HTTPException."""
+        rule, args = self.url_map.bind('localhost').match(path, method, return_rule=True)
+        return rule.rule, args
+
+    def report(self):
+        return {'manifest_ms': self.manifest_ms, 'loaded': self.loaded,
+                'load_ms': self.load_ms, 'error': self.error, 'active': self.active}
+
+
+def app_fingerprint(app_dir):
+    """Cheap change marker for an app folder: (path, mtime, size) of every file."""
+    entries = []
+    for root, dirs, files in os.walk(app_dir):
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((os.path.relpath(path, app_dir), st.st_mtime_ns, st.st_size))
+    return tuple(entries)
+
+
+# Hot-reloaded apps are served through catch-all rules, so their page and
+# api_prefix must sit directly under these.
+APP_PAGE_PATH = re.compile(r'/apps/[^/]+')
+APP_API_PREFIX = re.compile(r'/api/apps/[^/]+')
+
+
+class AppLoader:
+    """Serves every app through catch-all routes and defers backend imports to first use.
+
+    Startup only reads manifests (optionally from APPS_MANIFEST_CACHE); the page,
+    static and API catch-alls under /apps/<name> and /api/apps/<name> are
+    registered once, and each request is dispatched by path into the serving
+    app version and its own url map. Boot time does not grow with the number of
+    installed apps. Apps without an api_prefix are imported eagerly since their
+    routes cannot be reserved up front.
+
+    Flask's url_map is never touched after startup, so with APPS_HOT_RELOAD=1 a
+    watcher can swap in a rebuilt app (or add/remove one) while requests are
+    being served.
+    """
+
+    def __init__(self, flask_app, platform):
+        self.flask_app = flask_app
+        self.platform = platform
+        self.apps = {}
+        self.pages = {}           # page path -> app id
+        self.direct = set()       # startup rules registered outside the catch-alls
+        self.failed = {}          # app dir -> fingerprint of a new version that could not be installed
+        self.startup_ms = 0.0
+        self.reloads = 0
+        self._swap_lock = threading.Lock()
+        self.page_view = login_required(self.serve_page)
+
+    def mount(self):
+        """Register the catch-all rules; call before the first request."""
+        add = self.flask_app.add_url_rule
+        add('/apps/<app_name>', 'app_page', self.page_view)
+        add('/apps/<app_id>/static/<path:filename>', 'app_static', self.serve_static)
+        add('/api/apps/<app_name>', 'app_api', self.serve_api, methods=APP_API_METHODS,
+            defaults={'subpath': ''})
+        add('/api/apps/<app_name>/<path:subpath>', 'app_api', self.serve_api, methods=APP_API_METHODS)
+
+    def scan(self):
+        t0 = time.perf_counter()
+        install_app_template_loader(self.flask_app)
+        cache = self._read_manifest_cache()
+        fresh = {}
+        for name in sorted(os.listdir(APPS_DIR)):
+            app_dir = os.path.join(APPS_DIR, name)
+            manifest_path = os.path.join(app_dir, 'manifest.json')
+            if not os.path.isfile(manifest_path):
+                continue
+            t_app = time.perf_counter()
+            mtime = os.stat(manifest_path).st_mtime_ns
+            cached = cache.get(name)
+            if cached and cached['mtime'] == mtime:
+                manifest = cached['manifest']
             else:
-                headers = {}
-                if backend.api_key:
-                    headers['Authorization'] = f'Bearer {backend.api_key}'
-                resp = requests.get(f'{backend.base_url.rstrip("/")}/v1/models', headers=headers, timeout=5)
-                resp.raise_for_status()
-                return [m.get('id', '') for m in resp.json().get('data', [])]
-        except Exception:
-            return []
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+            fresh[name] = {'mtime': mtime, 'manifest': manifest}
+            installed = InstalledApp(manifest['id'], app_dir, manifest)
+            self.install(installed)
+            installed.manifest_ms = round((time.perf_counter() - t_app) * 1000, 2)
+        if APPS_MANIFEST_CACHE and fresh != cache:
+            self._write_manifest_cache(fresh)
+        self.startup_ms = round((time.perf_counter() - t0) * 1000, 2)
+        if APPS_REPORT:
+            for installed in self.apps.values():
+                print(f'App {installed.id}: manifest {installed.manifest_ms} ms', file=sys.stderr)
+            print(f'Apps: {len(self.apps)} registered in {self.startup_ms} ms', file=sys.stderr)
+
+    def install(self, installed):
+        """Make installed the serving version of its app id.
+
+        Routes outside the catch-alls are added to Flask directly, which only works
+        at startup; hot reload checks restart_reason() first.
+        """
+        app_id = installed.id
+        manifest = installed.manifest
+        self.apps[app_id] = installed
+        APPS.add(manifest)
+
+        # The backend is imported on the first hit to its api_prefix
+        api_prefix = installed.api_prefix
+        if installed.backend_file:
+            if api_prefix and not APPS_EAGER:
+                if not self.routed(api_prefix, APP_API_PREFIX):
+                    self.add_direct(api_prefix, 'app_api', self.serve_api, methods=APP_API_METHODS,
+                                    defaults={'subpath': ''})
+                    self.add_direct(f'{api_prefix}/<path:subpath>', 'app_api', self.serve_api,
+                                    methods=APP_API_METHODS)
+            else:
+                # No prefix to reserve: register straight onto Flask while setup is still open
+                installed.load(self.flask_app, self.platform)
+                installed.eager = True
+
+        # Page route
+        pages = {path: owner for path, owner in self.pages.items() if owner != app_id}
+        if manifest.get('entry', {}).get('template'):
+            app_template_loader.mapping[app_id] = FileSystemLoader(installed.dir)
+            page = manifest['routes']['page']
+            if not self.routed(page, APP_PAGE_PATH):
+                self.add_direct(page, 'app_page', self.page_view)
+            pages[page] = app_id
+        self.pages = pages
+        return installed
+
+    def routed(self, path, catch_all):
+        return bool(catch_all.fullmatch(path)) or path in self.direct
+
+    def add_direct(self, rule, endpoint, view, **options):
+        self.flask_app.add_url_rule(rule, endpoint=endpoint, view_func=view, **options)
+        self.direct.add(rule)
+
+    def restart_reason(self, installed):
+        """Why this version cannot be installed without new Flask routes, or None."""
+        if installed.backend_file and (APPS_EAGER or not installed.api_prefix):
+            return 'apps without an api_prefix register onto Flask directly'
+        if installed.backend_file and not self.routed(installed.api_prefix, APP_API_PREFIX):
+            return f'api_prefix {installed.api_prefix} is not of the form /api/apps/<name>'
+        page = installed.manifest.get('routes', {}).get('page')
+        if installed.manifest.get('entry', {}).get('template') and not self.routed(page, APP_PAGE_PATH):
+            return f'page {page} is not of the form /apps/<name>'
+        return None
+
+    def current(self, app_id):
+        """Serving version of app_id; 404 if it was removed."""
+        installed = self.apps.get(app_id)
+        if installed is None:
+            abort(404)
+        return installed
+
+    def for_path(self, path):
+        """Lazily routed app version whose api_prefix contains path, or None."""
+        app_id = APPS.owner(path)
+        installed = self.apps.get(app_id) if app_id else None
+        return installed if installed and not installed.eager else None
+
+    def for_endpoint(self, endpoint, path):
+        return self.for_path(path) if endpoint == 'app_api' else None
+
+    def serve_api(self, **view_args):
+        installed = self.for_path(request.path)
+        if installed is None:
+            abort(404)
+        installed.ensure(self.flask_app, self.platform)
+        installed.acquire()
+        try:
+            response = self.flask_app.make_response(installed.dispatch())
+        except BaseException:
+            installed.release()
+            raise
+        if response.is_sequence:
+            installed.release()
+        else:
+            response.response = self.release_after(response.response, installed)
+        return response
 
+    @staticmethod
+    def release_after(body, installed):
+        """Streamed bodies keep their app version in flight until sent or abandoned.
 
-APPS = {}
+        Wraps the iterable instead of using call_on_close: asgiref's WSGI bridge
+        never calls close() on the response.
+        """
+        try:
+            yield from body
+        finally:
+            installed.release()
+
+    def serve_page(self, **view_args):
+        app_id = self.pages.get(request.path)
+        if app_id is None:
+            abort(404)
+        installed = self.current(app_id)
+        entry = installed.manifest.get('entry', {})
+        installed.ensure(self.flask_app, self.platform)
+        return render_template(f"{app_id}/{entry['template']}", user=current_user, **installed.context)
+
+    def serve_static(self, app_id, filename):
+        from flask import send_from_directory
+
+        installed = self.current(app_id)
+        static_dir = installed.manifest.get('entry', {}).get('static')
+        if not static_dir or not os.path.isdir(os.path.join(installed.dir, static_dir)):
+            abort(404)
+        return send_from_directory(os.path.join(installed.dir, static_dir), filename)
+
+    # Hot reload
+
+    def watch(self, interval):
+        for installed in self.apps.values():
+            installed.fingerprint = app_fingerprint(installed.dir)
+        threading.Thread(target=self._watch_loop, args=(interval,), name='app-watcher', daemon=True).start()
+
+    def _watch_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sync()
+            except Exception as e:
+                print(f'App reload scan failed: {e}', file=sys.stderr)
+
+    def sync(self):
+        """Reload changed app folders, install new ones and remove deleted ones."""
+        seen = set()
+        for name in sorted(os.listdir(APPS_DIR)):
+            app_dir = os.path.join(APPS_DIR, name)
+            if not os.path.isfile(os.path.join(app_dir, 'manifest.json')):
+                continue
+            fingerprint = app_fingerprint(app_dir)
+            current = next((a for a in self.apps.values() if a.dir == app_dir), None)
+            if current:
+                seen.add(current.id)
+                if current.fingerprint == fingerprint:
+                    continue
+            elif self.failed.get(app_dir) == fingerprint:
+                continue
+            try:
+                with open(os.path.join(app_dir, 'manifest.json')) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f'App {name}: manifest unreadable, keeping current version: {e}', file=sys.stderr)
+                continue
+            seen.add(manifest['id'])
+            self.reload(InstalledApp(manifest['id'], app_dir, manifest, fingerprint), current)
+        for app_id in [a for a in self.apps if a not in seen]:
+            self.remove(app_id)
+
+    def reload(self, fresh, old):
+        """Build the new version off to the side, then swap it in under one lock."""
+        if old and old.eager:
+            print(f'App {old.id}: has no api_prefix, restart to reload it', file=sys.stderr)
+            old.fingerprint = fresh.fingerprint
+            return
+        reason = self.restart_reason(fresh)
+        if reason:
+            print(f'App {fresh.id}: {reason}, restart to apply this version', file=sys.stderr)
+            self._keep(old, fresh)
+            return
+        if old is None or old.loaded:
+            try:
+                fresh.ensure(self.flask_app, self.platform)
+            except Exception as e:
+                print(f'App {fresh.id}: reload failed, keeping current version: {e}', file=sys.stderr)
+                self._keep(old, fresh)
+                if old:
+                    old.error = fresh.error
+                return
+        self.failed.pop(fresh.dir, None)
+        with self._swap_lock:
+            if old and old.id != fresh.id:
+                self._unmount(old.id)
+            self.install(fresh)
+            self._purge_templates(fresh.id)
+            self.reloads += 1
+        if old:
+            old.retire()
+        print(f'App {fresh.id}: {"reloaded" if old else "installed"}', file=sys.stderr)
+
+    def _keep(self, old, fresh):
+        """Don't retry a rejected version until its files change again."""
+        if old:
+            old.fingerprint = fresh.fingerprint
+        else:
+            self.failed[fresh.dir] = fresh.fingerprint
+
+    def remove(self, app_id):
+        with self._swap_lock:
+            old = self._unmount(app_id)
+        if old:
+            old.retire()
+            print(f'App {app_id}: removed', file=sys.stderr)
+
+    def _unmount(self, app_id):
+        old = self.apps.pop(app_id, None)
+        APPS.remove(app_id)
+        self.pages = {path: owner for path, owner in self.pages.items() if owner != app_id}
+        app_template_loader.mapping.pop(app_id, None)
+        self._purge_templates(app_id)
+        return old
+
+    def _purge_templates(self, app_id):
+        cache = self.flask_app.jinja_env.cache
+        if cache is not None:
+            for key in [k for k in cache.keys() if k[1].startswith(f'{app_id}/')]:
+                del cache[key]
+
+    def _read_manifest_cache(self):
+        if not APPS_MANIFEST_CACHE or not os.path.isfile(APPS_MANIFEST_CACHE):
+            return {}
+        try:
+            with open(APPS_MANIFEST_CACHE) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
 
+    def _write_manifest_cache(self, entries):
+        tmp = f'{APPS_MANIFEST_CACHE}.part'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp, APPS_MANIFEST_CACHE)
+        except OSError as e:
+            print(f'App manifest cache write failed: {e}', file=sys.stderr)
 
-def load_apps(flask_app, platform):
-    """Scan apps/ directory, load manifests, register backends."""
-    if not os.path.isdir(APPS_DIR):
-        return
+    def report(self):
+        return {'startup_ms': self.startup_ms, 'reloads': self.reloads,
+                'apps': {app_id: installed.report() for app_id, installed in self.apps.items()}}
 
-    for name in sorted(os.listdir(APPS_DIR)):
-        app_dir = os.path.join(APPS_DIR, name)
-        manifest_path = os.path.join(app_dir, 'manifest.json')
-        if not os.path.isfile(manifest_path):
-            continue
 
-        with open(manifest_path) as f:
-            manifest = json.load(f)
-
-        app_id = manifest['id']
-        APPS[app_id] = manifest
-
-        # Register backend routes
-        backend_file = manifest.get('entry', {}).get('backend')
-        extra_context = {}
-        if backend_file:
-            spec = importlib.util.spec_from_file_location(
-                f'app_{app_id}', os.path.join(app_dir, backend_file)
-            )
-            mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(mod)
-            if hasattr(mod, 'register'):
-                mod.register(flask_app, platform)
-            if hasattr(mod, 'get_template_context'):
-                extra_context = mod.get_template_context()
-
-        # Register page route
-        template_file = manifest.get('entry', {}).get('template')
-        if template_file:
-            template_path = os.path.join(app_dir, template_file)
-            page_route = manifest['routes']['page']
-
-            def make_page_view(_tpl=template_path, _ctx=extra_context):
-                @login_required
-                def app_page_view():
-                    with open(_tpl) as tf:
-                        from flask import render_template_string
-                        return render_template_string(tf.read(), user=current_user, **_ctx)
-                return app_page_view
-
-            flask_app.add_url_rule(
-                page_route,
-                endpoint=f'app_{app_id}_page',
-                view_func=make_page_view(),
-            )
-
-        # Register static file serving
-        static_dir = manifest.get('entry', {}).get('static')
-        if static_dir:
-            static_path = os.path.join(app_dir, static_dir)
-            if os.path.isdir(static_path):
-                from flask import send_from_directory
-
-                def make_static_view(_dir=static_path):
-                    def serve(filename):
-                        return send_from_directory(_dir, filename)
-                    return serve
-
-                flask_app.add_url_rule(
-                    f'/apps/{app_id}/static/<path:filename>',
-                    endpoint=f'app_{app_id}_static',
-                    view_func=make_static_view(),
-                )
+def load_apps(flask_app, platform):
+    """Scan apps/ directory, load manifests and reserve each app's routes."""
+    loader = AppLoader(flask_app, platform)
+    loader.mount()
+    if os.path.isdir(APPS_DIR):
+        loader.scan()
+    return loader
 
 # ─── Personalities ────────────────────────────────────────────────────
 
@@ -333,25 +1786,96 @@ def index():
     return redirect(url_for('login'))
 
 
+def encode_cursor(ts, row_id):
+    return f'{ts.isoformat()}_{row_id}'
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from encode_cursor(); None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    ts, _, row_id = cursor.rpartition('_')
+    try:
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        return None
+
+
+def keyset_page(query, ts_col, id_col, cursor, limit):
+    """Newest-first page of `query` strictly older than cursor, plus the cursor for the next page.
+
+    Rows must expose the ts/id columns by name. Seeks on (ts, id) instead of
+    OFFSET, so deep pages cost the same as the first one.
+    """
+    after = decode_cursor(cursor)
+    if after:
+        query = query.filter(db.tuple_(ts_col, id_col) < after)
+    rows = query.order_by(ts_col.desc(), id_col.desc()).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(getattr(rows[-1], ts_col.key), getattr(rows[-1], id_col.key)) if more else None
+    return rows, next_cursor
+
+
+def page_limit(default):
+    return max(1, min(request.args.get('limit', default, type=int), MAX_PAGE))
+
+
+def conversation_page(user_id, cursor=None, limit=CONVERSATION_PAGE):
+    query = db.session.query(Conversation.id, Conversation.title, Conversation.updated_at)\
+        .filter(Conversation.user_id == user_id)
+    return keyset_page(query, Conversation.updated_at, Conversation.id, cursor, limit)
+
+
+def message_page(convo_id, cursor=None, limit=MESSAGE_PAGE):
+    """The newest messages before cursor, returned oldest first for rendering."""
+    query = db.session.query(Message.id, Message.role, Message.content, Message.created_at)\
+        .filter(Message.conversation_id == convo_id)
+    rows, next_cursor = keyset_page(query, Message.created_at, Message.id, cursor, limit)
+    return rows[::-1], next_cursor
+
+
 @app.route('/chat')
 @app.route('/chat/<int:convo_id>')
 @login_required
 def chat(convo_id=None):
-    convos = Conversation.query.filter_by(user_id=current_user.id)\
-        .order_by(Conversation.updated_at.desc()).all()
+    convos, convos_next = conversation_page(current_user.id)
     active_convo = None
-    messages = []
+    messages, messages_next = [], None
     if convo_id:
-        active_convo = Conversation.query.filter_by(id=convo_id, user_id=current_user.id).first_or_404()
-        messages = active_convo.messages
+        active_convo = db.session.query(Conversation.id, Conversation.title, Conversation.personality)\
+            .filter_by(id=convo_id, user_id=current_user.id).first_or_404()
+        messages, messages_next = message_page(convo_id)
     return render_template('chat.html',
                            conversations=convos,
+                           conversations_next=convos_next,
                            active_convo=active_convo,
                            messages=messages,
+                           messages_next=messages_next,
                            personalities=PERSONALITIES,
                            user=current_user)
 
 
+@app.route('/api/conversations')
+@login_required
+def list_conversations():
+    rows, next_cursor = conversation_page(current_user.id, request.args.get('before'),
+                                          page_limit(CONVERSATION_PAGE))
+    return jsonify({'conversations': [{'id': r.id, 'title': r.title, 'updated_at': r.updated_at.isoformat()}
+                                      for r in rows], 'next': next_cursor})
+
+
+@app.route('/api/conversations/<int:convo_id>/messages')
+@login_required
+def list_messages(convo_id):
+    if not db.session.query(Conversation.query.filter_by(id=convo_id, user_id=current_user.id).exists()).scalar():
+        return jsonify({'error': 'Not found'}), 404
+    rows, next_cursor = message_page(convo_id, request.args.get('before'), page_limit(MESSAGE_PAGE))
+    return jsonify({'messages': [{'id': r.id, 'role': r.role, 'content': r.content,
+                                  'created_at': r.created_at.isoformat()} for r in rows],
+                    'next': next_cursor})
+
+
 @app.route('/api/conversations', methods=['POST'])
 @login_required
 def new_conversation():
@@ -382,96 +1906,670 @@ def rename_conversation(convo_id):
     db.session.commit()
     return jsonify({'ok': True})
 
+# ─── HTTP pools ───────────────────────────────────────────────────────
+
+class HttpPools:
+    """Keep-alive requests.Session per upstream, so chat turns reuse TCP/TLS connections.
+
+    Keys are 'backend:<id>' for each Backend row, 'sd' for the Stable Diffusion host,
+    'search' for DuckDuckGo and 'web' for fetched pages. Timeouts passed to request()
+    are read timeouts; the connect timeout is shared. Token streams use the
+    httpx.AsyncClient for the same key (one per event loop) from async_client().
+    """
+
+    def __init__(self, pool_size, retries, connect_timeout, keepalive=True, stream_pool_size=None):
+        self.pool_size = pool_size
+        self.stream_pool_size = stream_pool_size or pool_size
+        self.retries = retries
+        self.connect_timeout = connect_timeout
+        self.keepalive = keepalive
+        self._sessions = {}
+        self._async_clients = weakref.WeakKeyDictionary()  # loop -> {key: AsyncClient}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _new_session(self):
+        # Only connect errors are retried for POST (the request never left the box);
+        # idempotent GETs also retry on gateway errors.
+        retry = Retry(total=self.retries, connect=self.retries, read=0, other=0,
+                      status=self.retries, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset({'GET', 'HEAD'}),
+                      backoff_factor=0.2, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                              max_retries=retry)
+        s = requests.Session()
+        s.mount('http://', adapter)
+        s.mount('https://', adapter)
+        if not self.keepalive:
+            s.headers['Connection'] = 'close'
+        return s
+
+    def _new_async_client(self):
+        keepalive = self.pool_size if self.keepalive else 0
+        transport = httpx.AsyncHTTPTransport(
+            retries=self.retries,
+            limits=httpx.Limits(max_connections=self.stream_pool_size, max_keepalive_connections=keepalive),
+        )
+        return httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(30, connect=self.connect_timeout))
+
+    def _counters_for(self, key):
+        return self._counters.setdefault(key, {'requests': 0, 'errors': 0, 'wait_ms': 0.0})
+
+    def session(self, key):
+        with self._lock:
+            s = self._sessions.get(key)
+            if s is None:
+                s = self._sessions[key] = self._new_session()
+                self._counters_for(key)
+            return s
+
+    def async_client(self, key):
+        """httpx.AsyncClient for this key on the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            c = clients.get(key)
+            if c is None:
+                c = clients[key] = self._new_async_client()
+                self._counters_for(key)
+            return c
+
+    @contextlib.asynccontextmanager
+    async def stream(self, key, method, url, **kwargs):
+        """Streaming request on the async client for key (counted in stats)."""
+        client = self.async_client(key)
+        t0 = time.monotonic()
+        try:
+            async with client.stream(method, url, **kwargs) as resp:
+                self.record(key, (time.monotonic() - t0) * 1000)
+                yield resp
+        except httpx.TransportError:
+            self.record(key, error=True)
+            raise
+
+    def record(self, key, wait_ms=None, error=False):
+        with self._lock:
+            counters = self._counters_for(key)
+            if error:
+                counters['errors'] += 1
+            else:
+                counters['requests'] += 1
+                counters['wait_ms'] += wait_ms or 0.0
+
+    def request(self, key, method, url, timeout=30, **kwargs):
+        s = self.session(key)
+        try:
+            resp = s.request(method, url, timeout=(self.connect_timeout, timeout), **kwargs)
+        except requests.RequestException:
+            self.record(key, error=True)
+            raise
+        self.record(key, resp.elapsed.total_seconds() * 1000)
+        return resp
+
+    def get(self, key, url, **kwargs):
+        return self.request(key, 'GET', url, **kwargs)
+
+    def post(self, key, url, **kwargs):
+        return self.request(key, 'POST', url, **kwargs)
+
+    def drop(self, key):
+        """Close a pool, e.g. after its backend URL changed or the row was deleted."""
+        with self._lock:
+            s = self._sessions.pop(key, None)
+            self._counters.pop(key, None)
+            stale = [(loop, clients.pop(key)) for loop, clients in self._async_clients.items() if key in clients]
+        if s:
+            s.close()
+        for loop, c in stale:
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(c.aclose(), loop)
+
+    def stats(self):
+        out = {}
+        with self._lock:
+            items = list(self._sessions.items())
+            keys = set(self._counters)
+            async_conns = {}
+            for clients in self._async_clients.values():
+                for key, c in clients.items():
+                    # httpcore internals; best effort
+                    pool = getattr(getattr(c, '_transport', None), '_pool', None)
+                    async_conns[key] = async_conns.get(key, 0) + len(getattr(pool, 'connections', []))
+        sessions = dict(items)
+        for key in sorted(keys):
+            s = sessions.get(key)
+            counters = dict(self._counters.get(key, {}))
+            n = counters.get('requests') or 0
+            counters['avg_wait_ms'] = round(counters.pop('wait_ms', 0.0) / n, 1) if n else 0.0
+            hosts = {}
+            adapters = {id(a): a for a in s.adapters.values()}.values() if s else ()
+            for adapter in adapters:
+                pools = adapter.poolmanager.pools
+                for pool_key in pools.keys():
+                    pool = pools.get(pool_key)
+                    if pool is None:
+                        continue
+                    hosts[f'{pool.scheme}://{pool.host}:{pool.port}'] = {
+                        'connections': pool.num_connections,
+                        # the queue is pre-filled with None placeholders
+                        'idle': sum(1 for c in list(pool.pool.queue) if c) if pool.pool else 0,
+                        'requests': pool.num_requests,
+                    }
+            counters['hosts'] = hosts
+            counters['stream_connections'] = async_conns.get(key, 0)
+            out[key] = counters
+        return {'pool_size': self.pool_size, 'stream_pool_size': self.stream_pool_size,
+                'keepalive': self.keepalive, 'pools': out}
+
+
+http_pools = HttpPools(HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_CONNECT_TIMEOUT, HTTP_KEEPALIVE,
+                       stream_pool_size=HTTP_STREAM_POOL_SIZE)
+
+
+def backend_pool(backend):
+    return f'backend:{backend.id}'
+
+
+# ─── Backend health ───────────────────────────────────────────────────
+
+MODEL_CACHE_TTL = int(os.environ.get('MODEL_CACHE_TTL', 300))          # serve cached model lists this long
+MODEL_REFRESH_INTERVAL = int(os.environ.get('MODEL_REFRESH_INTERVAL', 60))
+MODEL_REFRESH_IDLE = 900        # stop refreshing backends nobody asked about for this long
+BREAKER_THRESHOLD = int(os.environ.get('BREAKER_THRESHOLD', 3))       # consecutive failures to open
+BREAKER_COOLDOWN = int(os.environ.get('BREAKER_COOLDOWN', 30))        # seconds before a half-open probe
+BALANCE_STRATEGY = os.environ.get('BALANCE_STRATEGY', 'least-outstanding')  # or 'latency', for pooled backends
+
+
+class BackendUnavailable(ConnectionError):
+    """Raised instead of connecting while a backend's circuit breaker is open."""
+
+
+def fetch_backend_models(backend):
+    """Live model list from a backend, normalized to {name, size, family, params}."""
+    if backend.kind == 'ollama':
+        resp = http_pools.get(backend_pool(backend), f'{backend.base_url}/api/tags', timeout=5)
+        resp.raise_for_status()
+        models = []
+        for m in resp.json().get('models', []):
+            size_bytes = m.get('size', 0)
+            size_str = f'{size_bytes / 1e9:.1f} GB' if size_bytes > 1e9 else f'{size_bytes / 1e6:.0f} MB'
+            models.append({
+                'name': m['name'], 'size': size_str,
+                'family': m.get('details', {}).get('family', ''),
+                'params': m.get('details', {}).get('parameter_size', ''),
+            })
+        return models
+    headers = {}
+    if backend.api_key:
+        headers['Authorization'] = f'Bearer {backend.api_key}'
+    resp = http_pools.get(backend_pool(backend), f'{backend.base_url.rstrip("/")}/v1/models',
+                          headers=headers, timeout=5)
+    resp.raise_for_status()
+    return [{'name': m.get('id', m.get('name', '')), 'size': '', 'family': '', 'params': ''}
+            for m in resp.json().get('data', [])]
+
+
+class BackendStatus:
+    def __init__(self, backend):
+        self.backend = backend      # latest BackendInfo, used by the refresher
+        self.models = None
+        self.fetched_at = 0
+        self.latency_ms = None
+        self.last_ok = None
+        self.last_error = None
+        self.unreachable = False    # last failure was a refused/timed-out connection
+        self.failures = 0
+        self.opened_at = None       # circuit breaker: set while open
+        self.probing = False        # half-open: the single trial request is in flight
+        self.last_used = time.time()
+        self.inflight = 0           # streams currently generating on this backend
+        self.requests = 0
+        self.failovers = 0          # streams moved to a pool peer after failing to connect here
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.time() - self.opened_at >= BREAKER_COOLDOWN else 'open'
+
+
+class BackendMonitor:
+    """Per-backend model-list cache plus health tracking with a circuit breaker.
+
+    Model lists are served from memory and refreshed by a background thread for
+    backends used recently, so page loads never wait on a slow or dead backend
+    once it has been seen. Probe and stream outcomes feed the breaker: after
+    BREAKER_THRESHOLD consecutive failures the backend is skipped for
+    BREAKER_COOLDOWN seconds, then one half-open attempt decides.
+    """
+
+    def __init__(self, ttl, interval):
+        self.ttl = ttl
+        self.interval = interval
+        self.status = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def track(self, backend):
+        with self._lock:
+            st = self.status.get(backend.id)
+            if st is None:
+                st = self.status[backend.id] = BackendStatus(backend)
+            st.backend = backend
+            st.last_used = time.time()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refresh_loop, name='backend-monitor', daemon=True)
+                self._thread.start()
+            return st
+
+    def models(self, backend):
+        """(models, error) — cached when possible; only a never-fetched backend blocks."""
+        st = self.track(backend)
+        if st.models is not None:
+            if time.time() - st.fetched_at > self.ttl:
+                self._wake.set()
+            return st.models, None
+        if st.state != 'open':
+            self.probe(backend)
+            if st.models is not None:
+                return st.models, None
+        if st.unreachable or st.state == 'open':
+            return [], f'{backend.name} not running'
+        return [], st.last_error
+
+    def probe(self, backend):
+        """Fetch the model list now; records latency/errors. Returns the exception or None."""
+        st = self.track(backend)
+        t0 = time.monotonic()
+        try:
+            models = fetch_backend_models(backend)
+        except Exception as e:
+            self.record_failure(backend.id, e)
+            return e
+        with self._lock:
+            st.models = models
+            st.fetched_at = time.time()
+        self.record_success(backend.id, (time.monotonic() - t0) * 1000)
+        return None
+
+    def acquire(self, backend):
+        st = self.track(backend)
+        with self._lock:
+            st.inflight += 1
+            st.requests += 1
+
+    def release(self, backend_id, failed_over=False):
+        with self._lock:
+            st = self.status.get(backend_id)
+            if st:
+                st.inflight = max(st.inflight - 1, 0)
+                st.failovers += failed_over
+
+    def rank(self, backends):
+        """Pool members in the order to try them: breaker-closed first, then by BALANCE_STRATEGY."""
+        with self._lock:
+            def key(b):
+                st = self.status.get(b.id)
+                if st is None:
+                    return (0, 0, 0)
+                latency = st.latency_ms if st.latency_ms is not None else 0
+                load = (latency, st.inflight) if BALANCE_STRATEGY == 'latency' else (st.inflight, latency)
+                return (st.state == 'open',) + load
+            return sorted(backends, key=key)
+
+    def allow(self, backend_id):
+        """False while the breaker is open. A half-open breaker admits one trial, for
+        which 'probe' is returned; the caller must end it with record_success,
+        record_failure or end_probe."""
+        with self._lock:
+            st = self.status.get(backend_id)
+            if not st or st.opened_at is None:
+                return True
+            if st.state == 'half-open' and not st.probing:
+                st.probing = True
+                return 'probe'
+            return False
+
+    def end_probe(self, backend_id):
+        """Trial ended without a verdict (cancelled, or a non-connect error); let another try."""
+        with self._lock:
+            st = self.status.get(backend_id)
+            if st:
+                st.probing = False
+
+    def record_success(self, backend_id, latency_ms=None):
+        with self._lock:
+            st = self.status.get(backend_id)
+            if st:
+                st.failures = 0
+                st.opened_at = None
+                st.probing = False
+                st.last_ok = time.time()
+                st.last_error = None
+                st.unreachable = False
+                if latency_ms is not None:
+                    st.latency_ms = round(latency_ms, 1)
+
+    def record_failure(self, backend_id, error):
+        with self._lock:
+            st = self.status.get(backend_id)
+            if st:
+                st.failures += 1
+                st.probing = False
+                st.last_error = str(error) or type(error).__name__
+                st.unreachable = isinstance(error, (requests.ConnectionError, httpx.ConnectError,
+                                                    httpx.ConnectTimeout, BackendUnavailable))
+                if st.failures >= BREAKER_THRESHOLD or st.state == 'half-open':
+                    st.opened_at = time.time()
+
+    def invalidate(self, backend_id):
+        """Drop the cached model list (after a pull/delete); the next read refetches."""
+        with self._lock:
+            st = self.status.get(backend_id)
+            if st:
+                st.models = None
+
+    def forget(self, backend_id):
+        with self._lock:
+            self.status.pop(backend_id, None)
+
+    def health(self, backend_id):
+        with self._lock:
+            st = self.status.get(backend_id)
+            if not st:
+                return {'state': 'unknown'}
+            return {
+                'state': st.state,
+                'latency_ms': st.latency_ms,
+                'last_ok': st.last_ok,
+                'last_error': st.last_error,
+                'failures': st.failures,
+                'inflight': st.inflight,
+                'requests': st.requests,
+                'failovers': st.failovers,
+                'models_age': round(time.time() - st.fetched_at) if st.models is not None else None,
+            }
+
+    def stats(self):
+        return {str(bid): self.health(bid) for bid in list(self.status)}
+
+    def _refresh_loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            now = time.time()
+            with self._lock:
+                due = [st for st in self.status.values()
+                       if now - st.last_used < MODEL_REFRESH_IDLE and st.state != 'open'
+                       and (st.models is None or now - st.fetched_at >= self.interval)]
+            for st in due:
+                self.probe(st.backend)
+
+
+backend_monitor = BackendMonitor(MODEL_CACHE_TTL, MODEL_REFRESH_INTERVAL)
+
+
 # ─── Backend helpers ──────────────────────────────────────────────────
 
-def get_active_backend(backend_id=None):
-    """Get a specific backend or the user's default."""
+BACKEND_CACHE_TTL = int(os.environ.get('BACKEND_CACHE_TTL', 30))
+
+UserBackends = namedtuple('UserBackends', 'backends default default_model')
+
+
+class BackendDirectory:
+    """Per-user snapshot of backends and default model.
+
+    Entries live for BACKEND_CACHE_TTL seconds and are dropped by the backend
+    CRUD and settings routes; within a request the snapshot is also memoized on
+    flask.g, so every resolver in the chat path shares one lookup. Like
+    UserDirectory, the cache is per process.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        memo = g.setdefault('user_backends', {})
+        if user_id in memo:
+            return memo[user_id]
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(user_id)
+        if hit and hit[0] > now:
+            entry = hit[1]
+        else:
+            entry = self._load(user_id)
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, entry)
+        memo[user_id] = entry
+        return entry
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+        g.pop('user_backends', None)
+
+    def _load(self, user_id):
+        rows = Backend.query.filter_by(user_id=user_id).order_by(Backend.created_at, Backend.id).all()
+        if not rows:
+            # Auto-create default Ollama backend
+            b = Backend(user_id=user_id, name='Ollama', kind='ollama',
+                        base_url=OLLAMA_BASE, is_default=True)
+            db.session.add(b)
+            db.session.commit()
+            rows = [b]
+        backends = tuple(b.info() for b in rows)
+        if any(b.pool for b in backends):
+            backends = tuple(b._replace(peers=tuple(p for p in backends if p.pool == b.pool and p.id != b.id))
+                             if b.pool else b for b in backends)
+        default = next((b for b in backends if b.is_default), backends[0])
+        default_model = db.session.query(User.default_model).filter_by(id=user_id).scalar()
+        return UserBackends(backends, default, default_model)
+
+
+backend_directory = BackendDirectory(BACKEND_CACHE_TTL)
+
+
+def get_active_backend(backend_id=None, user_id=None):
+    """Get a specific backend or the user's default, as a BackendInfo snapshot."""
+    entry = backend_directory.get(user_id or current_user.id)
     if backend_id:
-        return Backend.query.filter_by(id=backend_id, user_id=current_user.id).first()
-    b = Backend.query.filter_by(user_id=current_user.id, is_default=True).first()
-    if not b:
-        b = Backend.query.filter_by(user_id=current_user.id).first()
-    if not b:
-        # Auto-create default Ollama backend
-        b = Backend(user_id=current_user.id, name='Ollama', kind='ollama',
-                    base_url=OLLAMA_BASE, is_default=True)
-        db.session.add(b)
-        db.session.commit()
-    return b
+        return next((b for b in entry.backends if str(b.id) == str(backend_id)), None)
+    return entry.default
 
 
-def strip_think_tags(streamer):
-    """Filter out <think>...</think> blocks from streamed tokens (e.g. qwen3)."""
-    in_think = False
-    buf = ''
-    for token, done in streamer:
+def resolve_stream_target(user_id, data):
+    """Backend and model for a stream request, falling back to the user's defaults."""
+    backend = get_active_backend(data.get('backend_id'), user_id=user_id)
+    if not backend:
+        raise RuntimeError('No backend configured')
+    model = data['model'] if 'model' in data else backend_directory.get(user_id).default_model
+    return backend, model
+
+
+# Reasoning block delimiters by model-name prefix (longest match wins, see reasoning_tags)
+REASONING_TAGS = {
+    '': (('<think>', '</think>'),),
+    'qwen3': (('<think>', '</think>'),),
+    'qwq': (('<think>', '</think>'),),
+    'deepseek-r1': (('<think>', '</think>'),),
+    'granite': (('<think>', '</think>'), ('<reasoning>', '</reasoning>')),
+    'magistral': (('[THINK]', '[/THINK]'),),
+}
+
+
+def reasoning_tags(model):
+    return REASONING_TAGS[model_prefix(REASONING_TAGS, model) or '']
+
+
+class Reasoning(str):
+    """Token text from a reasoning block; only yielded to streams opened with reasoning=True."""
+
+
+class TagMatcher:
+    """Aho-Corasick automaton over a few tag strings, fed one character at a time.
+
+    The state's depth is the length of the longest stream suffix that could
+    still become a tag, which is exactly what must be held back. A state also
+    matches any tag ending at it via its fail chain (a tag that is a suffix of
+    a longer tag's prefix), so those are found too.
+    """
+
+    def __init__(self, patterns):
+        self.lengths = [len(pattern) for pattern in patterns]
+        self.goto = [{}]
+        self.fail = [0]
+        self.depth = [0]
+        self.match = [None]
+        for i, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.depth.append(self.depth[state] + 1)
+                    self.match.append(None)
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.match[state] = i
+        pending = list(self.goto[0].values())  # breadth-first; depth-1 states fail to the root
+        for state in pending:
+            for ch, nxt in self.goto[state].items():
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                if self.match[nxt] is None:
+                    self.match[nxt] = self.match[self.fail[nxt]]  # output link; shallower states are done
+                pending.append(nxt)
+        self.first = frozenset(self.goto[0])
+
+    def step(self, state, ch):
+        while state and ch not in self.goto[state]:
+            state = self.fail[state]
+        return self.goto[state].get(ch, 0)
+
+
+class ReasoningFilter:
+    """Splits streamed text into answer and reasoning without rescanning.
+
+    Each character advances a small automaton (open tags outside a block, the
+    matching close tag inside one); only a possible partial tag is held back,
+    so the work per character is constant however long a block runs.
+    """
+
+    def __init__(self, tags):
+        self.opens = TagMatcher([open_tag for open_tag, _ in tags])
+        self.closes = [TagMatcher([close_tag]) for _, close_tag in tags]
+        self.matcher = self.opens
+        self.inside = False
+        self.state = 0
+        self.held = ''
+
+    def feed(self, text):
+        """(answer, reasoning) text that is now certain."""
+        answer, reasoning = [], []
+        if not self.state and not self.matcher.first.intersection(text):
+            (reasoning if self.inside else answer).append(text)  # fast path: no tag can start here
+            return ''.join(answer), ''.join(reasoning)
+        matcher, state, held = self.matcher, self.state, self.held
+        out = reasoning if self.inside else answer
+        for ch in text:
+            state = matcher.step(state, ch)
+            held += ch
+            safe = len(held) - matcher.depth[state]
+            if safe:
+                out.append(held[:safe])
+                held = held[safe:]
+            tag = matcher.match[state]
+            if tag is not None:
+                before = len(held) - matcher.lengths[tag]  # held text ahead of a tag found by output link
+                if before:
+                    out.append(held[:before])
+                held, state = '', 0
+                self.inside = not self.inside
+                matcher = self.closes[tag] if self.inside else self.opens
+                out = reasoning if self.inside else answer
+        self.matcher, self.state, self.held = matcher, state, held
+        return ''.join(answer), ''.join(reasoning)
+
+    def flush(self):
+        """Text held back at end of stream (a partial tag is just text)."""
+        held, self.held, self.state = self.held, '', 0
+        return ('', held) if self.inside else (held, '')
+
+
+async def filter_reasoning(streamer, tags, keep=False):
+    """Drop reasoning blocks from (token, done) items, or yield them as Reasoning when keep is set.
+
+    Reasoning that backends already send separately (Reasoning tokens) is
+    passed through or dropped the same way.
+    """
+    rf = ReasoningFilter(tags)
+    async for token, done in streamer:
+        if isinstance(token, Reasoning):
+            if keep and token:
+                yield token, False
+            answer = ''
+        elif token:
+            answer, reasoning = rf.feed(token)
+            if keep and reasoning:
+                yield Reasoning(reasoning), False
+        else:
+            answer = ''
         if done:
-            # Flush any non-think buffered content
-            if buf and not in_think:
-                yield buf, False
-            yield '', True
+            tail, reasoning = rf.flush()
+            if keep and reasoning:
+                yield Reasoning(reasoning), False
+            yield answer + tail, True
             return
-        buf += token
-        while buf:
-            if in_think:
-                end = buf.find('</think>')
-                if end == -1:
-                    buf = ''  # discard think content, wait for closing tag
-                    break
-                buf = buf[end + 8:]  # skip past </think>
-                in_think = False
-            else:
-                start = buf.find('<think>')
-                if start == -1:
-                    # Check if buf ends with partial '<think' match
-                    partial = False
-                    for i in range(1, min(len(buf), 7) + 1):
-                        if '<think>'.startswith(buf[-i:]):
-                            partial = True
-                            if len(buf) > i:
-                                yield buf[:-i], False
-                            buf = buf[-i:]
-                            break
-                    if not partial:
-                        yield buf, False
-                        buf = ''
-                    break
-                else:
-                    if start > 0:
-                        yield buf[:start], False
-                    buf = buf[start + 7:]  # skip past <think>
-                    in_think = True
+        if answer:
+            yield answer, False
+    tail, reasoning = rf.flush()  # the upstream ended without a done item
+    if keep and reasoning:
+        yield Reasoning(reasoning), False
+    if tail:
+        yield tail, False
+
 
+# Errors that mean "backend not reachable" rather than "backend answered badly"
+UPSTREAM_CONNECT_ERRORS = (requests.ConnectionError, httpx.ConnectError, httpx.ConnectTimeout, BackendUnavailable)
 
-def stream_ollama(backend, model, messages):
+STREAM_TIMEOUT = httpx.Timeout(120, connect=HTTP_CONNECT_TIMEOUT)
+
+
+async def astream_ollama(backend, model, messages):
     """Stream from Ollama API."""
-    resp = requests.post(f'{backend.base_url}/api/chat', json={
+    # num_ctx matches the budget build_context trims to; Ollama's own default is
+    # smaller and would silently cut the front of the prompt (the system prompt)
+    async with http_pools.stream(backend_pool(backend), 'POST', f'{backend.base_url}/api/chat', json={
         'model': model, 'messages': messages, 'stream': True,
-    }, stream=True, timeout=120)
-    resp.raise_for_status()
-    def raw():
-        for line in resp.iter_lines():
+        'options': {'num_ctx': context_limit(model)},
+    }, timeout=STREAM_TIMEOUT) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
             if line:
                 chunk = json.loads(line)
-                token = chunk.get('message', {}).get('content', '')
-                done = chunk.get('done', False)
-                yield token, done
-    yield from strip_think_tags(raw())
+                message = chunk.get('message', {})
+                if message.get('thinking'):
+                    yield Reasoning(message['thinking']), False
+                yield message.get('content', ''), chunk.get('done', False)
 
 
-def stream_openai_compat(backend, model, messages):
+async def astream_openai_compat(backend, model, messages):
     """Stream from any OpenAI-compatible API (LM Studio, llama.cpp, vLLM, OpenAI, etc.)."""
     headers = {'Content-Type': 'application/json'}
     if backend.api_key:
         headers['Authorization'] = f'Bearer {backend.api_key}'
     base = backend.base_url.rstrip('/')
-    resp = requests.post(f'{base}/v1/chat/completions', json={
+    async with http_pools.stream(backend_pool(backend), 'POST', f'{base}/v1/chat/completions', json={
         'model': model, 'messages': messages, 'stream': True,
-    }, headers=headers, stream=True, timeout=120)
-    resp.raise_for_status()
-    for line in resp.iter_lines():
-        if line:
-            text = line.decode('utf-8', errors='ignore')
+    }, headers=headers, timeout=STREAM_TIMEOUT) as resp:
+        resp.raise_for_status()
+        async for text in resp.aiter_lines():
             if text.startswith('data: '):
                 payload = text[6:]
                 if payload.strip() == '[DONE]':
@@ -479,8 +2577,59 @@ def stream_openai_compat(backend, model, messages):
                     return
                 chunk = json.loads(payload)
                 delta = chunk.get('choices', [{}])[0].get('delta', {})
-                token = delta.get('content', '')
-                yield token, False
+                thinking = delta.get('reasoning_content') or delta.get('reasoning')
+                if thinking:
+                    yield Reasoning(thinking), False
+                yield delta.get('content') or '', False
+
+
+async def astream_backend(backend, model, messages, reasoning=False):
+    """Stream (token, done) from the backend or, if it is pooled, the best member of its pool.
+
+    Pool members are tried in backend_monitor.rank() order; a member that fails
+    to connect (or is skipped by its breaker) before the first token hands the
+    request to the next one, so failover is invisible to the caller. Reasoning
+    blocks are stripped; with reasoning=True they are yielded as Reasoning
+    tokens instead.
+    """
+    candidates = backend_monitor.rank((backend,) + backend.peers) if backend.peers else (backend,)
+    for i, member in enumerate(candidates):
+        started = failed_over = False
+        backend_monitor.acquire(member)
+        try:
+            async for item in astream_member(member, model, messages, reasoning):
+                started = True
+                yield item
+            return
+        except UPSTREAM_CONNECT_ERRORS:
+            if started or i == len(candidates) - 1:
+                raise
+            failed_over = True
+        finally:
+            backend_monitor.release(member.id, failed_over)
+
+
+async def astream_member(backend, model, messages, reasoning=False):
+    """One backend's stream, feeding connect outcomes into its circuit breaker."""
+    allowed = backend_monitor.allow(backend.id)
+    if not allowed:
+        raise BackendUnavailable(f'{backend.name} is unavailable (retrying in {BREAKER_COOLDOWN}s)')
+    stream = astream_ollama if backend.kind == 'ollama' else astream_openai_compat
+    backend_monitor.track(backend)
+    t0 = time.monotonic()
+    first = True
+    try:
+        async for item in filter_reasoning(stream(backend, model, messages), reasoning_tags(model), reasoning):
+            if first:
+                backend_monitor.record_success(backend.id, (time.monotonic() - t0) * 1000)
+                first = False
+            yield item
+    except UPSTREAM_CONNECT_ERRORS as e:
+        backend_monitor.record_failure(backend.id, e)
+        raise
+    finally:
+        if allowed == 'probe' and first:
+            backend_monitor.end_probe(backend.id)
 
 
 # ─── Backend CRUD ─────────────────────────────────────────────────────
@@ -488,14 +2637,12 @@ def stream_openai_compat(backend, model, messages):
 @app.route('/api/backends')
 @login_required
 def list_backends():
-    backends = Backend.query.filter_by(user_id=current_user.id).order_by(Backend.created_at).all()
-    if not backends:
-        get_active_backend()  # auto-create default
-        backends = Backend.query.filter_by(user_id=current_user.id).all()
+    backends = backend_directory.get(current_user.id).backends
     return jsonify({'backends': [{
         'id': b.id, 'name': b.name, 'kind': b.kind,
         'base_url': b.base_url, 'has_key': bool(b.api_key),
-        'is_default': b.is_default,
+        'is_default': b.is_default, 'pool': b.pool,
+        'health': backend_monitor.health(b.id),
     } for b in backends], 'kinds': list(Backend.KIND_DEFAULTS.keys())})
 
 
@@ -511,12 +2658,14 @@ def add_backend():
         kind=kind,
         base_url=data.get('base_url', defaults['url']),
         api_key=data.get('api_key', ''),
+        pool=(data.get('pool') or '').strip(),
     )
     # If first backend, make it default
     if not Backend.query.filter_by(user_id=current_user.id).first():
         b.is_default = True
     db.session.add(b)
     db.session.commit()
+    backend_directory.invalidate(current_user.id)
     return jsonify({'id': b.id, 'name': b.name})
 
 
@@ -528,10 +2677,15 @@ def update_backend(bid):
     if 'name' in data: b.name = data['name']
     if 'base_url' in data: b.base_url = data['base_url']
     if 'api_key' in data: b.api_key = data['api_key']
+    if 'pool' in data: b.pool = (data['pool'] or '').strip()
     if data.get('is_default'):
         Backend.query.filter_by(user_id=current_user.id).update({'is_default': False})
         b.is_default = True
     db.session.commit()
+    backend_directory.invalidate(current_user.id)
+    if 'base_url' in data or 'api_key' in data:
+        http_pools.drop(backend_pool(b))
+        backend_monitor.forget(b.id)
     return jsonify({'ok': True})
 
 
@@ -540,6 +2694,8 @@ def update_backend(bid):
 def delete_backend(bid):
     b = Backend.query.filter_by(id=bid, user_id=current_user.id).first_or_404()
     was_default = b.is_default
+    http_pools.drop(backend_pool(b))
+    backend_monitor.forget(b.id)
     db.session.delete(b)
     db.session.commit()
     if was_default:
@@ -547,6 +2703,7 @@ def delete_backend(bid):
         if first:
             first.is_default = True
             db.session.commit()
+    backend_directory.invalidate(current_user.id)
     return jsonify({'ok': True})
 
 
@@ -554,26 +2711,210 @@ def delete_backend(bid):
 @login_required
 def test_backend(bid):
     b = Backend.query.filter_by(id=bid, user_id=current_user.id).first_or_404()
-    try:
-        if b.kind == 'ollama':
-            resp = requests.get(f'{b.base_url}/api/tags', timeout=5)
-        else:
-            headers = {}
-            if b.api_key:
-                headers['Authorization'] = f'Bearer {b.api_key}'
-            resp = requests.get(f'{b.base_url.rstrip("/")}/v1/models', headers=headers, timeout=5)
-        resp.raise_for_status()
-        return jsonify({'ok': True, 'status': 'connected'})
-    except Exception as e:
-        return jsonify({'ok': False, 'error': str(e)})
+    error = backend_monitor.probe(b.info())
+    if error:
+        return jsonify({'ok': False, 'error': str(error), 'health': backend_monitor.health(b.id)})
+    return jsonify({'ok': True, 'status': 'connected', 'health': backend_monitor.health(b.id)})
 
 
 # ─── Web Search ───────────────────────────────────────────────────────
 
+PAGE_HEADERS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'}
+PAGE_MAX_BYTES = int(os.environ.get('PAGE_MAX_BYTES', 512 * 1024))  # read cap per fetched page
+PAGE_TIMEOUT = 8
+PAGE_CHUNK = 16 * 1024
+
+# Search-enabled chat fetches SEARCH_FETCH_PAGES results concurrently and keeps the
+# first SEARCH_PAGES_USED that return text; the rest are cancelled, as is anything
+# still running at SEARCH_DEADLINE seconds.
+SEARCH_FETCH_PAGES = int(os.environ.get('SEARCH_FETCH_PAGES', 4))
+SEARCH_PAGES_USED = int(os.environ.get('SEARCH_PAGES_USED', 2))
+SEARCH_DEADLINE = float(os.environ.get('SEARCH_DEADLINE', 6))
+
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 900))
+PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 3600))
+WEB_CACHE_STALE = int(os.environ.get('WEB_CACHE_STALE', 86400))  # keep validators this long past expiry
+WEB_CACHE_MAX_ENTRIES = int(os.environ.get('WEB_CACHE_MAX_ENTRIES', 2000))
+WEB_CACHE_MAX_MB = float(os.environ.get('WEB_CACHE_MAX_MB', 32))
+WEB_CACHE_PERSIST = os.environ.get('WEB_CACHE_PERSIST', '0') == '1'
+
+CacheEntry = namedtuple('CacheEntry', 'value size expires etag last_modified')
+
+
+class WebCache:
+    """TTL + LRU cache for search results and extracted page text.
+
+    Bounded by entry count and approximate size. Expired entries that carry an
+    ETag/Last-Modified are kept for WEB_CACHE_STALE seconds so the next fetch
+    can revalidate with a conditional request instead of re-downloading.
+    persist() adds a write-behind SQLite copy that is reloaded at startup.
+    """
+
+    def __init__(self, max_entries, max_bytes, stale):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale = stale
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._engine = None
+        self._writes = None
+
+    def lookup(self, key):
+        """(entry, fresh) for key; entry is None on a miss or once past the stale window."""
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and now > entry.expires + (self.stale if (entry.etag or entry.last_modified) else 0):
+                self._remove(key)
+                entry = None
+            fresh = bool(entry) and now <= entry.expires
+            if fresh:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry, fresh
+
+    def get(self, key):
+        entry, fresh = self.lookup(key)
+        return entry.value if fresh else None
+
+    def put(self, key, value, ttl, etag=None, last_modified=None):
+        size = len(json.dumps(value))
+        entry = CacheEntry(value, size, time.time() + ttl, etag, last_modified)
+        with self._lock:
+            self._store(key, entry)
+        self._persist(key, entry)
+
+    def refresh(self, key, entry, ttl):
+        """A 304 came back: the stale entry is good for another ttl."""
+        entry = entry._replace(expires=time.time() + ttl)
+        with self._lock:
+            self._store(key, entry)
+            self.revalidated += 1
+        self._persist(key, entry)
+        return entry.value
+
+    def _store(self, key, entry):
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = entry
+        self.size += entry.size
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key).size
+
+    def persist(self, engine):
+        """Load unexpired rows and mirror future writes to the web_cache_entry table."""
+        table = WebCacheEntry.__table__
+        horizon = time.time() - self.stale
+        with engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.expires_at < horizon))
+            rows = conn.execute(table.select().order_by(table.c.expires_at)).all()
+        with self._lock:
+            for row in rows[-self.max_entries:]:
+                self._store(row.key, CacheEntry(json.loads(row.value), len(row.value), row.expires_at,
+                                                row.etag, row.last_modified))
+        self._engine = engine
+        self._writes = queue.SimpleQueue()
+        threading.Thread(target=self._writer, name='web-cache-writer', daemon=True).start()
+
+    def _persist(self, key, entry):
+        if self._writes is not None:
+            self._writes.put((key, entry))
+
+    def _writer(self):
+        table = WebCacheEntry.__table__
+        while True:
+            batch = {}
+            key, entry = self._writes.get()
+            batch[key] = entry
+            while not self._writes.empty():  # coalesce bursts into one transaction
+                key, entry = self._writes.get()
+                batch[key] = entry
+            try:
+                with self._engine.begin() as conn:
+                    conn.execute(table.delete().where(table.c.key.in_(list(batch))))
+                    conn.execute(table.insert(), [
+                        {'key': k, 'value': json.dumps(e.value), 'etag': e.etag,
+                         'last_modified': e.last_modified, 'expires_at': e.expires}
+                        for k, e in batch.items()])
+            except Exception as e:
+                print(f'Web cache write failed: {e}', file=sys.stderr)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'size_kb': round(self.size / 1024),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'revalidated': self.revalidated,
+                'evictions': self.evictions,
+                'persistent': self._engine is not None,
+            }
+
+
+web_cache = WebCache(WEB_CACHE_MAX_ENTRIES, int(WEB_CACHE_MAX_MB * 2**20), WEB_CACHE_STALE)
+
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|mc_eid|ref_src)$')
+
+
+def search_cache_key(query, num_results):
+    return f"search:{num_results}:{' '.join(query.lower().split())}"
+
+
+def page_cache_key(url, max_chars):
+    """Normalize scheme/host case, default ports, fragments and tracking params."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if parts.port and (parts.scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = f'{host}:{parts.port}'
+    params = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                    if not TRACKING_PARAMS.match(k))
+    normalized = urlunsplit((parts.scheme.lower(), host, parts.path or '/', urlencode(params), ''))
+    return f'page:{max_chars}:{normalized}'
+
+
+def conditional_headers(entry):
+    headers = dict(PAGE_HEADERS)
+    if entry and entry.etag:
+        headers['If-None-Match'] = entry.etag
+    if entry and entry.last_modified:
+        headers['If-Modified-Since'] = entry.last_modified
+    return headers
+
+
+def cache_page(key, text, headers):
+    if text and 'no-store' not in headers.get('Cache-Control', ''):
+        web_cache.put(key, text, PAGE_CACHE_TTL, headers.get('ETag'), headers.get('Last-Modified'))
+
+
 def web_search(query, num_results=5):
-    """Search DuckDuckGo and return results."""
+    """Search DuckDuckGo and return results (cached for SEARCH_CACHE_TTL)."""
+    key = search_cache_key(query, num_results)
+    cached = web_cache.get(key)
+    if cached is not None:
+        return cached
+    results = search_duckduckgo(query, num_results)
+    if results and results[0].get('title') != 'Search error':
+        web_cache.put(key, results, SEARCH_CACHE_TTL)
+    return results
+
+
+def search_duckduckgo(query, num_results):
     try:
-        resp = requests.get('https://html.duckduckgo.com/html/', params={'q': query}, headers={
+        resp = http_pools.get('search', 'https://html.duckduckgo.com/html/', params={'q': query}, headers={
             'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'
         }, timeout=10)
         resp.raise_for_status()
@@ -622,23 +2963,254 @@ def web_search(query, num_results=5):
         return [{'title': 'Search error', 'url': '', 'snippet': str(e)}]
 
 
+# Elements whose text never reaches the prompt, and class/id/role hints for
+# boilerplate containers (menus, cookie banners, sidebars...)
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'canvas', 'iframe', 'head',
+             'nav', 'header', 'footer', 'aside', 'form', 'button', 'select'}
+BOILERPLATE = re.compile(r'(^|[\s_-])(nav|navbar|menu|sidebar|footer|header|breadcrumbs?|cookie|'
+                         r'banner|consent|share|social|related|comments?|advert|ads?|promo|subscribe)($|[\s_-])', re.I)
+BLOCK_TAGS = {'p', 'div', 'section', 'article', 'main', 'br', 'li', 'ul', 'ol', 'tr', 'table',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'blockquote', 'dd', 'dt', 'figcaption'}
+CONTENT_TAGS = {'main', 'article'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source',
+             'track', 'wbr'}
+# End tag may be omitted; these are never skipped for their attributes alone
+OPTIONAL_END_TAGS = {'li', 'p', 'dt', 'dd', 'option', 'optgroup', 'tr', 'td', 'th', 'thead', 'tbody',
+                     'tfoot', 'colgroup', 'caption', 'rp', 'rt'}
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+SNIFF_BYTES = 2048
+
+
+class TextExtractor(HTMLParser):
+    """Incremental HTML -> text that drops scripts, styles and page chrome.
+
+    Text inside <main>/<article> is collected separately; it is preferred when
+    present. `done` turns true once enough text is collected so the caller can
+    stop reading the response.
+    """
+
+    def __init__(self, max_chars):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.main_parts = []
+        self.length = 0
+        self.main_length = 0
+        self.open_tags = []   # unclosed non-void elements
+        self.skip_at = None   # index in open_tags of the element being skipped
+        self.content_depth = 0
+
+    @property
+    def done(self):
+        return self.main_length >= self.max_chars or self.length >= self.max_chars * 4
+
+    def handle_starttag(self, tag, attrs):
+        if self.skip_at is not None:
+            if tag == 'body' and self.open_tags[self.skip_at] == 'head':
+                del self.open_tags[self.skip_at:]   # <body> closes an unterminated <head>
+                self.skip_at = None
+            else:
+                if tag not in VOID_TAGS:
+                    self.open_tags.append(tag)
+                return
+        attrs = dict(attrs)
+        hint = ' '.join(filter(None, (attrs.get('class'), attrs.get('id'), attrs.get('role'))))
+        if tag in SKIP_TAGS or (tag not in OPTIONAL_END_TAGS and (
+                (hint and tag not in CONTENT_TAGS and BOILERPLATE.search(hint))
+                or 'hidden' in attrs or attrs.get('aria-hidden') == 'true')):
+            if tag not in VOID_TAGS:
+                self.skip_at = len(self.open_tags)
+                self.open_tags.append(tag)
+            return
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+        if tag in CONTENT_TAGS:
+            self.content_depth += 1
+        if tag in BLOCK_TAGS:
+            self.add('\n')
+
+    def handle_endtag(self, tag):
+        # Pop back to the matching element; anything opened after it closed implicitly,
+        # so a skipped element always ends with its parent
+        for i in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[i] == tag:
+                del self.open_tags[i:]
+                break
+        if self.skip_at is not None:
+            if len(self.open_tags) <= self.skip_at:
+                self.skip_at = None
+            return
+        if tag in CONTENT_TAGS and self.content_depth:
+            self.content_depth -= 1
+        if tag in BLOCK_TAGS:
+            self.add('\n')
+
+    def handle_data(self, data):
+        if self.skip_at is None and not self.done:
+            self.add(data)
+
+    def add(self, text):
+        self.parts.append(text)
+        self.length += len(text)
+        if self.content_depth:
+            self.main_parts.append(text)
+            self.main_length += len(text)
+
+    def text(self):
+        main = ' '.join(''.join(self.main_parts).split())
+        text = main if len(main) >= min(self.max_chars, 200) else ' '.join(''.join(self.parts).split())
+        return text[:self.max_chars]
+
+
+class PageReader:
+    """Feed raw response chunks; decodes with the right charset and extracts text as it goes.
+
+    Charset precedence: BOM, then the Content-Type header, then a <meta> tag in the
+    first SNIFF_BYTES, then charset_normalizer's guess, then UTF-8.
+    """
+
+    def __init__(self, content_type, max_chars):
+        mimetype, params = parse_options_header(content_type or '')
+        self.charset = params.get('charset')
+        self.html = mimetype in ('', 'text/html', 'application/xhtml+xml')
+        self.binary = not (self.html or mimetype.startswith('text/') or mimetype.endswith(('json', 'xml')))
+        self.max_chars = max_chars
+        self.extractor = TextExtractor(max_chars)
+        self.plain = []
+        self.plain_length = 0
+        self.decoder = None
+        self.pending = b''
+        self.bytes_read = 0
+
+    @property
+    def done(self):
+        if self.binary or self.bytes_read >= PAGE_MAX_BYTES:
+            return True
+        return self.extractor.done if self.html else self.plain_length >= self.max_chars
+
+    def feed(self, chunk):
+        self.bytes_read += len(chunk)
+        if self.decoder is None:
+            self.pending += chunk
+            if len(self.pending) < SNIFF_BYTES:
+                return
+            chunk, self.pending = self.pending, b''
+            self.decoder = codecs.getincrementaldecoder(self.sniff(chunk))(errors='replace')
+        self.write(self.decoder.decode(chunk))
+
+    def sniff(self, head):
+        for bom, name in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'),
+                          (codecs.BOM_UTF16_BE, 'utf-16')):
+            if head.startswith(bom):
+                return name
+        candidates = [self.charset]
+        if self.html:
+            m = META_CHARSET.search(head[:SNIFF_BYTES])
+            candidates.append(m and m.group(1).decode('ascii', 'ignore'))
+        for name in candidates:
+            if name:
+                try:
+                    return codecs.lookup(name).name
+                except LookupError:
+                    pass
+        guess = charset_normalizer.from_bytes(head).best()
+        return guess.encoding if guess else 'utf-8'
+
+    def write(self, text):
+        if self.html:
+            self.extractor.feed(text)
+        else:
+            self.plain.append(text)
+            self.plain_length += len(text)
+
+    def text(self):
+        if self.binary:
+            return ''
+        if self.decoder is None:
+            self.decoder = codecs.getincrementaldecoder(self.sniff(self.pending))(errors='replace')
+            self.write(self.decoder.decode(self.pending))
+        self.write(self.decoder.decode(b'', final=True))
+        if self.html:
+            self.extractor.close()
+            return self.extractor.text()
+        return ' '.join(''.join(self.plain).split())[:self.max_chars]
+
+
 def fetch_page_text(url, max_chars=3000):
-    """Fetch a page and extract text content."""
+    """Fetch a page and extract text content (cached; revalidated with ETag/Last-Modified)."""
     try:
-        resp = requests.get(url, headers={
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'
-        }, timeout=8)
-        resp.raise_for_status()
-        # Strip HTML tags
-        text = re.sub(r'<script[^>]*>.*?</script>', '', resp.text, flags=re.DOTALL)
-        text = re.sub(r'<style[^>]*>.*?</style>', '', text, flags=re.DOTALL)
-        text = re.sub(r'<[^>]+>', ' ', text)
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text[:max_chars]
+        key = page_cache_key(url, max_chars)
+        entry, fresh = web_cache.lookup(key)
+        if fresh:
+            return entry.value
+        resp = http_pools.get('web', url, headers=conditional_headers(entry), timeout=PAGE_TIMEOUT, stream=True)
+        with contextlib.closing(resp):
+            if resp.status_code == 304 and entry:
+                return web_cache.refresh(key, entry, PAGE_CACHE_TTL)
+            resp.raise_for_status()
+            reader = PageReader(resp.headers.get('Content-Type'), max_chars)
+            for chunk in resp.iter_content(PAGE_CHUNK):
+                reader.feed(chunk)
+                if reader.done:
+                    break
+        text = reader.text()
+        cache_page(key, text, resp.headers)
+        return text
     except:
         return ''
 
 
+async def afetch_page_text(url, max_chars=3000):
+    """Async fetch_page_text() on the shared async client (cancellable)."""
+    try:
+        key = page_cache_key(url, max_chars)
+        entry, fresh = web_cache.lookup(key)
+        if fresh:
+            return entry.value
+        async with http_pools.stream('web', 'GET', url, headers=conditional_headers(entry), follow_redirects=True,
+                                     timeout=httpx.Timeout(PAGE_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)) as resp:
+            if resp.status_code == 304 and entry:
+                return web_cache.refresh(key, entry, PAGE_CACHE_TTL)
+            resp.raise_for_status()
+            reader = PageReader(resp.headers.get('Content-Type'), max_chars)
+            async for chunk in resp.aiter_bytes(PAGE_CHUNK):
+                reader.feed(chunk)
+                if reader.done:
+                    break
+        text = reader.text()
+        cache_page(key, text, resp.headers)
+        return text
+    except Exception:  # any bad page (malformed URL, odd encoding, ...) is just skipped; cancellation still propagates
+        return ''
+
+
+async def fetch_pages(results, want=SEARCH_PAGES_USED, deadline=SEARCH_DEADLINE):
+    """Fetch result pages concurrently; yield (result, text) as each one lands.
+
+    Stops after `want` non-empty pages or at the deadline and cancels whatever
+    is still in flight.
+    """
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    tasks = {asyncio.ensure_future(afetch_page_text(r['url'])): r for r in results if r.get('url')}
+    pending, found = set(tasks), 0
+    try:
+        while pending and found < want:
+            done, pending = await asyncio.wait(pending, timeout=max(end - loop.time(), 0),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                text = task.result()
+                if text and found < want:
+                    found += 1
+                    yield tasks[task], text
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 @app.route('/api/web/search')
 @login_required
 def api_web_search():
@@ -649,6 +3221,138 @@ def api_web_search():
     return jsonify({'results': results})
 
 
+# ─── Context window ───────────────────────────────────────────────────
+
+# Context size in tokens by model-name prefix (longest match wins). Ollama requests
+# send this as options.num_ctx, so the window the prompt is trimmed to is the one
+# the model actually runs with.
+CONTEXT_LIMITS = {
+    'gpt-4o': 128000, 'gpt-4.1': 128000, 'gpt-4-turbo': 128000, 'gpt-4': 8192,
+    'gpt-3.5': 16385, 'o1': 128000, 'o3': 128000, 'o4': 128000,
+    'llama3': 8192, 'llama3.1': 8192, 'llama3.2': 8192, 'llama2': 4096,
+    'qwen': 8192, 'mistral': 8192, 'mixtral': 8192, 'gemma': 8192, 'phi': 4096,
+    'deepseek': 8192, 'codellama': 4096,
+}
+
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def model_prefix(table, model):
+    """Longest key of table that prefixes the model's base name (org/ and :tag stripped)."""
+    name = (model or '').lower().rsplit('/', 1)[-1].split(':', 1)[0]
+    best = None
+    for prefix in table:
+        if name.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return best
+
+
+def context_limit(model):
+    best = model_prefix(CONTEXT_LIMITS, model)
+    return CONTEXT_LIMITS[best] if best else CONTEXT_DEFAULT_TOKENS
+
+
+def approx_tokens(text):
+    """Rough token count (~4 chars per token for English BPE vocabularies)."""
+    return len(text) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+# Stored reasoning (kept for display) is not sent back to the model
+THINK_BLOCK = re.compile(r'<think>.*?</think>\s*', re.S)
+
+
+def build_context(convo, system_prompt, model):
+    """Pinned system prompt + optional summary + the newest messages that fit the budget.
+
+    Reads at most CONTEXT_MAX_MESSAGES rows, newest first, so cost per turn is
+    bounded by the window rather than the conversation length. Returns the chat
+    messages and the id of the oldest message kept (None if nothing was dropped).
+    """
+    budget = max(context_limit(model) - CONTEXT_RESPONSE_TOKENS, 256)
+    messages = [{'role': 'system', 'content': system_prompt}]
+    budget -= approx_tokens(system_prompt)
+    if convo.summary:
+        summary = f'Summary of the earlier conversation:\n{convo.summary}'
+        messages.append({'role': 'system', 'content': summary})
+        budget -= approx_tokens(summary)
+
+    rows = db.session.query(Message.id, Message.role, Message.content)\
+        .filter(Message.conversation_id == convo.id, Message.role.in_(('user', 'assistant')))\
+        .order_by(Message.created_at.desc(), Message.id.desc())\
+        .limit(CONTEXT_MAX_MESSAGES + 1).all()
+
+    window = []
+    for row in rows[:CONTEXT_MAX_MESSAGES]:
+        cost = approx_tokens(row.content)
+        if window and cost > budget:
+            break
+        budget -= cost
+        window.append(row)
+    window.reverse()
+
+    truncated = len(window) < len(rows)
+    oldest_id = window[0].id if window and truncated else None
+    messages.extend({'role': r.role, 'content': THINK_BLOCK.sub('', r.content) if r.role == 'assistant' else r.content}
+                    for r in window)
+    return messages, oldest_id
+
+
+SUMMARY_SYSTEM = """You maintain a running summary of a conversation between a user and an AI assistant.
+Merge the previous summary with the new messages into one concise summary (at most {words} words).
+Keep facts, names, decisions, preferences and open questions. Output only the summary."""
+
+
+def pending_summary_rows(convo_id, before_id):
+    """Messages that left the window since the last summary (bounded per pass)."""
+    convo = db.session.get(Conversation, convo_id)
+    rows = db.session.query(Message.id, Message.role, Message.content)\
+        .filter(Message.conversation_id == convo_id,
+                Message.id > (convo.summary_upto or 0), Message.id < before_id,
+                Message.role.in_(('user', 'assistant')))\
+        .order_by(Message.id).limit(CONTEXT_MAX_MESSAGES).all()
+    return convo.summary or '', rows
+
+
+def store_summary(convo_id, summary, upto_id):
+    convo = db.session.get(Conversation, convo_id)
+    convo.summary = summary
+    convo.summary_upto = upto_id
+    db.session.commit()
+
+
+async def update_summary(backend, model, convo_id, before_id, user_id=None):
+    """Fold messages that dropped out of the window into Conversation.summary."""
+    previous, rows = await run_sync(pending_summary_rows, convo_id, before_id)
+    if not rows:
+        return
+    transcript = '\n\n'.join(f'{r.role.upper()}: {r.content}' for r in rows)
+    words = max(context_limit(model) // 16, 100)
+    messages = [
+        {'role': 'system', 'content': SUMMARY_SYSTEM.format(words=words)},
+        {'role': 'user', 'content': f'Previous summary:\n{previous or "(none)"}\n\nNew messages:\n{transcript}'},
+    ]
+    parts = []
+    ticket = admission.ticket(user_id, backend, 'background')
+    async for token, done in admitted(ticket, astream_backend(backend, model, messages)):
+        parts.append(token)
+        if done:
+            break
+    summary = ''.join(parts).strip()
+    if summary:
+        await run_sync(store_summary, convo_id, summary, rows[-1].id)
+
+
+_background_tasks = set()
+
+
+def spawn(coro):
+    """Fire-and-forget a coroutine on the running loop (keeps a reference until done)."""
+    task = asyncio.get_running_loop().create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
 # ─── Chat / Streaming ────────────────────────────────────────────────
 
 THINK_SYSTEM = """Think through this step-by-step before answering. Show your reasoning process clearly.
@@ -665,10 +3369,26 @@ Always cite your sources. If the search results don't contain the answer, say so
 IMAGE_SYSTEM = """You can generate images. When the user asks you to draw, paint, create, or generate an image, include exactly one [IMG: detailed prompt] tag in your response. Write a descriptive Stable Diffusion prompt inside the tag with quality keywords. Example: Here's your image!\n[IMG: a fluffy orange cat sitting on a windowsill, golden hour lighting, detailed fur, photorealistic, 8k]\nHope you like it!"""
 
 
-@app.route('/api/chat', methods=['POST'])
-@login_required
-def api_chat():
-    data = request.get_json()
+class ChatTurn:
+    """What the streaming half of /api/chat needs, detached from the request and the ORM."""
+
+    def __init__(self, user_id, convo_id, title, backend, model, user_msg, messages, search,
+                 window_start=None, reasoning=False, stream_id=None):
+        self.user_id = user_id
+        self.convo_id = convo_id
+        self.title = title
+        self.backend = backend
+        self.model = model
+        self.user_msg = user_msg
+        self.messages = messages
+        self.search = search
+        self.window_start = window_start  # oldest message id in the prompt, if older ones were dropped
+        self.reasoning = reasoning  # forward reasoning blocks as 'reasoning' events
+        self.stream_id = stream_id  # client's X-Stream-Id, for POST /api/streams/<id>/stop
+
+
+def open_chat(data):
+    """Validate a chat request, store the user message and return the turn's event stream."""
     convo_id = data.get('conversation_id')
     user_msg = data.get('message', '').strip()
     model = data.get('model', current_user.default_model)
@@ -676,13 +3396,15 @@ def api_chat():
     backend_id = data.get('backend_id')
     search_enabled = data.get('search', False)
     think_enabled = data.get('think', False)
+    reasoning = bool(data.get('reasoning', False))
 
     if not user_msg:
-        return jsonify({'error': 'Empty message'}), 400
+        raise AppError('Empty message')
 
     backend = get_active_backend(backend_id)
     if not backend:
-        return jsonify({'error': 'No backend configured'}), 400
+        raise AppError('No backend configured')
+    admission.check(current_user.id)  # 429 before the message is stored
 
     # Get or create conversation
     if convo_id:
@@ -690,9 +3412,9 @@ def api_chat():
     else:
         convo = Conversation(user_id=current_user.id, model=model, personality=personality_key)
         db.session.add(convo)
-        db.session.commit()
+        db.session.flush()
 
-    if not convo.messages:
+    if not convo_id or not db.session.query(Message.query.filter_by(conversation_id=convo.id).exists()).scalar():
         convo.title = user_msg[:80] + ('...' if len(user_msg) > 80 else '')
     convo.model = model
 
@@ -708,29 +3430,74 @@ def api_chat():
         system_parts.append(SEARCH_SYSTEM)
     system_parts.append(IMAGE_SYSTEM)
 
-    chat_messages = [{'role': 'system', 'content': '\n\n'.join(system_parts)}]
-    for m in convo.messages:
-        if m.role in ('user', 'assistant'):
-            chat_messages.append({'role': m.role, 'content': m.content})
+    chat_messages, window_start = build_context(convo, '\n\n'.join(system_parts), model)
+
+    stream_id = request_stream_id()
+    turn = ChatTurn(current_user.id, convo.id, convo.title, backend, model, user_msg,
+                    chat_messages, search_enabled, window_start, reasoning, stream_id)
+    if stream_id and request_stream_resume():
+        # Generation outlives this connection (GET /api/streams/<id> reattaches)
+        return generations.start(current_user.id, stream_id, chat_events(turn)).follow()
+    return chat_events(turn)
+
+
+def chat_image_payload(sd_prompt):
+    """txt2img parameters for an [IMG: ...] tag."""
+    return {
+        'prompt': sd_prompt,
+        'negative_prompt': 'blurry, low quality, deformed, ugly, disfigured',
+        'width': 512, 'height': 512,
+        'steps': 20, 'cfg_scale': 7.0,
+        'seed': -1, 'sampler_name': 'Euler a',
+    }
+
 
-    def generate():
+def save_assistant_message(convo_id, text):
+    """Write for db_writes: the reply plus the conversation's updated_at."""
+    def write(conn):
+        now = datetime.utcnow()
+        conn.execute(Message.__table__.insert().values(
+            conversation_id=convo_id, role='assistant', content=text, created_at=now))
+        conn.execute(Conversation.__table__.update().where(Conversation.id == convo_id).values(updated_at=now))
+    return write
+
+
+async def chat_events(turn):
+    """The streaming half of /api/chat: search, LLM tokens, images, persistence.
+
+    A stop request or client disconnect ends generation early; whatever was
+    generated by then is still saved.
+    """
+    with active_streams.open(turn.user_id, turn.stream_id) as handle:
         full_response = []
+        reasoning = []
+        saved = False
         search_results = []
+        chat_messages = turn.messages
+        user_msg = turn.user_msg
+        backend = turn.backend
+
+        def reply_text(text):
+            if reasoning:
+                return f"<think>{''.join(reasoning).strip()}</think>\n\n{text}"
+            return text
 
         # Web search if enabled
-        if search_enabled:
-            yield f"data: {json.dumps({'status': 'searching'})}\n\n"
-            search_results = web_search(user_msg, num_results=5)
-            yield f"data: {json.dumps({'search_results': search_results})}\n\n"
-
-            # Fetch top 2 page contents for deeper context
-            page_texts = []
-            for r in search_results[:2]:
-                if r.get('url'):
-                    yield f"data: {json.dumps({'status': 'reading', 'url': r['url']})}\n\n"
-                    text = fetch_page_text(r['url'])
-                    if text:
-                        page_texts.append(f"[{r['title']}]({r['url']})\n{text}")
+        if turn.search:
+            yield {'status': 'searching'}
+            search_results = await run_sync(web_search, user_msg, num_results=5)
+            yield {'search_results': search_results}
+
+            # Fetch the top pages concurrently for deeper context
+            candidates = [r for r in search_results if r.get('url')][:SEARCH_FETCH_PAGES]
+            pages = []
+            if candidates:
+                yield {'status': 'fetching', 'pages': len(candidates)}
+                async for r, text in fetch_pages(candidates):
+                    pages.append((r, text))
+                    yield {'page_read': {'title': r['title'], 'url': r['url']}}
+            pages.sort(key=lambda page: candidates.index(page[0]))
+            page_texts = [f"[{r['title']}]({r['url']})\n{text}" for r, text in pages]
 
             # Inject search context into messages
             search_context = "## Web Search Results\n\n"
@@ -745,60 +3512,46 @@ def api_chat():
             if len(chat_messages) >= 2 and chat_messages[-2].get('role') == 'user' and chat_messages[-2].get('content') == user_msg:
                 chat_messages.pop(-2)
 
-            yield f"data: {json.dumps({'status': 'generating'})}\n\n"
+            yield {'status': 'generating'}
 
+        ticket = admission.ticket(turn.user_id, backend, 'chat')
         try:
-            # Stream LLM response
-            if backend.kind == 'ollama':
-                streamer = stream_ollama(backend, model, chat_messages)
-            else:
-                streamer = stream_openai_compat(backend, model, chat_messages)
+            async for position in ticket.wait():
+                yield {'status': 'queued', 'position': position}
 
-            for token, done in streamer:
-                if token:
-                    full_response.append(token)
-                    yield f"data: {json.dumps({'token': token, 'conversation_id': convo.id})}\n\n"
-                if done:
-                    break
+            # Stream LLM response
+            upstream = astream_backend(backend, turn.model, chat_messages, turn.reasoning)
+            async with contextlib.aclosing(stoppable(upstream, handle)) as tokens:
+                async for token, done in tokens:
+                    if isinstance(token, Reasoning):
+                        reasoning.append(token)
+                        yield {'reasoning': str(token)}
+                    elif token:
+                        full_response.append(token)
+                        yield {'token': token, 'conversation_id': turn.convo_id}
+                    if done:
+                        break
+            ticket.release()  # the slot is for the LLM; image generation has its own queue
 
             assistant_text = ''.join(full_response)
+            stopped = handle is not None and handle.stopped
 
-            # Check for [IMG: ...] tags — AI decided to generate an image
-            img_matches = re.findall(r'\[IMG:\s*(.+?)\]', assistant_text)
+            # Check for [IMG: ...] tags — AI decided to generate an image (not after a stop)
+            img_matches = [] if stopped else re.findall(r'\[IMG:\s*(.+?)\]', assistant_text)
             images_out = []
             if img_matches:
-                yield f"data: {json.dumps({'status': 'generating_image'})}\n\n"
-                for sd_prompt in img_matches:
-                    try:
-                        sd_resp = requests.post(f'{SD_BASE}/sdapi/v1/txt2img', json={
-                            'prompt': sd_prompt,
-                            'negative_prompt': 'blurry, low quality, deformed, ugly, disfigured',
-                            'width': 512, 'height': 512,
-                            'steps': 20, 'cfg_scale': 7.0,
-                            'seed': -1, 'sampler_name': 'Euler a',
-                        }, timeout=300)
-                        sd_resp.raise_for_status()
-                        sd_result = sd_resp.json()
-                        for img_b64 in sd_result.get('images', []):
-                            fname = f'{uuid.uuid4().hex}.png'
-                            fpath = os.path.join(IMAGES_DIR, fname)
-                            with open(fpath, 'wb') as f:
-                                f.write(base64.b64decode(img_b64))
-                            info = json.loads(sd_result.get('info', '{}')) if isinstance(sd_result.get('info'), str) else sd_result.get('info', {})
-                            actual_seed = info.get('seed', -1)
-                            img_record = GeneratedImage(
-                                user_id=current_user.id, prompt=sd_prompt,
-                                width=512, height=512, steps=20, cfg_scale=7.0,
-                                seed=actual_seed, filename=fname,
-                            )
-                            db.session.add(img_record)
-                            db.session.commit()
-                            images_out.append({'url': f'/static/images/{fname}', 'seed': actual_seed, 'prompt': sd_prompt})
-                    except Exception as img_err:
-                        yield f"data: {json.dumps({'status': 'image_error', 'message': str(img_err)})}\n\n"
+                yield {'status': 'generating_image'}
+                jobs = [image_jobs.submit(turn.user_id, chat_image_payload(p)) for p in img_matches]
+                for job in jobs:
+                    async for snap in job.updates():
+                        if snap['status'] == 'running':
+                            yield {'status': 'generating_image', 'job_id': job.id, 'progress': snap['progress']}
+                    if job.error:
+                        yield {'status': 'image_error', 'message': job.error}
+                    images_out.extend(job.images)
 
                 if images_out:
-                    yield f"data: {json.dumps({'images': images_out})}\n\n"
+                    yield {'images': images_out}
 
                 # Replace [IMG: ...] with image markdown in saved text
                 for img in images_out:
@@ -807,20 +3560,78 @@ def api_chat():
                 assistant_text = re.sub(r'\[IMG:\s*.+?\]', '', assistant_text)
 
             if assistant_text.strip():
-                with app.app_context():
-                    amsg = Message(conversation_id=convo.id, role='assistant', content=assistant_text)
-                    db.session.add(amsg)
-                    convo.updated_at = datetime.utcnow()
-                    db.session.commit()
+                saved = True
+                await db_writes.arun(save_assistant_message(turn.convo_id, reply_text(assistant_text)))
+
+            if CONTEXT_SUMMARIES and turn.window_start:
+                spawn(update_summary(backend, turn.model, turn.convo_id, turn.window_start, turn.user_id))
+
+            done_event = {'done': True, 'conversation_id': turn.convo_id, 'title': turn.title}
+            if stopped:
+                done_event['stopped'] = True
+            yield done_event
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client went away; the upstream is closed by now, keep the partial reply
+            if full_response and not saved:
+                partial = re.sub(r'\[IMG:\s*.+?\]', '', ''.join(full_response))
+                db_writes.submit(save_assistant_message(turn.convo_id, reply_text(partial)))
+            raise
+
+        except AppError as e:
+            yield {'error': e.message, 'retry_after': e.retry_after}
+        except UPSTREAM_CONNECT_ERRORS:
+            if backend.peers:
+                yield {'error': f'Cannot connect to any backend in pool "{backend.pool}"'}
+            else:
+                yield {'error': f'Cannot connect to {backend.name} at {backend.base_url}'}
+        except Exception as e:
+            yield {'error': str(e)}
+        finally:
+            ticket.release()
 
-            yield f"data: {json.dumps({'done': True, 'conversation_id': convo.id, 'title': convo.title})}\n\n"
 
-        except requests.ConnectionError:
-            yield f"data: {json.dumps({'error': f'Cannot connect to {backend.name} at {backend.base_url}'})}\n\n"
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+@app.route('/api/chat', methods=['POST'])
+@login_required
+def api_chat():
+    try:
+        events = open_chat(request.get_json() or {})
+    except AppError as e:
+        return e.response()
+    return stream_response(events)
+
+
+ASYNC_ROUTES['/api/chat'] = AsyncRoute(frozenset({'POST'}), open_chat)
+
+
+def open_resume(data, stream_id):
+    gen = generations.get(current_user.id, stream_id)
+    if not gen:
+        raise AppError('Stream not found', 404)
+    return gen.follow(gen.parse_event_id(request.headers.get('Last-Event-ID')))
+
+
+@app.route('/api/streams/<stream_id>')
+@login_required
+def resume_stream(stream_id):
+    """Reattach to a chat generation, replaying everything after Last-Event-ID."""
+    try:
+        events = open_resume({}, stream_id)
+    except AppError as e:
+        return e.response()
+    return stream_response(events)
+
+
+ASYNC_ROUTES['/api/streams/<stream_id>'] = AsyncRoute(frozenset({'GET'}), open_resume)
 
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+@app.route('/api/streams/<stream_id>/stop', methods=['POST'])
+@login_required
+def stop_stream(stream_id):
+    """Stop a chat or app stream the client started with an X-Stream-Id header."""
+    if not active_streams.stop(current_user.id, stream_id):
+        return jsonify({'error': 'Stream not found'}), 404
+    return jsonify({'success': True})
 
 # ─── Models ───────────────────────────────────────────────────────────
 
@@ -832,34 +3643,11 @@ def list_models():
     if not backend:
         return jsonify({'models': [], 'error': 'No backend configured'})
 
-    try:
-        if backend.kind == 'ollama':
-            resp = requests.get(f'{backend.base_url}/api/tags', timeout=5)
-            resp.raise_for_status()
-            raw = resp.json().get('models', [])
-            models = []
-            for m in raw:
-                size_bytes = m.get('size', 0)
-                size_str = f'{size_bytes / 1e9:.1f} GB' if size_bytes > 1e9 else f'{size_bytes / 1e6:.0f} MB'
-                models.append({
-                    'name': m['name'], 'size': size_str,
-                    'family': m.get('details', {}).get('family', ''),
-                    'params': m.get('details', {}).get('parameter_size', ''),
-                })
-            return jsonify({'models': models, 'backend': backend.name, 'kind': backend.kind})
-        else:
-            headers = {}
-            if backend.api_key:
-                headers['Authorization'] = f'Bearer {backend.api_key}'
-            resp = requests.get(f'{backend.base_url.rstrip("/")}/v1/models', headers=headers, timeout=5)
-            resp.raise_for_status()
-            raw = resp.json().get('data', [])
-            models = [{'name': m.get('id', m.get('name', '')), 'size': '', 'family': '', 'params': ''} for m in raw]
-            return jsonify({'models': models, 'backend': backend.name, 'kind': backend.kind})
-    except requests.ConnectionError:
-        return jsonify({'models': [], 'error': f'{backend.name} not running'}), 200
-    except Exception as e:
-        return jsonify({'models': [], 'error': str(e)}), 200
+    models, error = backend_monitor.models(backend)
+    if error:
+        return jsonify({'models': [], 'error': error}), 200
+    return jsonify({'models': models, 'backend': backend.name, 'kind': backend.kind,
+                    'health': backend_monitor.health(backend.id)})
 
 
 @app.route('/api/models/pull', methods=['POST'])
@@ -877,7 +3665,7 @@ def pull_model():
 
     def generate():
         try:
-            resp = requests.post(f'{backend.base_url}/api/pull', json={
+            resp = http_pools.post(backend_pool(backend), f'{backend.base_url}/api/pull', json={
                 'name': model_name, 'stream': True
             }, stream=True, timeout=600)
             resp.raise_for_status()
@@ -892,6 +3680,7 @@ def pull_model():
                     if 'error' in chunk:
                         yield f"data: {json.dumps({'error': chunk['error']})}\n\n"
                         return
+            backend_monitor.invalidate(backend.id)
             yield f"data: {json.dumps({'done': True})}\n\n"
         except requests.ConnectionError:
             yield f"data: {json.dumps({'error': 'Cannot connect to Ollama'})}\n\n"
@@ -908,8 +3697,10 @@ def delete_model(model_name):
     if not backend or backend.kind != 'ollama':
         return jsonify({'error': 'Delete is only supported for Ollama backends'}), 400
     try:
-        resp = requests.delete(f'{backend.base_url}/api/delete', json={'name': model_name}, timeout=30)
+        resp = http_pools.request(backend_pool(backend), 'DELETE', f'{backend.base_url}/api/delete',
+                                  json={'name': model_name}, timeout=30)
         resp.raise_for_status()
+        backend_monitor.invalidate(backend.id)
         return jsonify({'ok': True})
     except requests.ConnectionError:
         return jsonify({'error': 'Cannot connect to Ollama'}), 502
@@ -918,6 +3709,139 @@ def delete_model(model_name):
 
 # ─── Search ───────────────────────────────────────────────────────────
 
+# FTS5 external-content indexes over message.content and conversation.title. The
+# triggers keep them in sync with every insert/update/delete; ensure_search_index()
+# creates them (and backfills existing rows) at startup.
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+        content, content='message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN
+        INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END""",
+    """CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); END""",
+    """CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF content ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS conversation_fts USING fts5(
+        title, content='conversation', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS conversation_fts_ai AFTER INSERT ON conversation BEGIN
+        INSERT INTO conversation_fts(rowid, title) VALUES (new.id, new.title); END""",
+    """CREATE TRIGGER IF NOT EXISTS conversation_fts_ad AFTER DELETE ON conversation BEGIN
+        INSERT INTO conversation_fts(conversation_fts, rowid, title) VALUES ('delete', old.id, old.title); END""",
+    """CREATE TRIGGER IF NOT EXISTS conversation_fts_au AFTER UPDATE OF title ON conversation BEGIN
+        INSERT INTO conversation_fts(conversation_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        INSERT INTO conversation_fts(rowid, title) VALUES (new.id, new.title); END""",
+]
+
+SEARCH_LIMIT = 20
+SEARCH_CANDIDATES = 200
+SNIPPET_TOKENS = 12
+MARK_OPEN, MARK_CLOSE = '\x02', '\x03'  # sentinels from snippet()/highlight(), never in user text
+
+search_fts = False  # set by ensure_search_index()
+
+
+def ensure_search_index():
+    """Create the FTS5 tables/triggers; rebuild them when they are new. Falls back to ILIKE."""
+    global search_fts
+    if db.engine.dialect.name != 'sqlite':
+        return
+    try:
+        with db.engine.begin() as conn:
+            existed = conn.execute(db.text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'message_fts'")).first() is not None
+            for ddl in SEARCH_INDEX_DDL:
+                conn.execute(db.text(ddl))
+            if not existed:
+                conn.execute(db.text("INSERT INTO message_fts(message_fts) VALUES ('rebuild')"))
+                conn.execute(db.text("INSERT INTO conversation_fts(conversation_fts) VALUES ('rebuild')"))
+    except Exception as e:  # SQLite built without FTS5
+        print(f'Search index unavailable, using LIKE scans: {e}', file=sys.stderr)
+        return
+    search_fts = True
+
+
+def fts_query(q):
+    """User text -> FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r'\w+', q)
+    if not words:
+        return None
+    terms = ['"%s"' % w for w in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def snippet_parts(marked):
+    """Split a sentinel-marked snippet into plain text and escaped HTML with <mark> tags."""
+    plain = marked.replace(MARK_OPEN, '').replace(MARK_CLOSE, '')
+    html = str(escape(marked)).replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>')
+    return plain, html
+
+
+def search_index(user_id, q):
+    match = fts_query(q)
+    if not match:
+        return []
+    params = {'match': match, 'uid': user_id, 'limit': SEARCH_CANDIDATES}
+
+    # Best-ranked messages first; bm25 is lower-is-better
+    msg_rows = db.session.execute(db.text(f"""
+        SELECT m.conversation_id, m.role, c.title, c.updated_at,
+               snippet(message_fts, 0, :open, :close, '...', {SNIPPET_TOKENS}) AS snip
+        FROM message_fts
+        JOIN message m ON m.id = message_fts.rowid
+        JOIN conversation c ON c.id = m.conversation_id
+        WHERE message_fts MATCH :match AND c.user_id = :uid
+        ORDER BY bm25(message_fts) LIMIT :limit""").columns(updated_at=db.DateTime),
+        {**params, 'open': MARK_OPEN, 'close': MARK_CLOSE}).all()
+    title_rows = db.session.execute(db.text("""
+        SELECT c.id, c.title, c.updated_at, highlight(conversation_fts, 0, :open, :close) AS hl
+        FROM conversation_fts
+        JOIN conversation c ON c.id = conversation_fts.rowid
+        WHERE conversation_fts MATCH :match AND c.user_id = :uid
+        ORDER BY bm25(conversation_fts) LIMIT :limit""").columns(updated_at=db.DateTime),
+        {**params, 'open': MARK_OPEN, 'close': MARK_CLOSE}).all()
+
+    results = {}
+    for row in title_rows:
+        plain, html = snippet_parts(row.hl)
+        results[row.id] = {'conversation_id': row.id, 'title': row.title, 'snippet': plain,
+                           'snippet_html': html, 'role': None, 'updated_at': row.updated_at}
+    for row in msg_rows:
+        hit = results.get(row.conversation_id)
+        if hit and hit['role']:
+            continue
+        plain, html = snippet_parts(row.snip)
+        results[row.conversation_id] = {
+            'conversation_id': row.conversation_id, 'title': row.title, 'snippet': plain,
+            'snippet_html': html, 'role': row.role, 'updated_at': row.updated_at}
+        if len(results) >= SEARCH_LIMIT:
+            break
+    return list(results.values())[:SEARCH_LIMIT]
+
+
+def search_like(user_id, q):
+    """Fallback when FTS5 is unavailable: substring scan, one row per conversation."""
+    rows = db.session.query(Message.conversation_id, Message.role, Message.content,
+                            Conversation.title, Conversation.updated_at)\
+        .join(Conversation).filter(Conversation.user_id == user_id, Message.content.ilike(f'%{q}%'))\
+        .order_by(Message.created_at.desc()).limit(50).all()
+
+    results = {}
+    for m in rows:
+        if m.conversation_id in results:
+            continue
+        idx = m.content.lower().find(q.lower())
+        start = max(0, idx - 40)
+        end = min(len(m.content), idx + len(q) + 40)
+        marked = m.content[start:idx] + MARK_OPEN + m.content[idx:idx + len(q)] + MARK_CLOSE \
+            + m.content[idx + len(q):end]
+        plain, html = snippet_parts(('...' if start > 0 else '') + marked + ('...' if end < len(m.content) else ''))
+        results[m.conversation_id] = {'conversation_id': m.conversation_id, 'title': m.title, 'snippet': plain,
+                                      'snippet_html': html, 'role': m.role, 'updated_at': m.updated_at}
+    return list(results.values())
+
+
 @app.route('/api/search')
 @login_required
 def search():
@@ -925,32 +3849,10 @@ def search():
     if len(q) < 2:
         return jsonify({'results': []})
 
-    # Search conversations and messages
-    matching_msgs = Message.query.join(Conversation).filter(
-        Conversation.user_id == current_user.id,
-        Message.content.ilike(f'%{q}%')
-    ).order_by(Message.created_at.desc()).limit(50).all()
-
-    results = []
-    seen_convos = set()
-    for m in matching_msgs:
-        if m.conversation_id not in seen_convos:
-            seen_convos.add(m.conversation_id)
-            convo = m.conversation
-            # Find snippet
-            idx = m.content.lower().find(q.lower())
-            start = max(0, idx - 40)
-            end = min(len(m.content), idx + len(q) + 40)
-            snippet = ('...' if start > 0 else '') + m.content[start:end] + ('...' if end < len(m.content) else '')
-            results.append({
-                'conversation_id': convo.id,
-                'title': convo.title,
-                'snippet': snippet,
-                'role': m.role,
-                'date': convo.updated_at.strftime('%b %d, %Y'),
-            })
-
-    return jsonify({'results': results})
+    hits = search_index(current_user.id, q) if search_fts else search_like(current_user.id, q)
+    for hit in hits:
+        hit['date'] = hit.pop('updated_at').strftime('%b %d, %Y')
+    return jsonify({'results': hits})
 
 # ─── Settings ─────────────────────────────────────────────────────────
 
@@ -958,19 +3860,37 @@ def search():
 @login_required
 def update_settings():
     data = request.get_json() or {}
+    user = db.session.get(User, current_user.id)
     if 'default_model' in data:
-        current_user.default_model = data['default_model']
+        user.default_model = data['default_model']
     if 'default_personality' in data:
-        current_user.default_personality = data['default_personality']
+        user.default_personality = data['default_personality']
     db.session.commit()
+    user_directory.invalidate(user.id)
+    backend_directory.invalidate(user.id)
     return jsonify({'ok': True})
 
+# ─── Stats ────────────────────────────────────────────────────────────
+
+@app.route('/api/stats')
+@login_required
+def api_stats():
+    """Process-wide counters for STATS_ADMINS; other users see only their own backends and streams."""
+    if current_user.username not in STATS_ADMINS:
+        backends = backend_directory.get(current_user.id).backends
+        return jsonify({'backends': {str(b.id): backend_monitor.health(b.id) for b in backends},
+                        'streams': generations.stats(current_user.id),
+                        'admission': admission.user_stats(current_user.id)})
+    return jsonify({'http': http_pools.stats(), 'web_cache': web_cache.stats(), 'backends': backend_monitor.stats(),
+                    'db_writes': db_writes.stats(), 'apps': app_loader.report(),
+                    'streams': generations.stats(), 'admission': admission.stats()})
+
 # ─── Apps Hub ─────────────────────────────────────────────────────────
 
 @app.route('/apps')
 @login_required
 def apps_page():
-    return render_template('apps.html', apps=APPS, user=current_user)
+    return render_template('apps.html', apps=APPS.cards(), user=current_user)
 
 
 # ─── Image Generation ─────────────────────────────────────────────────
@@ -978,23 +3898,136 @@ def apps_page():
 import base64
 import uuid
 
-IMAGES_DIR = os.path.join(os.path.dirname(__file__), 'static', 'images')
-os.makedirs(IMAGES_DIR, exist_ok=True)
+IMAGES_DIR = os.path.join(os.path.dirname(__file__), 'static', 'images')  # created by init_app()
+
+# Images are requested as multipart/mixed binary parts and written straight to
+# IMAGES_DIR; servers that only speak base64 JSON (e.g. A1111) still work.
+SD_ACCEPT = 'multipart/mixed, application/json;q=0.9'
+SD_IMAGE_FORMAT = os.environ.get('SD_IMAGE_FORMAT', '')  # png | webp | jpeg; empty = server default
+SD_IMAGE_QUALITY = int(os.environ.get('SD_IMAGE_QUALITY', 90))
+SD_PNG_COMPRESS_LEVEL = int(os.environ.get('SD_PNG_COMPRESS_LEVEL', 1))
+IMAGE_EXTENSIONS = {'image/png': '.png', 'image/webp': '.webp', 'image/jpeg': '.jpg'}
+COPY_CHUNK = 64 * 1024
+
+
+def iter_multipart(resp):
+    """Yield (headers, body_chunks) per part of a streamed multipart response.
+
+    Parts must carry Content-Length (sd_server's do); bodies are read in chunks
+    from the socket and must be consumed before advancing to the next part.
+    """
+    _, params = parse_options_header(resp.headers.get('Content-Type', ''))
+    delimiter = b'--' + params['boundary'].encode()
+    resp.raw.decode_content = True
+    resp.raw.auto_close = False  # a truncated body then reads as b'' instead of a closed file
+    reader = io.BufferedReader(resp.raw, COPY_CHUNK)
+
+    def body(remaining):
+        while remaining:
+            chunk = reader.read(min(remaining, COPY_CHUNK))
+            if not chunk:
+                raise IOError('Truncated multipart body')
+            remaining -= len(chunk)
+            yield chunk
+
+    while True:
+        line = reader.readline()
+        if not line:
+            raise IOError('Multipart body ended without a closing boundary')
+        line = line.rstrip(b'\r\n')
+        if line == delimiter + b'--':
+            return
+        if line != delimiter:
+            continue  # preamble / part trailer
+        headers = {}
+        while (line := reader.readline().rstrip(b'\r\n')):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        chunks = body(int(headers['content-length']))
+        yield headers, chunks
+        for _ in chunks:  # drain whatever the consumer skipped
+            pass
+
+
+def save_image_stream(chunks, content_type):
+    """Write an image to IMAGES_DIR via a temp file; returns the final filename."""
+    fname = f'{uuid.uuid4().hex}{IMAGE_EXTENSIONS.get(content_type, ".png")}'
+    fpath = os.path.join(IMAGES_DIR, fname)
+    try:
+        with open(fpath + '.part', 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(fpath + '.part', fpath)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(fpath + '.part')
+        raise
+    return fname
+
+
+def sd_txt2img(payload, timeout=300):
+    """POST txt2img and store the images; returns ([(filename, seed)], info)."""
+    if SD_IMAGE_FORMAT:
+        payload = dict(payload, encoder={'format': SD_IMAGE_FORMAT, 'quality': SD_IMAGE_QUALITY,
+                                         'compress_level': SD_PNG_COMPRESS_LEVEL})
+    resp = http_pools.post('sd', f'{SD_BASE}/sdapi/v1/txt2img', json=payload, timeout=timeout,
+                           headers={'Accept': SD_ACCEPT}, stream=True)
+    with contextlib.closing(resp):
+        resp.raise_for_status()
+        content_type = resp.headers.get('Content-Type', '')
+        saved, info = [], {}
+        if content_type.startswith('multipart/'):
+            for headers, chunks in iter_multipart(resp):
+                if headers.get('content-type') == 'application/json':
+                    info = json.loads(b''.join(chunks))
+                    continue
+                fname = save_image_stream(chunks, headers.get('content-type'))
+                saved.append((fname, int(headers.get('x-seed', info.get('seed', -1)))))
+            return saved, info
+        if content_type.startswith('image/'):
+            info = json.loads(resp.headers.get('X-SD-Info', '{}'))
+            fname = save_image_stream(resp.iter_content(COPY_CHUNK), content_type.split(';')[0])
+            return [(fname, int(resp.headers.get('X-Seed', info.get('seed', -1))))], info
+
+        # Legacy base64 JSON
+        result = resp.json()
+        info = result.get('info', {})
+        if isinstance(info, str):
+            info = json.loads(info or '{}')
+        seeds = info.get('all_seeds') or []
+        for i, img_b64 in enumerate(result.get('images', [])):
+            fname = save_image_stream([base64.b64decode(img_b64)], 'image/png')
+            saved.append((fname, seeds[i] if i < len(seeds) else info.get('seed', -1)))
+        return saved, info
 
 
 @app.route('/imagegen')
 @login_required
 def imagegen():
-    images = GeneratedImage.query.filter_by(user_id=current_user.id)\
-        .order_by(GeneratedImage.created_at.desc()).limit(50).all()
-    return render_template('imagegen.html', images=images, user=current_user)
+    images, next_cursor = image_page(current_user.id)
+    return render_template('imagegen.html', images=images, images_next=next_cursor, user=current_user)
+
+
+def image_page(user_id, cursor=None, limit=IMAGE_PAGE):
+    query = db.session.query(GeneratedImage.id, GeneratedImage.filename, GeneratedImage.prompt,
+                             GeneratedImage.seed, GeneratedImage.created_at)\
+        .filter(GeneratedImage.user_id == user_id)
+    return keyset_page(query, GeneratedImage.created_at, GeneratedImage.id, cursor, limit)
+
+
+@app.route('/api/sd/images')
+@login_required
+def list_images():
+    rows, next_cursor = image_page(current_user.id, request.args.get('before'), page_limit(IMAGE_PAGE))
+    return jsonify({'images': [{'id': r.id, 'url': f'/static/images/{r.filename}', 'prompt': r.prompt,
+                                'seed': r.seed} for r in rows], 'next': next_cursor})
 
 
 @app.route('/api/sd/models')
 @login_required
 def sd_models():
     try:
-        resp = requests.get(f'{SD_BASE}/sdapi/v1/sd-models', timeout=5)
+        resp = http_pools.get('sd', f'{SD_BASE}/sdapi/v1/sd-models', timeout=5)
         resp.raise_for_status()
         models = [{'name': m['model_name'], 'title': m['title']} for m in resp.json()]
         return jsonify({'models': models})
@@ -1008,7 +4041,7 @@ def sd_models():
 @login_required
 def sd_samplers():
     try:
-        resp = requests.get(f'{SD_BASE}/sdapi/v1/samplers', timeout=5)
+        resp = http_pools.get('sd', f'{SD_BASE}/sdapi/v1/samplers', timeout=5)
         resp.raise_for_status()
         samplers = [s['name'] for s in resp.json()]
         return jsonify({'samplers': samplers})
@@ -1019,78 +4052,24 @@ def sd_samplers():
 @app.route('/api/sd/generate', methods=['POST'])
 @login_required
 def sd_generate():
-    data = request.get_json() or {}
-    prompt = data.get('prompt', '').strip()
-    if not prompt:
-        return jsonify({'error': 'No prompt provided'}), 400
-
-    negative = data.get('negative_prompt', '')
-    width = min(int(data.get('width', 512)), 2048)
-    height = min(int(data.get('height', 512)), 2048)
-    steps = min(int(data.get('steps', 20)), 150)
-    cfg = float(data.get('cfg_scale', 7.0))
-    seed = int(data.get('seed', -1))
-    sampler = data.get('sampler', 'Euler a')
-    sd_model = data.get('model', '')
-
-    # Switch model if requested
-    if sd_model:
-        try:
-            requests.post(f'{SD_BASE}/sdapi/v1/options', json={
-                'sd_model_checkpoint': sd_model
-            }, timeout=120)
-        except:
-            pass
+    """Synchronous variant of /api/sd/jobs, kept for API clients.
 
+    Waits at most SD_GENERATE_WAIT seconds; slower jobs answer 202 with the job
+    links instead of holding the request thread until the images exist.
+    """
     try:
-        resp = requests.post(f'{SD_BASE}/sdapi/v1/txt2img', json={
-            'prompt': prompt,
-            'negative_prompt': negative,
-            'width': width,
-            'height': height,
-            'steps': steps,
-            'cfg_scale': cfg,
-            'seed': seed,
-            'sampler_name': sampler,
-        }, timeout=300)
-        resp.raise_for_status()
-        result = resp.json()
-
-        images_out = []
-        for i, img_b64 in enumerate(result.get('images', [])):
-            fname = f'{uuid.uuid4().hex}.png'
-            fpath = os.path.join(IMAGES_DIR, fname)
-            with open(fpath, 'wb') as f:
-                f.write(base64.b64decode(img_b64))
-
-            info = json.loads(result.get('info', '{}')) if isinstance(result.get('info'), str) else result.get('info', {})
-            actual_seed = info.get('seed', seed)
-
-            img_record = GeneratedImage(
-                user_id=current_user.id,
-                prompt=prompt,
-                negative_prompt=negative,
-                model=sd_model,
-                width=width, height=height,
-                steps=steps, cfg_scale=cfg,
-                seed=actual_seed,
-                filename=fname,
-            )
-            db.session.add(img_record)
-            db.session.commit()
-
-            images_out.append({
-                'id': img_record.id,
-                'url': f'/static/images/{fname}',
-                'seed': actual_seed,
-            })
+        payload, sd_model = read_generate_params(request.get_json() or {})
+    except AppError as e:
+        return e.response()
 
-        return jsonify({'images': images_out})
-
-    except requests.ConnectionError:
-        return jsonify({'error': 'Cannot connect to Stable Diffusion server.'}), 502
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    job = image_jobs.submit(current_user.id, payload, sd_model)
+    if not job.wait(SD_GENERATE_WAIT):
+        return jsonify({'job_id': job.id, 'status': job.status, 'poll': f'/api/sd/jobs/{job.id}',
+                        'events': f'/api/sd/jobs/{job.id}/events'}), 202
+    if job.error:
+        status = 502 if job.error.startswith('Cannot connect') else 500
+        return jsonify({'error': job.error}), status
+    return jsonify({'images': [{'id': img['id'], 'url': img['url'], 'seed': img['seed']} for img in job.images]})
 
 
 @app.route('/api/sd/images/<int:img_id>', methods=['DELETE'])
@@ -1105,14 +4084,469 @@ def delete_image(img_id):
     return jsonify({'ok': True})
 
 
+# Generation runs as background jobs so no request thread waits on the SD
+# server: POST /api/sd/jobs returns an id, GET /api/sd/jobs/<id>/events streams
+# progress (polled from the SD server) until the images are stored.
+SD_WORKERS = int(os.environ.get('SD_WORKERS', 2))
+SD_JOB_TIMEOUT = float(os.environ.get('SD_JOB_TIMEOUT', 1800))  # socket read timeout per job
+SD_PROGRESS_INTERVAL = float(os.environ.get('SD_PROGRESS_INTERVAL', 0.5))
+SD_JOB_TTL = 600  # seconds a finished job stays queryable
+SD_GENERATE_WAIT = float(os.environ.get('SD_GENERATE_WAIT', 10))  # /api/sd/generate waits this long, then 202
+
+
+class ImageJob:
+    """One txt2img request; state changes wake threads and event-loop waiters."""
+
+    def __init__(self, user_id, payload, model=''):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.payload = payload
+        self.model = model
+        self.status = 'queued'  # queued | running | done | error
+        self.progress = 0.0
+        self.step = 0
+        self.steps = payload.get('steps', 0)
+        self.eta = None
+        self.queue_position = None
+        self.preview = None
+        self.images = []
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.version = 0
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._waiters = []
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    def update(self, **fields):
+        with self._lock:
+            if all(getattr(self, name) == value for name, value in fields.items()):
+                return
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            waiters, self._waiters = self._waiters, []
+        if self.finished:
+            self.finished_at = self.finished_at or time.time()
+            self._finished.set()
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'id': self.id, 'status': self.status, 'progress': self.progress,
+                'step': self.step, 'steps': self.steps, 'eta': self.eta,
+                'queue_position': self.queue_position, 'preview': self.preview,
+                'images': self.images, 'error': self.error,
+            }
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    async def updates(self):
+        """Yield a snapshot now and after every change, ending with the final state."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                version = self.version
+            snap = self.snapshot()
+            yield snap
+            if snap['status'] in ('done', 'error'):
+                return
+            with self._lock:
+                if self.version != version:
+                    continue
+                fut = loop.create_future()
+                self._waiters.append((loop, fut))
+            await fut
+
+
+def store_generated_images(user_id, payload, model, saved):
+    """Write for db_writes: one GeneratedImage row per saved file; returns the API dicts."""
+    def write(conn):
+        images_out = []
+        for fname, actual_seed in saved:
+            row = conn.execute(GeneratedImage.__table__.insert().values(
+                user_id=user_id,
+                prompt=payload['prompt'],
+                negative_prompt=payload.get('negative_prompt', ''),
+                model=model,
+                width=payload['width'], height=payload['height'],
+                steps=payload['steps'], cfg_scale=payload['cfg_scale'],
+                seed=actual_seed,
+                filename=fname,
+                created_at=datetime.utcnow(),
+            ))
+            images_out.append({'id': row.inserted_primary_key[0], 'url': f'/static/images/{fname}',
+                               'seed': actual_seed, 'prompt': payload['prompt']})
+        return images_out
+    return write
+
+
+class ImageJobs:
+    """Job registry plus the worker pool that drives the SD server."""
+
+    def __init__(self, workers, poll_interval, ttl):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.ttl = ttl
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._poller = None
+
+    def submit(self, user_id, payload, model=''):
+        job = ImageJob(user_id, payload, model)
+        with self._lock:
+            now = time.time()
+            for job_id in [k for k, j in self.jobs.items() if j.finished_at and now - j.finished_at > self.ttl]:
+                del self.jobs[job_id]
+            self.jobs[job.id] = job
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='sd-job')
+                self._poller = threading.Thread(target=self.poll, name='sd-progress', daemon=True)
+                self._poller.start()
+        self._executor.submit(self.run, job)
+        return job
+
+    def get(self, job_id, user_id):
+        job = self.jobs.get(job_id)
+        return job if job and job.user_id == user_id else None
+
+    def run(self, job):
+        job.update(status='running')
+        try:
+            payload = dict(job.payload, force_task_id=job.id)
+            if job.model:
+                payload['override_settings'] = {'sd_model_checkpoint': job.model}
+                payload['override_settings_restore_afterwards'] = True
+            saved, _ = sd_txt2img(payload, timeout=SD_JOB_TIMEOUT)
+            images = db_writes.run(store_generated_images(job.user_id, job.payload, job.model, saved))
+            job.update(status='done', progress=1.0, step=job.steps, preview=None, images=images)
+        except requests.ConnectionError:
+            job.update(status='error', error='Cannot connect to Stable Diffusion server.')
+        except Exception as e:
+            job.update(status='error', error=str(e))
+
+    def poll(self):
+        """Mirror SD server progress into running jobs (one request per job per interval)."""
+        while True:
+            time.sleep(self.poll_interval)
+            for job in [j for j in list(self.jobs.values()) if j.status == 'running']:
+                try:
+                    resp = http_pools.get('sd', f'{SD_BASE}/sdapi/v1/progress',
+                                          params={'task_id': job.id}, timeout=5)
+                    resp.raise_for_status()
+                    data = resp.json()
+                except (requests.RequestException, ValueError):
+                    continue
+                state = data.get('state') or {}
+                if job.finished or state.get('status') == 'unknown':
+                    continue
+                preview = data.get('current_image')
+                job.update(
+                    progress=data.get('progress', 0), eta=data.get('eta_relative'),
+                    step=state.get('sampling_step', 0), steps=state.get('sampling_steps', job.steps),
+                    queue_position=state.get('queue_position'),
+                    preview=f'data:image/jpeg;base64,{preview}' if preview else job.preview,
+                )
+
+
+image_jobs = ImageJobs(SD_WORKERS, SD_PROGRESS_INTERVAL, SD_JOB_TTL)
+
+
+def read_generate_params(data):
+    """Validate /api/sd/generate and /api/sd/jobs input; returns (payload, model)."""
+    prompt = data.get('prompt', '').strip()
+    if not prompt:
+        raise AppError('No prompt provided')
+    try:
+        payload = {
+            'prompt': prompt,
+            'negative_prompt': data.get('negative_prompt', ''),
+            'width': min(int(data.get('width', 512)), 2048),
+            'height': min(int(data.get('height', 512)), 2048),
+            'steps': min(int(data.get('steps', 20)), 150),
+            'cfg_scale': float(data.get('cfg_scale', 7.0)),
+            'seed': int(data.get('seed', -1)),
+            'sampler_name': data.get('sampler', 'Euler a'),
+        }
+    except (TypeError, ValueError) as e:
+        raise AppError(f'Invalid parameters: {e}')
+    return payload, data.get('model', '')
+
+
+@app.route('/api/sd/jobs', methods=['POST'])
+@login_required
+def sd_submit_job():
+    try:
+        payload, sd_model = read_generate_params(request.get_json() or {})
+    except AppError as e:
+        return e.response()
+    job = image_jobs.submit(current_user.id, payload, sd_model)
+    return jsonify({'job_id': job.id, 'events': f'/api/sd/jobs/{job.id}/events'}), 202
+
+
+@app.route('/api/sd/jobs/<job_id>')
+@login_required
+def sd_job_status(job_id):
+    job = image_jobs.get(job_id, current_user.id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.snapshot())
+
+
+def open_job_events(data, job_id):
+    job = image_jobs.get(job_id, current_user.id)
+    if not job:
+        raise AppError('Job not found', 404)
+    return job.updates()
+
+
+@app.route('/api/sd/jobs/<job_id>/events')
+@login_required
+def sd_job_events(job_id):
+    try:
+        events = open_job_events({}, job_id)
+    except AppError as e:
+        return e.response()
+    return stream_response(events)
+
+
+ASYNC_ROUTES['/api/sd/jobs/<job_id>/events'] = AsyncRoute(frozenset({'GET'}), open_job_events)
+
+
 # ─── Init ─────────────────────────────────────────────────────────────
 
-with app.app_context():
-    db.create_all()
+# Columns added after a table first shipped; db.create_all() only creates missing tables
+ADDED_COLUMNS = {
+    'conversation': [('summary', "TEXT DEFAULT ''"), ('summary_upto', 'INTEGER DEFAULT 0')],
+    'backend': [('pool', "VARCHAR(120) DEFAULT ''")],
+}
+
+
+def migrate_schema():
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {c['name'] for c in inspector.get_columns(table)}
+            for name, ddl in columns:
+                if name not in existing:
+                    conn.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+        # create_all() skips indexes on tables that already exist
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+_init_lock = threading.Lock()
+initialized = False
+
+
+def init_app():
+    """Create and migrate the database and start the background threads (once).
+
+    Importing this module only builds the app. `python app.py` and AsgiApp's
+    lifespan startup call this before serving; a server that skips both (a WSGI
+    server importing `app`, or ASGI without lifespan) gets it on its first request.
+    """
+    global initialized
+    with _init_lock:
+        if initialized:
+            return
+        os.makedirs(IMAGES_DIR, exist_ok=True)
+        with app.app_context():
+            db.create_all()
+            migrate_schema()
+            ensure_search_index()
+            db_writes.start(db.engine)
+            if WEB_CACHE_PERSIST:
+                web_cache.persist(db.engine)
+        if APPS_HOT_RELOAD and os.path.isdir(APPS_DIR):
+            app_loader.watch(APPS_RELOAD_INTERVAL)
+        initialized = True
+
+
+@app.before_request
+def init_on_first_request():
+    if not initialized:
+        init_app()
 
 # Load apps from apps/ directory
 platform = Platform(app)
-load_apps(app, platform)
+app_loader = load_apps(app, platform)
+
+# ─── ASGI ─────────────────────────────────────────────────────────────
+
+def asgi_environ(scope, body):
+    """Minimal WSGI environ for running Flask request-context code from ASGI."""
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('ascii'),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'], environ['SERVER_PORT'] = server[0], str(server[1])
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class AsgiApp:
+    """ASGI entry point: `uvicorn app:asgi_app`.
+
+    Routes in ASYNC_ROUTES stream on the server's event loop (request validation
+    and DB work run in a thread with a Flask request context); everything else
+    goes through the regular Flask app.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.url_adapter = flask_app.url_map.bind('localhost')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await asyncio.to_thread(init_app)
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] == 'http':
+            if not initialized:
+                await asyncio.to_thread(init_app)
+            route, view_args, installed = await self.match(scope)
+            if route and installed:
+                installed.acquire()  # keeps a hot-reloaded app version alive until the stream ends
+                try:
+                    return await self.serve_stream(route, view_args, scope, receive, send)
+                finally:
+                    installed.release()
+            if route:
+                return await self.serve_stream(route, view_args, scope, receive, send)
+        # Fresh context per request: asgiref's sync bridge keeps executor state in
+        # contextvars that can otherwise leak across keep-alive requests.
+        await asyncio.get_running_loop().create_task(self.wsgi(scope, receive, send),
+                                                     context=contextvars.Context())
+
+    async def match(self, scope):
+        """(AsyncRoute, view args, app version or None) for the request's Flask rule, if it streams."""
+        adapter = self.url_adapter
+        routes = ASYNC_ROUTES
+        try:
+            rule, view_args = adapter.match(scope['path'], scope['method'], return_rule=True)
+            installed = app_loader.for_endpoint(rule.endpoint, scope['path'])
+            if installed:
+                # Lazily loaded app: its own url map knows the real rule
+                if not installed.loaded:
+                    await asyncio.to_thread(installed.ensure, self.flask_app, platform)
+                rule, view_args = installed.match(scope['path'], scope['method'])
+                routes = installed.async_routes
+            else:
+                rule = rule.rule
+        except HTTPException:
+            return None, None, None
+        except Exception:
+            return None, None, None  # failed app import: let the WSGI path report it
+        route = routes.get(rule)
+        if route and scope['method'] in route.methods:
+            return route, view_args, installed
+        return None, None, None
+
+    def open_stream(self, route, view_args, environ):
+        with self.flask_app.request_context(environ):
+            if not current_user.is_authenticated:
+                return login_manager.unauthorized()
+            try:
+                return route.open(request.get_json(silent=True) or {}, **view_args)
+            except AppError as e:
+                return e.response()
+            except HTTPException as e:
+                return e.get_response()
+
+    async def send_response(self, send, resp):
+        await send({'type': 'http.response.start', 'status': resp.status_code,
+                    'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in resp.headers.items()]})
+        await send({'type': 'http.response.body', 'body': resp.get_data()})
+
+    async def serve_stream(self, route, view_args, scope, receive, send):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        environ = asgi_environ(scope, body)
+        events = await asyncio.to_thread(self.open_stream, route, view_args, environ)
+        if isinstance(events, Response):
+            return await self.send_response(send, events)
+
+        writer = SSEWriter.negotiate(EnvironHeaders(environ))
+        chunks = writer.frames(events)
+        try:
+            first = [await chunks.__anext__()]
+        except StopAsyncIteration:
+            first = []
+        except AppError as e:
+            return await self.send_response(send, e.response())
+
+        async def pump():
+            headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+            headers += [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in writer.headers]
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            for chunk in first:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            async for chunk in chunks:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        stream = asyncio.ensure_future(pump())
+        watcher = asyncio.ensure_future(disconnected())
+        try:
+            await asyncio.wait({stream, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # A client disconnect cancels the stream, which closes the upstream response
+            for task in (stream, watcher):
+                task.cancel()
+            await asyncio.gather(stream, watcher, return_exceptions=True)
+            await chunks.aclose()
+            await events.aclose()
+
+
+asgi_app = AsgiApp(app)
 
 if __name__ == '__main__':
+    init_app()
     app.run(debug=True, port=9090)
@@ -1,116 +1,718 @@
 """Minimal Stable Diffusion API server — AUTOMATIC1111-compatible endpoints.
 Uses HuggingFace diffusers. Exposes /sdapi/v1/txt2img, /sdapi/v1/sd-models, /sdapi/v1/samplers.
+
+txt2img requests are queued and compatible ones (same model/size/steps/sampler/cfg)
+are run as one batched pipeline call; /sdapi/v1/queue reports depth and wait times.
+Checkpoints are discovered in --models-dir and loaded on demand; the most recently
+used ones stay resident (see ModelManager).
+
+Pass "force_task_id" with txt2img and poll /sdapi/v1/progress?task_id=... for
+step-level progress and a low-resolution latent preview.
+
+Images come back as base64 JSON by default. Clients that send
+`Accept: multipart/mixed` get one binary part per image instead (and a single
+image can be requested raw with `Accept: image/png|webp|jpeg`).
 """
 import argparse
 import base64
+import gc
 import io
 import json
 import os
 import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
 
 import torch
 torch.backends.cudnn.enabled = False  # cuDNN Bus Error on RTX 5090 Blackwell
-from diffusers import StableDiffusionPipeline, EulerAncestralDiscreteScheduler, DPMSolverMultistepScheduler, DDIMScheduler
-from flask import Flask, request, jsonify
+from diffusers import (
+    StableDiffusionPipeline, EulerAncestralDiscreteScheduler, EulerDiscreteScheduler,
+    DPMSolverMultistepScheduler, DDIMScheduler, UniPCMultistepScheduler, HeunDiscreteScheduler,
+    LMSDiscreteScheduler,
+)
+from flask import Flask, request, jsonify, Response
+from PIL import Image
 
 app = Flask(__name__)
 
-pipe = None
-MODEL_PATH = None
 DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
 
+# Sampler name -> (scheduler class, config overrides). Karras sigmas and timestep
+# spacing are config options, so each variant is its own first-class sampler name.
 SCHEDULERS = {
-    'Euler a': EulerAncestralDiscreteScheduler,
-    'DPM++ 2M Karras': DPMSolverMultistepScheduler,
-    'DDIM': DDIMScheduler,
+    'Euler a': (EulerAncestralDiscreteScheduler, {}),
+    'Euler a trailing': (EulerAncestralDiscreteScheduler, {'timestep_spacing': 'trailing'}),
+    'Euler': (EulerDiscreteScheduler, {}),
+    'Euler Karras': (EulerDiscreteScheduler, {'use_karras_sigmas': True}),
+    'DPM++ 2M': (DPMSolverMultistepScheduler, {}),
+    'DPM++ 2M Karras': (DPMSolverMultistepScheduler, {'use_karras_sigmas': True}),
+    'DPM++ 2M SDE Karras': (DPMSolverMultistepScheduler, {'use_karras_sigmas': True,
+                                                          'algorithm_type': 'sde-dpmsolver++'}),
+    'DDIM': (DDIMScheduler, {}),
+    'DDIM trailing': (DDIMScheduler, {'timestep_spacing': 'trailing'}),
+    'UniPC': (UniPCMultistepScheduler, {}),
+    'Heun': (HeunDiscreteScheduler, {}),
+    'LMS': (LMSDiscreteScheduler, {}),
+    'LMS Karras': (LMSDiscreteScheduler, {'use_karras_sigmas': True}),
 }
+DEFAULT_SAMPLER = 'Euler a'
+
+MODEL_EXTENSIONS = ('.safetensors', '.ckpt')
+# POST /sdapi/v1/options changes the model every client gets by default, so it
+# is off unless the operator asks for it (--options-writable); clients pick a
+# model per request with override_settings.sd_model_checkpoint
+OPTIONS_WRITABLE = False
+
+PREVIEW_EVERY = 5       # decode a latent preview every N steps (--preview-every, 0 = off)
+
+# Linear latent -> RGB approximation for SD 1.x/2.x VAEs; costs a matmul instead of a VAE decode
+LATENT_RGB_FACTORS = [
+    [0.3512, 0.2297, 0.3227],
+    [0.3250, 0.4974, 0.2350],
+    [-0.2829, 0.1762, 0.2721],
+    [-0.2120, -0.2616, -0.7177],
+]
+
+# Default image encoder (--image-format/--image-quality/--png-compress-level);
+# requests can override it with an "encoder" object. PNG level 1 encodes several
+# times faster than PIL's default 6 for a slightly larger file.
+ENCODER = {'format': 'png', 'quality': 90, 'compress_level': 1}
+IMAGE_FORMATS = {'png': ('PNG', 'image/png'), 'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+
+MAX_BATCH = 4           # images per pipeline call (--max-batch)
+BATCH_WINDOW = 0.05     # seconds to wait for compatible requests (--batch-window-ms)
 
 
 def load_pipe(model_path):
-    global pipe, MODEL_PATH
-    MODEL_PATH = model_path
     print(f'Loading model from {model_path}...')
     pipe = StableDiffusionPipeline.from_single_file(
         model_path,
         torch_dtype=torch.float16,
-        use_safetensors=True,
+        use_safetensors=model_path.endswith('.safetensors'),
     ).to(DEVICE)
     pipe.safety_checker = None
     pipe.requires_safety_checker = False
     print('Model loaded.')
+    return pipe
+
+
+def build_samplers(base):
+    """One pipeline view per SCHEDULERS entry; never mutates the base pipeline.
+
+    Views share the loaded weights (unet/vae/text encoder) and differ only in
+    their scheduler instance, so they are built once per loaded checkpoint.
+    """
+    views = {}
+    for name, (sched_cls, overrides) in SCHEDULERS.items():
+        try:
+            sched = sched_cls.from_config(base.scheduler.config, **overrides)
+        except Exception as e:
+            print(f'Sampler {name} unavailable: {e}')
+            continue
+        components = dict(base.components, scheduler=sched, safety_checker=None)
+        views[name] = StableDiffusionPipeline(**components, requires_safety_checker=False)
+    return views
+
+
+def pipeline_bytes(pipe):
+    """Parameter + buffer memory of every torch module in the pipeline."""
+    total = 0
+    for module in pipe.components.values():
+        if isinstance(module, torch.nn.Module):
+            for t in list(module.parameters()) + list(module.buffers()):
+                total += t.numel() * t.element_size()
+    return total
+
+
+class ModelManager:
+    """Checkpoints found under a models directory, with an LRU of loaded pipelines.
+
+    At most `max_resident` pipelines (and, if set, `memory_budget` bytes of
+    weights) stay on the device. Room is made before a new checkpoint loads,
+    using its size from an earlier load or its file size, so a switch never
+    holds more than the limits; least recently used pipelines go first, and
+    ones a running batch holds through use() are never dropped.
+
+    Loads run outside `lock`, one at a time under `load_lock`, so listing and
+    stats stay responsive while a checkpoint loads; callers wanting a checkpoint
+    that is already loading wait on its event instead of loading it again.
+    """
+
+    def __init__(self, models_dir, max_resident=2, memory_budget=0):
+        self.models_dir = models_dir
+        self.max_resident = max(1, max_resident)
+        self.memory_budget = memory_budget
+        self.default = None
+        self.checkpoints = {}          # title -> path
+        self.pinned = {}               # checkpoints given explicitly (outside models_dir)
+        self.resident = OrderedDict()  # title -> {'samplers', 'bytes', 'loaded_at'}
+        self.loading = {}              # title -> threading.Event, set when its load ends
+        self.sizes = {}                # title -> bytes of its pipeline when last loaded
+        self.in_use = Counter()        # title -> batches running on it
+        self.lock = threading.RLock()
+        self.load_lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def add(self, path):
+        """Register a checkpoint by path; returns its title."""
+        path = os.path.abspath(path)
+        title = os.path.relpath(path, os.path.abspath(self.models_dir))
+        if title.startswith('..'):
+            title = os.path.basename(path)
+            self.pinned[title] = path
+        with self.lock:
+            self.checkpoints[title] = path
+        return title
+
+    def scan(self):
+        found = dict(self.pinned)
+        for root, _, files in os.walk(self.models_dir):
+            for name in sorted(files):
+                if name.endswith(MODEL_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    found[os.path.relpath(path, self.models_dir)] = path
+        with self.lock:
+            self.checkpoints = found
+            if self.default not in found:
+                self.default = next(iter(found), None)
+        return found
+
+    def resolve(self, name):
+        """Match an A1111-style title, model name or file name to a known checkpoint."""
+        if not name:
+            return self.default
+        name = name.split(' [', 1)[0]  # A1111 titles carry a " [hash]" suffix
+        for title in self.checkpoints:
+            base = os.path.basename(title)
+            if name in (title, base, os.path.splitext(base)[0], os.path.splitext(title)[0]):
+                return title
+        return None
+
+    def get(self, title, pin=False):
+        """Sampler views for a checkpoint, loading it (and evicting others) if needed.
+
+        With `pin`, the pipeline can't be evicted until release(title).
+        """
+        while True:
+            with self.lock:
+                entry = self.resident.get(title)
+                if entry:
+                    self.resident.move_to_end(title)
+                    self.hits += 1
+                    if pin:
+                        self.in_use[title] += 1
+                    return entry['samplers']
+                loading = self.loading.get(title)
+                if loading is None:
+                    path = self.checkpoints[title]
+                    loading = self.loading[title] = threading.Event()
+                    loading.error = None
+                    break
+            loading.wait()
+            if loading.error is not None:
+                raise RuntimeError(f'Loading {title} failed: {loading.error}')
+
+        try:
+            with self.load_lock:
+                with self.lock:
+                    evicted = self.evict(incoming=self.sizes.get(title) or os.path.getsize(path))
+                if evicted:
+                    self.free_memory()
+                pipe = load_pipe(path)
+                entry = {'samplers': build_samplers(pipe), 'bytes': pipeline_bytes(pipe), 'loaded_at': time.time()}
+                del pipe
+        except BaseException as e:
+            loading.error = e
+            raise
+        else:
+            with self.lock:
+                self.resident[title] = entry
+                self.sizes[title] = entry['bytes']
+                self.loads += 1
+                if pin:
+                    self.in_use[title] += 1
+                evicted = self.evict()
+            if evicted:
+                self.free_memory()
+            return entry['samplers']
+        finally:
+            with self.lock:
+                del self.loading[title]
+            loading.set()
+
+    def release(self, title):
+        """Unpin a checkpoint from get(pin=True), dropping whatever its pin kept over the limits."""
+        with self.lock:
+            self.in_use[title] -= 1
+            if self.in_use[title] > 0:
+                return
+            del self.in_use[title]
+            evicted = self.evict()
+        if evicted:
+            self.free_memory()
+
+    @contextmanager
+    def use(self, title):
+        """Sampler views for a checkpoint, kept resident for the duration of the block."""
+        samplers = self.get(title, pin=True)
+        try:
+            yield samplers
+        finally:
+            self.release(title)
+
+    def preload(self, title):
+        """get() for a background thread: logs failures instead of raising."""
+        try:
+            self.get(title)
+        except Exception as e:
+            print(f'Loading {title} failed: {e}')
+
+    def evict(self, incoming=None):
+        """Drop least recently used pipelines over the limits (call with lock held); returns the count.
+
+        With `incoming` (the expected bytes of a checkpoint about to load), also
+        make room for it; otherwise the newest pipeline is kept. Pipelines in
+        use are skipped, so a busy manager can stay over its limits.
+        """
+        if incoming is None:
+            slots, extra, keep = self.max_resident, 0, list(self.resident)[-1:]
+        else:
+            slots, extra, keep = self.max_resident - 1, incoming, []
+        evicted = 0
+        while len(self.resident) > slots or (
+                self.memory_budget and self.resident_bytes() + extra > self.memory_budget):
+            title = next((t for t in self.resident if t not in keep and not self.in_use[t]), None)
+            if title is None:
+                break
+            del self.resident[title]
+            self.evictions += 1
+            evicted += 1
+            print(f'Evicted {title}')
+        return evicted
+
+    def free_memory(self):
+        gc.collect()
+        if DEVICE == 'cuda':
+            torch.cuda.empty_cache()
+
+    def resident_bytes(self):
+        return sum(e['bytes'] for e in self.resident.values())
+
+    def stats(self):
+        with self.lock:
+            return {
+                'default': self.default,
+                'resident': list(self.resident),
+                'loading': list(self.loading),
+                'resident_mb': round(self.resident_bytes() / 2**20),
+                'max_resident': self.max_resident,
+                'memory_budget_mb': round(self.memory_budget / 2**20),
+                'loads': self.loads,
+                'hits': self.hits,
+                'evictions': self.evictions,
+            }
+
+
+models = ModelManager('.')
 
 
 @app.route('/sdapi/v1/sd-models')
 def sd_models():
-    name = os.path.basename(MODEL_PATH or 'unknown')
-    return jsonify([{'title': name, 'model_name': name.replace('.safetensors', '')}])
+    models.scan()
+    return jsonify([{
+        'title': title,
+        'model_name': os.path.splitext(os.path.basename(title))[0],
+        'filename': path,
+        'hash': None,
+        'loaded': title in models.resident,
+    } for title, path in models.checkpoints.items()])
+
+
+@app.route('/sdapi/v1/refresh-checkpoints', methods=['POST'])
+def sd_refresh():
+    models.scan()
+    return jsonify({})
 
 
 @app.route('/sdapi/v1/samplers')
 def sd_samplers():
-    return jsonify([{'name': k} for k in SCHEDULERS])
+    return jsonify([{'name': k, 'aliases': [], 'options': dict(v[1])} for k, v in SCHEDULERS.items()])
 
 
 @app.route('/sdapi/v1/options', methods=['GET', 'POST'])
 def sd_options():
-    return jsonify({})
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        if not OPTIONS_WRITABLE:
+            return jsonify({'error': 'Options are read-only on this server; choose a model per request with '
+                                     'override_settings.sd_model_checkpoint'}), 403
+        if 'sd_model_checkpoint' in data:
+            title = models.resolve(data['sd_model_checkpoint'])
+            if not title:
+                return jsonify({'error': f"Unknown checkpoint: {data['sd_model_checkpoint']}"}), 404
+            models.default = title
+            # A1111 loads synchronously; here the load runs in the background and
+            # txt2img requests for it wait on the same load
+            threading.Thread(target=models.preload, args=(title,), daemon=True).start()
+    return jsonify({'sd_model_checkpoint': models.default})
+
+
+@app.route('/sdapi/v1/models/stats')
+def sd_model_stats():
+    return jsonify(models.stats())
+
+
+class Job:
+    """One txt2img request waiting in the batch queue."""
+
+    def __init__(self, data):
+        self.data = data
+        self.prompt = data.get('prompt', '')
+        self.negative = data.get('negative_prompt', '')
+        self.count = max(1, min(int(data.get('batch_size', 1)), MAX_BATCH))
+        seed = data.get('seed')
+        seed = -1 if seed in (None, '') else int(seed)  # "42" is fine; "abc" is a 400
+        if seed < 0:
+            seed = random.randint(0, 2**32 - 1)
+        self.seed = seed % 2**32
+        checkpoint = (data.get('override_settings') or {}).get('sd_model_checkpoint')
+        self.model = models.resolve(checkpoint)
+        if not self.model:
+            raise LookupError(f'Unknown checkpoint: {checkpoint}' if checkpoint else 'No checkpoint available')
+        self.key = (
+            self.model,
+            int(data.get('width', 512)),
+            int(data.get('height', 512)),
+            int(data.get('steps', 20)),
+            float(data.get('cfg_scale', 7.0)),
+            data.get('sampler_name') if data.get('sampler_name') in SCHEDULERS else DEFAULT_SAMPLER,
+        )
+        self.task_id = data.get('force_task_id') or uuid.uuid4().hex
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.step = 0
+        self.preview = None
+        self.images = None
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def seeds(self):
+        return [(self.seed + i) % 2**32 for i in range(self.count)]
+
+
+class BatchScheduler:
+    """Single worker thread that drains the queue in batches of compatible jobs.
+
+    The first queued job fixes the batch key; any other queued job with the same
+    key joins until MAX_BATCH images or BATCH_WINDOW elapses. A job that finds
+    the queue otherwise empty starts at once rather than waiting out the window.
+    Jobs with other keys keep their place in the queue for the next batch.
+    """
+
+    def __init__(self):
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.tasks = {}    # task_id -> Job, while queued or running
+        self.current = []  # batch being generated
+        self.thread = None
+        self.batches = 0
+        self.images = 0
+        self.wait_total = 0.0
+        self.busy_total = 0.0
+        self.jobs_total = 0
+        self.last_wait_ms = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='sd-batch', daemon=True)
+        self.thread.start()
+
+    def submit(self, job):
+        with self.cond:
+            self.queue.append(job)
+            self.tasks[job.task_id] = job
+            self.cond.notify()
+        try:
+            job.done.wait()
+        finally:
+            with self.cond:
+                self.tasks.pop(job.task_id, None)
+        return job
+
+    def progress(self, task_id=None):
+        """A1111-style progress for one task (default: the first job of the running batch)."""
+        with self.cond:
+            job = self.tasks.get(task_id) if task_id else (self.current[0] if self.current else None)
+            position = next((i for i, j in enumerate(self.queue) if j is job), None)
+        if not job:
+            return {'progress': 0, 'eta_relative': 0, 'state': {'job': task_id, 'status': 'unknown'},
+                    'current_image': None}
+        steps = job.key[3]
+        elapsed = time.monotonic() - job.started_at if job.started_at else 0
+        eta = elapsed / job.step * (steps - job.step) if job.step else 0
+        preview = None
+        if job.preview is not None:
+            buf = io.BytesIO()
+            job.preview.save(buf, format='JPEG', quality=70)
+            preview = base64.b64encode(buf.getvalue()).decode()
+        return {
+            'progress': round(job.step / steps, 3) if steps else 0,
+            'eta_relative': round(eta, 2),
+            'state': {
+                'job': job.task_id,
+                'status': 'queued' if job.started_at is None else 'running',
+                'queue_position': position,
+                'sampling_step': job.step,
+                'sampling_steps': steps,
+            },
+            'current_image': preview,
+        }
+
+    def take_batch(self):
+        with self.cond:
+            while not self.queue:
+                self.cond.wait()
+            first = self.queue.popleft()
+            batch, size = [first], first.count
+            deadline = time.monotonic() + BATCH_WINDOW
+            while size < MAX_BATCH:
+                for job in list(self.queue):
+                    if job.key == first.key and size + job.count <= MAX_BATCH:
+                        self.queue.remove(job)
+                        batch.append(job)
+                        size += job.count
+                remaining = deadline - time.monotonic()
+                if size >= MAX_BATCH or remaining <= 0 or (len(batch) == 1 and not self.queue):
+                    break
+                self.cond.wait(remaining)
+            return batch
+
+    def run(self):
+        while True:
+            batch = self.take_batch()
+            started = time.monotonic()
+            for job in batch:
+                job.started_at = started
+            self.current = batch
+            try:
+                images = generate(batch)
+                for job in batch:
+                    job.images, images = images[:job.count], images[job.count:]
+            except Exception as e:
+                print(f'Error generating: {e}')
+                for job in batch:
+                    job.error = str(e)
+            finished = time.monotonic()
+            self.current = []
+            with self.cond:
+                self.batches += 1
+                self.images += sum(job.count for job in batch if job.images)
+                self.busy_total += finished - started
+                for job in batch:
+                    self.jobs_total += 1
+                    self.wait_total += started - job.queued_at
+                    self.last_wait_ms = (started - job.queued_at) * 1000
+            for job in batch:
+                job.done.set()
+
+    def stats(self):
+        with self.cond:
+            return {
+                'queue_depth': len(self.queue),
+                'queued_images': sum(job.count for job in self.queue),
+                'max_batch': MAX_BATCH,
+                'batch_window_ms': BATCH_WINDOW * 1000,
+                'batches': self.batches,
+                'images': self.images,
+                'avg_batch_size': round(self.images / self.batches, 2) if self.batches else 0,
+                'avg_wait_ms': round(self.wait_total / self.jobs_total * 1000, 1) if self.jobs_total else 0,
+                'last_wait_ms': round(self.last_wait_ms, 1),
+                'images_per_sec': round(self.images / self.busy_total, 2) if self.busy_total else 0,
+            }
+
+
+scheduler = BatchScheduler()
+
+
+def generate(batch):
+    """Run one pipeline call for a batch of jobs sharing the same key."""
+    model, width, height, steps, cfg, sampler_name = batch[0].key
+    prompts, negatives, generators = [], [], []
+    for job in batch:
+        for seed in job.seeds:
+            prompts.append(job.prompt)
+            negatives.append(job.negative)
+            generators.append(torch.Generator(device=DEVICE).manual_seed(seed))
+
+    def on_step(pipeline, step, timestep, tensors):
+        for job in batch:
+            job.step = step + 1
+        if PREVIEW_EVERY and (step + 1) % PREVIEW_EVERY == 0 and step + 1 < steps:
+            offset = 0
+            for job in batch:
+                job.preview = latent_preview(tensors['latents'][offset])
+                offset += job.count
+        return tensors
+
+    with models.use(model) as samplers, torch.no_grad():
+        sampler = samplers.get(sampler_name) or samplers[DEFAULT_SAMPLER]
+        result = sampler(
+            prompt=prompts,
+            negative_prompt=negatives if any(negatives) else None,
+            width=width,
+            height=height,
+            num_inference_steps=steps,
+            guidance_scale=cfg,
+            generator=generators,
+            callback_on_step_end=on_step,
+        )
+    return result.images
+
+
+def latent_preview(latent):
+    """Approximate RGB image (1/8 resolution) for a (4, h, w) latent."""
+    factors = torch.tensor(LATENT_RGB_FACTORS, dtype=torch.float32, device=latent.device)
+    rgb = torch.einsum('chw,cr->hwr', latent.float(), factors)
+    rgb = ((rgb + 1) / 2).clamp(0, 1).mul(255).byte().cpu().numpy()
+    return Image.fromarray(rgb)
+
+
+@app.route('/sdapi/v1/queue')
+def sd_queue():
+    return jsonify(scheduler.stats())
+
+
+@app.route('/sdapi/v1/progress')
+def sd_progress():
+    return jsonify(scheduler.progress(request.args.get('task_id')))
+
+
+def image_encoder(data):
+    enc = dict(ENCODER, **(data.get('encoder') or {}))
+    fmt = 'jpeg' if enc['format'] == 'jpg' else enc['format']
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"unsupported image format {enc['format']!r}")
+    enc['format'] = fmt
+    return enc
+
+
+def encode_image(img, enc):
+    pil_format, _ = IMAGE_FORMATS[enc['format']]
+    buf = io.BytesIO()
+    if pil_format == 'PNG':
+        img.save(buf, format='PNG', compress_level=int(enc['compress_level']))
+    elif pil_format == 'JPEG':
+        img.convert('RGB').save(buf, format='JPEG', quality=int(enc['quality']))
+    else:
+        img.save(buf, format=pil_format, quality=int(enc['quality']))
+    return buf.getvalue()
+
+
+def multipart_body(job, info, enc, boundary):
+    """multipart/mixed: a JSON info part, then one part per image, each with Content-Length.
+
+    Images are encoded one at a time as the response is written.
+    """
+    _, mimetype = IMAGE_FORMATS[enc['format']]
+    delimiter = f'--{boundary}\r\n'.encode()
+    info_bytes = json.dumps(info).encode()
+    yield delimiter + (f'Content-Type: application/json\r\n'
+                       f'Content-Length: {len(info_bytes)}\r\n\r\n').encode() + info_bytes + b'\r\n'
+    for i, (img, seed) in enumerate(zip(job.images, job.seeds)):
+        data = encode_image(img, enc)
+        yield delimiter + (f'Content-Type: {mimetype}\r\n'
+                           f'Content-Length: {len(data)}\r\n'
+                           f'Content-Disposition: inline; filename="{i}.{enc["format"]}"\r\n'
+                           f'X-Seed: {seed}\r\n\r\n').encode()
+        yield data
+        yield b'\r\n'
+    yield f'--{boundary}--\r\n'.encode()
 
 
 @app.route('/sdapi/v1/txt2img', methods=['POST'])
 def txt2img():
     data = request.get_json() or {}
-    prompt = data.get('prompt', '')
-    negative = data.get('negative_prompt', '')
-    width = data.get('width', 512)
-    height = data.get('height', 512)
-    steps = data.get('steps', 20)
-    cfg = data.get('cfg_scale', 7.0)
-    seed = data.get('seed', -1)
-    sampler_name = data.get('sampler_name', 'Euler a')
-
-    if seed == -1:
-        seed = random.randint(0, 2**32 - 1)
-
     try:
-        # Set scheduler
-        sched_cls = SCHEDULERS.get(sampler_name, EulerAncestralDiscreteScheduler)
-        pipe.scheduler = sched_cls.from_config(pipe.scheduler.config)
-
-        generator = torch.Generator(device=DEVICE).manual_seed(seed)
-
-        with torch.no_grad():
-            result = pipe(
-                prompt=prompt,
-                negative_prompt=negative if negative else None,
-                width=width,
-                height=height,
-                num_inference_steps=steps,
-                guidance_scale=cfg,
-                generator=generator,
-            )
-
-        images_b64 = []
-        for img in result.images:
-            buf = io.BytesIO()
-            img.save(buf, format='PNG')
-            images_b64.append(base64.b64encode(buf.getvalue()).decode())
+        job = Job(data)
+        enc = image_encoder(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid parameters: {e}'}), 400
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+
+    mode = request.accept_mimetypes.best_match(
+        ['application/json', 'multipart/mixed', 'image/png', 'image/webp', 'image/jpeg'], 'application/json')
+    if mode.startswith('image/'):
+        if job.count != 1:
+            return jsonify({'error': 'Raw image responses need batch_size 1; accept multipart/mixed instead'}), 406
+        enc['format'] = mode.split('/', 1)[1]
+
+    scheduler.submit(job)
+    if job.error:
+        return jsonify({'error': job.error}), 500
+
+    info = {
+        'seed': job.seed,
+        'sd_model_checkpoint': job.model,
+        'all_seeds': job.seeds,
+        'queue_wait_ms': round((job.started_at - job.queued_at) * 1000, 1),
+    }
+
+    if mode == 'multipart/mixed':
+        boundary = uuid.uuid4().hex
+        return Response(multipart_body(job, info, enc, boundary),
+                        mimetype=f'multipart/mixed; boundary={boundary}')
+    if mode.startswith('image/'):
+        return Response(encode_image(job.images[0], enc), mimetype=mode, headers={
+            'X-Seed': str(job.seed), 'X-SD-Info': json.dumps(info)})
 
-        return jsonify({
-            'images': images_b64,
-            'parameters': data,
-            'info': json.dumps({'seed': seed}),
-        })
-    except Exception as e:
-        print(f'Error generating: {e}')
-        return jsonify({'error': str(e)}), 500
+    images_b64 = [base64.b64encode(encode_image(img, enc)).decode() for img in job.images]
+    return jsonify({
+        'images': images_b64,
+        'parameters': data,
+        'info': json.dumps(info),
+    })
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('--model', required=True, help='Path to .safetensors model')
+    parser.add_argument('--model', help='Checkpoint to load at startup (.safetensors/.ckpt)')
+    parser.add_argument('--models-dir', help='Directory scanned for checkpoints (default: the --model directory)')
+    parser.add_argument('--max-models', type=int, default=2, help='Max pipelines kept resident')
+    parser.add_argument('--memory-budget-gb', type=float, default=0,
+                        help='Evict least recently used pipelines above this many GB of weights (0 = no limit)')
+    parser.add_argument('--options-writable', action='store_true',
+                        help='Let POST /sdapi/v1/options switch the default model for every client')
     parser.add_argument('--port', type=int, default=7860)
     parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='Max images per pipeline call')
+    parser.add_argument('--batch-window-ms', type=float, default=BATCH_WINDOW * 1000,
+                        help='How long to wait for compatible requests before running a batch')
+    parser.add_argument('--preview-every', type=int, default=PREVIEW_EVERY,
+                        help='Decode a progress preview every N steps (0 = off)')
+    parser.add_argument('--image-format', choices=sorted(IMAGE_FORMATS), default=ENCODER['format'])
+    parser.add_argument('--image-quality', type=int, default=ENCODER['quality'], help='WebP/JPEG quality')
+    parser.add_argument('--png-compress-level', type=int, default=ENCODER['compress_level'], choices=range(10))
     args = parser.parse_args()
+    if not args.model and not args.models_dir:
+        parser.error('one of --model or --models-dir is required')
 
-    load_pipe(args.model)
-    app.run(host=args.host, port=args.port)
+    MAX_BATCH = max(1, args.max_batch)
+    BATCH_WINDOW = args.batch_window_ms / 1000
+    PREVIEW_EVERY = max(0, args.preview_every)
+    OPTIONS_WRITABLE = args.options_writable
+    ENCODER.update(format=args.image_format, quality=args.image_quality, compress_level=args.png_compress_level)
+    models = ModelManager(args.models_dir or os.path.dirname(os.path.abspath(args.model)),
+                          max_resident=args.max_models, memory_budget=int(args.memory_budget_gb * 2**30))
+    models.scan()
+    if args.model:
+        models.default = models.add(args.model)
+    if models.default:
+        models.get(models.default)
+    scheduler.start()
+    app.run(host=args.host, port=args.port, threaded=True)
@@ -14,6 +14,9 @@ const $backendSelect = document.getElementById('backend-select');
 const $searchInput = document.getElementById('search-input');
 const $searchResults = document.getElementById('search-results');
 const $btnSend = document.getElementById('btn-send');
+const $btnStop = document.getElementById('btn-stop');
+let streamId = null;
+const STREAM_RETRIES = 5;
 
 // ─── Init ─────────────────────────────────────────────────────────────
 document.addEventListener('DOMContentLoaded', () => {
@@ -50,20 +53,11 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     // Delete conversation buttons
-    document.querySelectorAll('.convo-delete').forEach(btn => {
-        btn.addEventListener('click', async (e) => {
-            e.preventDefault();
-            e.stopPropagation();
-            const id = btn.dataset.id;
-            if (!confirm('Delete this conversation?')) return;
-            await fetch(`/api/conversations/${id}`, { method: 'DELETE' });
-            if (currentConvo == id) {
-                window.location.href = '/chat';
-            } else {
-                btn.closest('.convo-item').remove();
-            }
-        });
-    });
+    document.querySelectorAll('.convo-delete').forEach(bindConvoDelete);
+
+    // Older conversations / messages load as their sentinels scroll into view
+    whenVisible(document.getElementById('convo-sentinel'), loadMoreConversations);
+    whenVisible(document.getElementById('message-sentinel'), loadOlderMessages);
 });
 
 // ─── Load models from Ollama ──────────────────────────────────────────
@@ -141,6 +135,22 @@ $input.addEventListener('keydown', (e) => {
     }
 });
 
+// Stop: the server aborts generation, saves the partial reply and ends the stream with done
+$btnStop?.addEventListener('click', () => {
+    if (!streamId) return;
+    fetch(`/api/streams/${encodeURIComponent(streamId)}/stop`, { method: 'POST' }).catch(() => {});
+    $btnStop.disabled = true;
+});
+
+function newStreamId() {
+    return Date.now().toString(36) + Math.random().toString(36).slice(2, 10);
+}
+
+// A resumable generation outlives its connection; leaving the page is not a drop to recover from
+window.addEventListener('pagehide', () => {
+    if (isStreaming && streamId) navigator.sendBeacon(`/api/streams/${encodeURIComponent(streamId)}/stop`);
+});
+
 async function sendMessage() {
     const text = $input.value.trim();
     if (!text || isStreaming) return;
@@ -165,6 +175,10 @@ async function sendMessage() {
     // Start streaming
     isStreaming = true;
     $btnSend.disabled = true;
+    streamId = newStreamId();
+    $btnSend.classList.add('hidden');
+    $btnStop?.classList.remove('hidden');
+    if ($btnStop) $btnStop.disabled = false;
 
     const assistantEl = appendMessage('assistant', '', true);
     const contentEl = assistantEl.querySelector('.message-content');
@@ -172,9 +186,13 @@ async function sendMessage() {
     const $status = document.getElementById('chat-status');
 
     try {
-        const res = await fetch('/api/chat', {
+        let res = await fetch('/api/chat', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            // Coalesced token frames, gzipped when the server allows it
+            headers: {
+                'Content-Type': 'application/json', 'X-Stream-Format': 'compact, gzip',
+                'X-Stream-Id': streamId, 'X-Stream-Resume': '1',
+            },
             body: JSON.stringify({
                 conversation_id: currentConvo,
                 message: text,
@@ -183,97 +201,177 @@ async function sendMessage() {
                 backend_id: activeBackendId,
                 search: searchEnabled,
                 think: thinkEnabled,
+                reasoning: true,
             }),
         });
 
-        const reader = res.body.getReader();
-        const decoder = new TextDecoder();
         let fullText = '';
-
-        while (true) {
-            const { done, value } = await reader.read();
-            if (done) break;
-
-            const chunk = decoder.decode(value);
-            const lines = chunk.split('\n');
-
-            for (const line of lines) {
-                if (!line.startsWith('data: ')) continue;
-                const data = JSON.parse(line.slice(6));
-
-                if (data.error) {
-                    contentEl.textContent = `Error: ${data.error}`;
-                    $status.classList.add('hidden');
-                    break;
-                }
-
-                // Status updates (searching / reading / generating / imagegen)
-                if (data.status) {
-                    $status.classList.remove('hidden');
-                    if (data.status === 'searching') {
-                        $status.innerHTML = '<span class="status-dot"></span> Searching the web...';
-                    } else if (data.status === 'reading') {
-                        $status.innerHTML = `<span class="status-dot"></span> Reading ${escapeHtml(data.url || '')}...`;
-                    } else if (data.status === 'imagegen') {
-                        $status.innerHTML = '<span class="status-dot"></span> Crafting image prompt...';
-                    } else if (data.status === 'generating_image') {
-                        $status.innerHTML = '<span class="status-dot"></span> Generating image...';
-                    } else if (data.status === 'image_error') {
-                        $status.innerHTML = `<span class="status-dot" style="background:#ef4444"></span> Image gen failed: ${escapeHtml(data.message || '')}`;
-                        setTimeout(() => $status.classList.add('hidden'), 5000);
-                    } else if (data.status === 'generating') {
-                        $status.classList.add('hidden');
-                    }
-                }
-
-                // Search results - show as cards above the response
-                if (data.search_results) {
-                    const srDiv = document.createElement('div');
-                    srDiv.className = 'search-results-bar';
-                    srDiv.innerHTML = `<div class="sr-label">Sources</div><div class="sr-cards">${
-                        data.search_results.map(r =>
-                            `<a class="sr-card" href="${escapeHtml(r.url)}" target="_blank" rel="noopener">
-                                <div class="sr-card-title">${escapeHtml(r.title)}</div>
-                                <div class="sr-card-url">${escapeHtml((r.url || '').replace(/^https?:\/\//, '').split('/')[0])}</div>
-                            </a>`
-                        ).join('')
-                    }</div>`;
-                    assistantEl.querySelector('.message-body').insertBefore(srDiv, contentEl);
-                    scrollToBottom();
-                }
-
-                // Inline images from chat image generation
-                if (data.images) {
-                    const imgContainer = document.createElement('div');
-                    imgContainer.className = 'chat-images';
-                    data.images.forEach(img => {
-                        const imgEl = document.createElement('img');
-                        imgEl.src = img.url;
-                        imgEl.alt = img.prompt || 'Generated image';
-                        imgEl.className = 'chat-inline-image';
-                        imgEl.addEventListener('click', () => window.open(img.url, '_blank'));
-                        imgContainer.appendChild(imgEl);
+        let reasoningText = '';
+        let thinkEl = null;
+        let lastEventId = '';
+        let finished = false;
+        let lastError = null;
+
+        // A dropped connection reattaches to the still-running generation and replays what was missed
+        for (let attempt = 0; !finished && attempt <= STREAM_RETRIES; attempt++) {
+            try {
+                if (attempt > 0) {
+                    await new Promise(r => setTimeout(r, Math.min(500 * 2 ** (attempt - 1), 4000)));
+                    res = await fetch(`/api/streams/${encodeURIComponent(streamId)}`, {
+                        headers: { 'X-Stream-Format': 'compact, gzip', 'Last-Event-ID': lastEventId },
                     });
-                    assistantEl.querySelector('.message-body').insertBefore(imgContainer, contentEl);
-                    $status.classList.add('hidden');
-                    scrollToBottom();
+                    if (res.status === 404) break;  // generation already gone
+                    if (!lastEventId) {
+                        // Replays from the start: drop what the first connection already drew
+                        fullText = reasoningText = '';
+                        contentEl.textContent = '';
+                        thinkEl?.remove();
+                        thinkEl = null;
+                        assistantEl.querySelectorAll('.search-results-bar, .chat-images').forEach(el => el.remove());
+                    }
                 }
-
-                if (data.token) {
-                    fullText += data.token;
-                    contentEl.textContent = fullText;
-                    scrollToBottom();
+                if (!res.ok) {
+                    const body = await res.json().catch(() => ({}));
+                    const retry = body.retry_after ? ` Try again in ${body.retry_after}s.` : '';
+                    lastError = new Error((body.error || `HTTP ${res.status}`) + retry);
+                    break;
                 }
 
-                if (data.done) {
-                    currentConvo = data.conversation_id;
-                    history.replaceState(null, '', `/chat/${data.conversation_id}`);
-                    updateSidebar(data.conversation_id, data.title);
-                    renderMarkdown(contentEl);
-                    $status.classList.add('hidden');
+                const reader = res.body.getReader();
+                const decoder = new TextDecoder();
+                let pending = '';
+
+                while (true) {
+                    const { done, value } = await reader.read();
+                    if (done) break;
+
+                    // Frames can span reads; keep the trailing partial line for the next one
+                    pending += decoder.decode(value, { stream: true });
+                    const lines = pending.split('\n');
+                    pending = lines.pop();
+
+                    for (const line of lines) {
+                        if (line.startsWith('id: ')) lastEventId = line.slice(4);
+                        if (!line.startsWith('data: ')) continue;
+                        let data = JSON.parse(line.slice(6));
+                        if (typeof data === 'string') data = { token: data };  // compact token frame
+
+                        if (data.error) {
+                            contentEl.textContent = `Error: ${data.error}`;
+                            $status.classList.add('hidden');
+                            finished = true;
+                            break;
+                        }
+
+                        // Status updates (searching / fetching / generating / imagegen)
+                        if (data.status) {
+                            $status.classList.remove('hidden');
+                            if (data.status === 'queued') {
+                                $status.innerHTML = `<span class="status-dot"></span> Waiting for a free model slot (position ${data.position})...`;
+                            } else if (data.status === 'searching') {
+                                $status.innerHTML = '<span class="status-dot"></span> Searching the web...';
+                            } else if (data.status === 'fetching') {
+                                $status.innerHTML = `<span class="status-dot"></span> Reading ${data.pages} page${data.pages === 1 ? '' : 's'}...`;
+                            } else if (data.status === 'imagegen') {
+                                $status.innerHTML = '<span class="status-dot"></span> Crafting image prompt...';
+                            } else if (data.status === 'generating_image') {
+                                const pct = data.progress ? ` ${Math.round(data.progress * 100)}%` : '';
+                                $status.innerHTML = `<span class="status-dot"></span> Generating image...${pct}`;
+                            } else if (data.status === 'image_error') {
+                                $status.innerHTML = `<span class="status-dot" style="background:#ef4444"></span> Image gen failed: ${escapeHtml(data.message || '')}`;
+                                setTimeout(() => $status.classList.add('hidden'), 5000);
+                            } else if (data.status === 'generating') {
+                                $status.classList.add('hidden');
+                            }
+                        } else if (data.token || data.reasoning) {
+                            $status.classList.add('hidden');
+                        }
+
+                        if (data.page_read) {
+                            $status.innerHTML = `<span class="status-dot"></span> Read ${escapeHtml(data.page_read.title || data.page_read.url)}`;
+                        }
+
+                        // Search results - show as cards above the response
+                        if (data.search_results) {
+                            const srDiv = document.createElement('div');
+                            srDiv.className = 'search-results-bar';
+                            srDiv.innerHTML = `<div class="sr-label">Sources</div><div class="sr-cards">${
+                                data.search_results.map(r =>
+                                    `<a class="sr-card" href="${escapeHtml(r.url)}" target="_blank" rel="noopener">
+                                        <div class="sr-card-title">${escapeHtml(r.title)}</div>
+                                        <div class="sr-card-url">${escapeHtml((r.url || '').replace(/^https?:\/\//, '').split('/')[0])}</div>
+                                    </a>`
+                                ).join('')
+                            }</div>`;
+                            assistantEl.querySelector('.message-body').insertBefore(srDiv, contentEl);
+                            scrollToBottom();
+                        }
+
+                        // Inline images from chat image generation
+                        if (data.images) {
+                            const imgContainer = document.createElement('div');
+                            imgContainer.className = 'chat-images';
+                            data.images.forEach(img => {
+                                const imgEl = document.createElement('img');
+                                imgEl.src = img.url;
+                                imgEl.alt = img.prompt || 'Generated image';
+                                imgEl.className = 'chat-inline-image';
+                                imgEl.addEventListener('click', () => window.open(img.url, '_blank'));
+                                imgContainer.appendChild(imgEl);
+                            });
+                            assistantEl.querySelector('.message-body').insertBefore(imgContainer, contentEl);
+                            $status.classList.add('hidden');
+                            scrollToBottom();
+                        }
+
+                        // Resumed too far behind the server's buffer: take its copy of the text so far
+                        if (data.resync) {
+                            fullText = data.resync.text;
+                            reasoningText = '';
+                            thinkEl?.querySelector('.think-content').replaceChildren();
+                            contentEl.textContent = fullText;
+                            data.reasoning = data.resync.reasoning;
+                        }
+
+                        // Reasoning streams into a live think block above the answer
+                        if (data.reasoning) {
+                            if (!thinkEl) {
+                                thinkEl = document.createElement('details');
+                                thinkEl.className = 'think-block';
+                                thinkEl.open = true;
+                                thinkEl.innerHTML = '<summary>Thinking</summary><div class="think-content"></div>';
+                                contentEl.parentNode.insertBefore(thinkEl, contentEl);
+                            }
+                            reasoningText += data.reasoning;
+                            thinkEl.querySelector('.think-content').textContent = reasoningText;
+                            scrollToBottom();
+                        }
+
+                        if (data.token) {
+                            fullText += data.token;
+                            contentEl.textContent = fullText;
+                            scrollToBottom();
+                        }
+
+                        if (data.done) {
+                            finished = true;
+                            currentConvo = data.conversation_id;
+                            history.replaceState(null, '', `/chat/${data.conversation_id}`);
+                            updateSidebar(data.conversation_id, data.title);
+                            if (thinkEl) {
+                                thinkEl.remove();
+                                contentEl.textContent = `<think>${reasoningText.trim()}</think>\n\n${fullText}`;
+                            }
+                            renderMarkdown(contentEl);
+                            $status.classList.add('hidden');
+                        }
+                    }
                 }
+            } catch (err) {
+                lastError = err;
             }
         }
+        if (!finished) throw lastError || new Error('Connection lost');
     } catch (err) {
         contentEl.textContent = `Error: ${err.message}`;
         $status.classList.add('hidden');
@@ -282,12 +380,22 @@ async function sendMessage() {
     // Remove typing indicator
     assistantEl.querySelector('.typing-indicator')?.remove();
     isStreaming = false;
+    streamId = null;
     $btnSend.disabled = false;
+    $btnSend.classList.remove('hidden');
+    $btnStop?.classList.add('hidden');
     $input.focus();
 }
 
 // ─── Append message to chat ───────────────────────────────────────────
 function appendMessage(role, content, streaming = false) {
+    const div = messageElement(role, content, streaming);
+    $messages.appendChild(div);
+    scrollToBottom();
+    return div;
+}
+
+function messageElement(role, content, streaming = false) {
     const personality = $personalitySelect.value;
     const personalityData = getPersonalityData(personality);
     const username = document.querySelector('.user-name')?.textContent || 'U';
@@ -304,8 +412,6 @@ function appendMessage(role, content, streaming = false) {
             </div>
         </div>
     `;
-    $messages.appendChild(div);
-    scrollToBottom();
     return div;
 }
 
@@ -328,28 +434,95 @@ function updateSidebar(convoId, title) {
         existing.querySelector('.convo-title').textContent = title;
         list.prepend(existing);
     } else {
-        const a = document.createElement('a');
-        a.href = `/chat/${convoId}`;
-        a.className = 'convo-item active';
-        a.dataset.id = convoId;
-        a.innerHTML = `
-            <span class="convo-title">${escapeHtml(title)}</span>
-            <button class="btn-icon convo-delete" data-id="${convoId}" title="Delete">
-                <svg width="14" height="14" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2"><line x1="18" y1="6" x2="6" y2="18"/><line x1="6" y1="6" x2="18" y2="18"/></svg>
-            </button>
-        `;
-        a.querySelector('.convo-delete').addEventListener('click', async (e) => {
-            e.preventDefault();
-            e.stopPropagation();
-            if (!confirm('Delete this conversation?')) return;
-            await fetch(`/api/conversations/${convoId}`, { method: 'DELETE' });
-            window.location.href = '/chat';
-        });
+        const a = convoElement(convoId, title);
+        a.classList.add('active');
         list.querySelectorAll('.convo-item').forEach(i => i.classList.remove('active'));
         list.prepend(a);
     }
 }
 
+function convoElement(convoId, title) {
+    const a = document.createElement('a');
+    a.href = `/chat/${convoId}`;
+    a.className = 'convo-item';
+    a.dataset.id = convoId;
+    a.innerHTML = `
+        <span class="convo-title">${escapeHtml(title)}</span>
+        <button class="btn-icon convo-delete" data-id="${convoId}" title="Delete">
+            <svg width="14" height="14" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2"><line x1="18" y1="6" x2="6" y2="18"/><line x1="6" y1="6" x2="18" y2="18"/></svg>
+        </button>
+    `;
+    bindConvoDelete(a.querySelector('.convo-delete'));
+    return a;
+}
+
+function bindConvoDelete(btn) {
+    btn.addEventListener('click', async (e) => {
+        e.preventDefault();
+        e.stopPropagation();
+        const id = btn.dataset.id;
+        if (!confirm('Delete this conversation?')) return;
+        await fetch(`/api/conversations/${id}`, { method: 'DELETE' });
+        if (currentConvo == id) {
+            window.location.href = '/chat';
+        } else {
+            btn.closest('.convo-item').remove();
+        }
+    });
+}
+
+// ─── Pagination ───────────────────────────────────────────────────────
+// Runs load() each time the sentinel scrolls into view; load() resolves to
+// false once there is nothing more to fetch.
+function whenVisible(sentinel, load) {
+    if (!sentinel) return;
+    const observer = new IntersectionObserver(async (entries) => {
+        if (!entries[0].isIntersecting) return;
+        observer.unobserve(sentinel);
+        if (await load()) observer.observe(sentinel);  // fires again if still in view
+    });
+    observer.observe(sentinel);
+}
+
+async function loadMoreConversations() {
+    const list = document.getElementById('convo-list');
+    if (!list.dataset.next) return false;
+    try {
+        const res = await fetch(`/api/conversations?before=${encodeURIComponent(list.dataset.next)}`);
+        const data = await res.json();
+        const sentinel = document.getElementById('convo-sentinel');
+        data.conversations.forEach(c => {
+            if (!list.querySelector(`[data-id="${c.id}"]`)) sentinel.before(convoElement(c.id, c.title));
+        });
+        list.dataset.next = data.next || '';
+        return !!data.next;
+    } catch {
+        return false;
+    }
+}
+
+async function loadOlderMessages() {
+    if (!$messages.dataset.next || !currentConvo) return false;
+    try {
+        const res = await fetch(`/api/conversations/${currentConvo}/messages?before=${encodeURIComponent($messages.dataset.next)}`);
+        const data = await res.json();
+        const frag = document.createDocumentFragment();
+        data.messages.forEach(m => {
+            const div = messageElement(m.role, m.content);
+            if (m.role === 'assistant') renderMarkdown(div.querySelector('.message-content'));
+            frag.appendChild(div);
+        });
+        // Keep the visible messages in place while older ones go in above
+        const fromBottom = $messages.scrollHeight - $messages.scrollTop;
+        document.getElementById('message-sentinel').after(frag);
+        $messages.scrollTop = $messages.scrollHeight - fromBottom;
+        $messages.dataset.next = data.next || '';
+        return !!data.next;
+    } catch {
+        return false;
+    }
+}
+
 // ─── Search ───────────────────────────────────────────────────────────
 let searchTimeout;
 $searchInput.addEventListener('input', () => {
@@ -376,7 +549,7 @@ async function doSearch(q) {
             $searchResults.innerHTML = data.results.map(r => `
                 <div class="search-result-item" onclick="window.location.href='/chat/${r.conversation_id}'">
                     <div class="search-result-title">${escapeHtml(r.title)}</div>
-                    <div class="search-result-snippet">${escapeHtml(r.snippet)}</div>
+                    <div class="search-result-snippet">${r.snippet_html ?? escapeHtml(r.snippet)}</div>
                     <div class="search-result-date">${r.date}</div>
                 </div>
             `).join('');
@@ -562,6 +735,15 @@ document.getElementById('btn-add-backend')?.addEventListener('click', async () =
     renderBackendList();
 });
 
+function backendHealthLabel(h) {
+    if (!h || h.state === 'unknown') return '';
+    if (h.state === 'closed') {
+        const busy = h.inflight ? ` · ${h.inflight} active` : '';
+        return (h.latency_ms != null ? ` · ${Math.round(h.latency_ms)} ms` : '') + busy;
+    }
+    return ` · <span style="color:#ef4444" title="${escapeHtml(h.last_error || '')}">${h.state === 'open' ? 'unreachable' : 'retrying'}</span>`;
+}
+
 async function renderBackendList() {
     try {
         const res = await fetch('/api/backends');
@@ -575,7 +757,7 @@ async function renderBackendList() {
             <div class="model-item">
                 <div class="model-info">
                     <div class="model-name">${escapeHtml(b.name)} ${b.is_default ? '<span style="color:var(--accent); font-size:11px;">DEFAULT</span>' : ''}</div>
-                    <div class="model-meta">${b.kind} · ${escapeHtml(b.base_url)}${b.has_key ? ' · key set' : ''}</div>
+                    <div class="model-meta">${b.kind} · ${escapeHtml(b.base_url)}${b.has_key ? ' · key set' : ''}${b.pool ? ` · pool ${escapeHtml(b.pool)}` : ''}${backendHealthLabel(b.health)}</div>
                 </div>
                 <div class="model-actions" style="gap:4px;">
                     <button class="btn-model-delete" data-action="edit" data-id="${b.id}" style="color:var(--text-secondary)">Edit</button>
@@ -616,6 +798,7 @@ async function renderBackendList() {
                 document.getElementById('be-name').value = b.name;
                 document.getElementById('be-url').value = b.base_url;
                 document.getElementById('be-key').value = '';
+                document.getElementById('be-pool').value = b.pool || '';
                 document.getElementById('be-status').classList.add('hidden');
                 $backendEditModal.classList.remove('hidden');
             });
@@ -635,6 +818,7 @@ document.getElementById('be-save')?.addEventListener('click', async () => {
     const body = {
         name: document.getElementById('be-name').value,
         base_url: document.getElementById('be-url').value,
+        pool: document.getElementById('be-pool').value,
     };
     const key = document.getElementById('be-key').value;
     if (key) body.api_key = key;
@@ -0,0 +1,456 @@
+"""Shared fixtures: a throwaway database, fake LLM, SD and web servers and logged-in clients.
+
+app.py reads its configuration when it is imported, so the environment is set
+up here before the first test imports it.
+"""
+import base64
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+LOCAL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LOCAL_DIR)
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    """Ollama and OpenAI-compatible chat endpoints that stream `tokens`, `delay` apart."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeUpstreamHandler)
+        self.reset()
+
+    def reset(self):
+        self.tokens = ['Hel', 'lo', ' world', '!']
+        self.thinking = []       # Ollama message.thinking chunks sent before the tokens
+        self.delay = 0.0
+        self.models = [{'name': 'llama3.2', 'size': 2e9, 'details': {'family': 'llama', 'parameter_size': '3B'}}]
+        self.fail_status = None  # answer every request with this status
+        self.requests = []       # (method, path, json body)
+        self.peers = set()       # client (host, port) pairs, i.e. distinct connections
+        self.aborted = 0         # streams the client hung up on
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def end_headers(self):
+        if self.close_connection:  # the client sent Connection: close; say so, as real servers do
+            self.send_header('Connection', 'close')
+        super().end_headers()
+
+    def _json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _record(self, body=None):
+        self.server.requests.append((self.command, self.path, body))
+        self.server.peers.add(self.client_address)
+
+    def do_GET(self):
+        self._record()
+        if self.server.fail_status:
+            return self._json({'error': 'down'}, self.server.fail_status)
+        if self.path.startswith('/api/tags'):
+            self._json({'models': self.server.models})
+        elif self.path.startswith('/v1/models'):
+            self._json({'data': [{'id': m['name']} for m in self.server.models]})
+        else:
+            self._json({}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        self._record(body)
+        if self.server.fail_status:
+            return self._json({'error': 'down'}, self.server.fail_status)
+        if self.path == '/api/chat':
+            self._stream('application/x-ndjson', self._ollama_lines())
+        elif self.path == '/v1/chat/completions':
+            self._stream('text/event-stream', self._openai_lines())
+        else:
+            self._json({}, 404)
+
+    def _ollama_lines(self):
+        for text in self.server.thinking:
+            yield json.dumps({'message': {'content': '', 'thinking': text}, 'done': False}) + '\n'
+        for text in self.server.tokens:
+            yield json.dumps({'message': {'content': text}, 'done': False}) + '\n'
+        yield json.dumps({'message': {'content': ''}, 'done': True}) + '\n'
+
+    def _openai_lines(self):
+        for text in self.server.tokens:
+            yield 'data: ' + json.dumps({'choices': [{'delta': {'content': text}}]}) + '\n\n'
+        yield 'data: [DONE]\n\n'
+
+    def _stream(self, content_type, lines):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for line in lines:
+                if self.server.delay:
+                    time.sleep(self.server.delay)
+                data = line.encode()
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.aborted += 1
+
+
+class FakeSD(ThreadingHTTPServer):
+    """sd_server's txt2img in one of its reply `mode`s: 'multipart', 'raw' (one image) or 'json' (base64)."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeSDHandler)
+        self.reset()
+
+    def reset(self):
+        self.mode = 'multipart'
+        self.images = [(b'\x89PNG first', 11), (b'\x89PNG second', 12)]  # (bytes, seed)
+        self.content_type = 'image/png'
+        self.truncate = False    # cut the multipart body short
+        self.gate = None         # txt2img waits for this event before answering
+        self.progress = {'progress': 0, 'state': {'status': 'unknown'}}  # /sdapi/v1/progress reply
+        self.requests = []       # (path, headers, json body)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+class FakeSDHandler(FakeUpstreamHandler):
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers), None))
+        if self.path.startswith('/sdapi/v1/progress'):
+            return self._json(self.server.progress)
+        self._json({}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        self.server.requests.append((self.path, dict(self.headers), body))
+        if self.path != '/sdapi/v1/txt2img':
+            return self._json({}, 404)
+        sd = self.server
+        if sd.gate:
+            sd.gate.wait(5)
+        info = {'seed': sd.images[0][1], 'all_seeds': [seed for _, seed in sd.images]}
+        if sd.mode == 'json':
+            return self._json({'images': [base64.b64encode(data).decode() for data, _ in sd.images],
+                               'info': json.dumps(info)})
+        if sd.mode == 'raw':
+            data, seed = sd.images[0]
+            self.send_response(200)
+            self.send_header('Content-Type', sd.content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('X-Seed', str(seed))
+            self.send_header('X-SD-Info', json.dumps(info))
+            self.end_headers()
+            return self.wfile.write(data)
+
+        boundary = 'b0undary'
+        info_bytes = json.dumps(info).encode()
+        out = (f'--{boundary}\r\nContent-Type: application/json\r\n'
+               f'Content-Length: {len(info_bytes)}\r\n\r\n').encode() + info_bytes + b'\r\n'
+        for data, seed in sd.images:
+            out += (f'--{boundary}\r\nContent-Type: {sd.content_type}\r\nContent-Length: {len(data)}\r\n'
+                    f'X-Seed: {seed}\r\n\r\n').encode() + data + b'\r\n'
+        out += f'--{boundary}--\r\n'.encode()
+        if sd.truncate:
+            out = out[:-len(sd.images[-1][0]) - 20]
+        self.send_response(200)
+        self.send_header('Content-Type', f'multipart/mixed; boundary={boundary}')
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+class FakeWeb(ThreadingHTTPServer):
+    """Web pages for the search fetchers: `pages` maps a path to its status, headers, body and delay."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeWebHandler)
+        self.reset()
+
+    def reset(self):
+        self.pages = {}
+        self.requests = []  # (path, headers)
+
+    def page(self, path, body, delay=0.0, status=200, content_type='text/html; charset=utf-8', **headers):
+        """Serve body at path; returns its URL. Extra headers use underscores (ETag, Last_Modified)."""
+        headers = {name.replace('_', '-'): value for name, value in headers.items()}
+        self.pages[path] = {'status': status, 'body': body.encode() if isinstance(body, str) else body,
+                            'delay': delay, 'headers': dict(headers, **{'Content-Type': content_type})}
+        return self.url + path
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+class FakeWebHandler(FakeUpstreamHandler):
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        page = self.server.pages.get(self.path.split('?', 1)[0])
+        if page is None:
+            return self._json({}, 404)
+        time.sleep(page['delay'])
+        etag = page['headers'].get('ETag')
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            return self.end_headers()
+        self.send_response(page['status'])
+        for name, value in page['headers'].items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(page['body'])))
+        self.end_headers()
+        try:
+            self.wfile.write(page['body'])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def _start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+_UPSTREAM = _start(FakeUpstream())
+_SD = _start(FakeSD())
+_WEB = _start(FakeWeb())
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='local-ai-tests-'), 'test.db')
+os.environ['OLLAMA_HOST'] = _UPSTREAM.url
+
+
+@pytest.fixture(scope='session')
+def A():
+    """The app module, initialized."""
+    import app
+    app.init_app()
+    return app
+
+
+@pytest.fixture
+def sd_upstream(A, monkeypatch, tmp_path):
+    """The fake SD server as app.SD_BASE, with generated images written under tmp_path and fresh image jobs."""
+    _SD.reset()
+    monkeypatch.setattr(A, 'SD_BASE', _SD.url)
+    monkeypatch.setattr(A, 'IMAGES_DIR', str(tmp_path))
+    monkeypatch.setattr(A, 'image_jobs', A.ImageJobs(workers=2, poll_interval=0.02, ttl=60))
+    yield _SD
+    if _SD.gate:
+        _SD.gate.set()
+
+
+@pytest.fixture
+def web(A, monkeypatch):
+    """The fake web server, with an empty web cache."""
+    _WEB.reset()
+    monkeypatch.setattr(A, 'web_cache', A.WebCache(max_entries=100, max_bytes=2**20, stale=3600))
+    return _WEB
+
+
+@pytest.fixture
+def upstream():
+    _UPSTREAM.reset()
+    yield _UPSTREAM
+    _UPSTREAM.reset()
+
+
+def parse_sse(text):
+    """Event dicts from an SSE body; compact token frames (bare strings) become {'token': ...}."""
+    events = []
+    for line in text.split('\n'):
+        if line.startswith('data: '):
+            data = json.loads(line[6:])
+            events.append({'token': data} if isinstance(data, str) else data)
+    return events
+
+
+@pytest.fixture
+def make_client(A):
+    """make_client() -> a test client logged in as a new user (with the default Ollama backend)."""
+    def make(username=None):
+        client = A.app.test_client()
+        username = username or f'user-{uuid.uuid4().hex[:10]}'
+        resp = client.post('/register', data={'username': username, 'password': 'pw1234'})
+        assert resp.status_code == 302
+        client.username = username
+        with A.app.app_context():
+            client.user_id = A.User.query.filter_by(username=username).one().id
+        return client
+    return make
+
+
+@pytest.fixture
+def client(make_client, upstream):
+    return make_client()
+
+
+@pytest.fixture
+def conversation(A, client):
+    """A conversation owned by `client`'s user: .id, and .add(role, content) -> new Message id.
+
+    Rows are written in their own app context; holding one open across requests
+    would let Flask reuse it (and Flask-Login's cached user) for every client.
+    """
+    with A.app.app_context():
+        convo = A.Conversation(user_id=client.user_id, model='llama3.2')
+        A.db.session.add(convo)
+        A.db.session.commit()
+        convo_id = convo.id
+
+    def add(role, content):
+        with A.app.app_context():
+            message = A.Message(conversation_id=convo_id, role=role, content=content)
+            A.db.session.add(message)
+            A.db.session.commit()
+            return message.id
+
+    return SimpleNamespace(id=convo_id, add=add)
+
+
+SD_SCHEDULERS = ('EulerAncestralDiscreteScheduler', 'EulerDiscreteScheduler', 'DPMSolverMultistepScheduler',
+                 'DDIMScheduler', 'UniPCMultistepScheduler', 'HeunDiscreteScheduler', 'LMSDiscreteScheduler')
+
+
+def stub_sd_dependencies():
+    """Install stand-ins for torch and diffusers when they aren't installed.
+
+    They cover what sd_server touches outside load_pipe/generate (which the
+    tests replace): device detection, seeded generators, no_grad and
+    scheduler configs.
+    """
+    if 'torch' not in sys.modules and importlib.util.find_spec('torch') is None:
+        torch = types.ModuleType('torch')
+        torch.backends = SimpleNamespace(cudnn=SimpleNamespace(enabled=True))
+        torch.cuda = SimpleNamespace(is_available=lambda: False, empty_cache=lambda: None)
+        torch.float16, torch.float32 = 'float16', 'float32'
+        torch.nn = SimpleNamespace(Module=type('Module', (), {}))
+        torch.no_grad = contextlib.nullcontext
+
+        class Generator:
+            def __init__(self, device=None):
+                self.seed = None
+
+            def manual_seed(self, seed):
+                self.seed = seed
+                return self
+
+        torch.Generator = Generator
+        sys.modules['torch'] = torch
+    if 'diffusers' not in sys.modules and importlib.util.find_spec('diffusers') is None:
+        diffusers = types.ModuleType('diffusers')
+
+        class Scheduler:
+            def __init__(self, **config):
+                self.config = config
+
+            @classmethod
+            def from_config(cls, config, **overrides):
+                return cls(**dict(config, **overrides))
+
+        for name in SD_SCHEDULERS:
+            setattr(diffusers, name, type(name, (Scheduler,), {}))
+        diffusers.StableDiffusionPipeline = type('StableDiffusionPipeline', (), {})
+        sys.modules['diffusers'] = diffusers
+
+
+@pytest.fixture
+def sd(monkeypatch, tmp_path):
+    """The sd_server module with two empty checkpoints in a fresh ModelManager and a fresh scheduler.
+
+    Nothing here loads weights: tests replace load_pipe/generate as they need.
+    """
+    stub_sd_dependencies()
+    import sd_server
+    for name in ('alpha.safetensors', 'beta.safetensors'):
+        (tmp_path / name).write_bytes(b'')
+    manager = sd_server.ModelManager(str(tmp_path))
+    manager.scan()
+    monkeypatch.setattr(sd_server, 'models', manager)
+    monkeypatch.setattr(sd_server, 'scheduler', sd_server.BatchScheduler())
+    return sd_server
+
+
+class AppSandbox:
+    """A bare Flask app whose apps/ folder is a temp dir, served by a fresh AppLoader.
+
+    Logins are disabled, and the app module's registry and template loader are
+    swapped for empty ones so the real app never sees these apps.
+    """
+
+    def __init__(self, A, apps_dir):
+        from flask import Flask
+        from flask_login import LoginManager
+        self.A = A
+        self.dir = apps_dir
+        self.flask_app = Flask('sandbox')
+        self.flask_app.config.update(LOGIN_DISABLED=True, SECRET_KEY='test', TESTING=True)
+        LoginManager(self.flask_app).user_loader(lambda user_id: None)
+        self.loader = None
+
+    def write(self, app_id, backend=None, template=None, page=True, api_prefix=True, **manifest):
+        """Create or replace apps/<app_id>; returns its folder."""
+        app_dir = self.dir / app_id
+        (app_dir / 'templates').mkdir(parents=True, exist_ok=True)
+        entry, routes = {}, {}
+        if backend is not None:
+            (app_dir / 'backend.py').write_text(backend)
+            entry['backend'] = 'backend.py'
+        if template is not None:
+            (app_dir / 'templates' / 'index.html').write_text(template)
+            entry['template'] = 'templates/index.html'
+        if page:
+            routes['page'] = page if isinstance(page, str) else f'/apps/{app_id}'
+        if api_prefix:
+            routes['api_prefix'] = api_prefix if isinstance(api_prefix, str) else f'/api/apps/{app_id}'
+        (app_dir / 'manifest.json').write_text(json.dumps(
+            dict({'id': app_id, 'name': app_id.title(), 'entry': entry, 'routes': routes}, **manifest)))
+        return app_dir
+
+    def start(self):
+        self.loader = self.A.load_apps(self.flask_app, self.A.Platform(self.flask_app))
+        return self.flask_app.test_client()
+
+
+@pytest.fixture
+def sandbox(A, monkeypatch, tmp_path):
+    apps_dir = tmp_path / 'apps'
+    apps_dir.mkdir()
+    monkeypatch.setattr(A, 'APPS_DIR', str(apps_dir))
+    monkeypatch.setattr(A, 'APPS', A.AppRegistry())
+    monkeypatch.setattr(A, 'app_template_loader', A.PrefixLoader({}))
+    return AppSandbox(A, apps_dir)
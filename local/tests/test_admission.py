@@ -0,0 +1,154 @@
+import asyncio
+import contextlib
+import threading
+import time
+
+import pytest
+
+from conftest import parse_sse
+
+
+@pytest.fixture
+def control(A, monkeypatch):
+    """A fresh Admission, also installed as the app's, with roomy default caps."""
+    control = A.Admission()
+    monkeypatch.setattr(A, 'admission', control)
+    monkeypatch.setattr(A, 'LLM_USER_CONCURRENCY', 4)
+    monkeypatch.setattr(A, 'LLM_BACKEND_CONCURRENCY', 8)
+    monkeypatch.setattr(A, 'LLM_GLOBAL_CONCURRENCY', 0)
+    monkeypatch.setattr(A, 'LLM_QUEUE_MAX', 64)
+    monkeypatch.setattr(A, 'LLM_USER_QUEUE_MAX', 8)
+    return control
+
+
+def backend(A, backend_id, url='http://gpu:11434', peers=()):
+    return A.BackendInfo(backend_id, 'GPU', 'ollama', url, '', True, '', peers)
+
+
+def enqueue(control, user_id, backend=None, weight='chat'):
+    ticket = control.ticket(user_id, backend, weight)
+    control.enqueue(ticket)
+    return ticket
+
+
+def test_per_user_cap_queues_the_extra_generation(A, control, monkeypatch):
+    monkeypatch.setattr(A, 'LLM_USER_CONCURRENCY', 1)
+    first, second = enqueue(control, 1), enqueue(control, 1)
+    other_user = enqueue(control, 2)
+    assert (first.state, second.state, other_user.state) == ('running', 'waiting', 'running')
+
+    first.release()
+    assert second.state == 'running'
+    assert control.stats()['running'] == 2
+
+
+def test_backend_cap_is_shared_by_users_of_the_same_server(A, control, monkeypatch):
+    monkeypatch.setattr(A, 'LLM_BACKEND_CONCURRENCY', 1)
+    mine, theirs = backend(A, 1), backend(A, 2, url='http://gpu:11434/')
+    assert enqueue(control, 1, mine).state == 'running'
+    assert enqueue(control, 2, theirs).state == 'waiting'
+    assert enqueue(control, 3, backend(A, 3, url='http://other:11434')).state == 'running'
+
+    pooled = backend(A, 4, url='http://a:1', peers=(backend(A, 5, url='http://b:1'),))
+    assert [enqueue(control, 4, pooled).state for _ in range(3)] == ['running', 'running', 'waiting']
+
+
+def test_fair_queue_interleaves_a_batch_with_other_users(A, control, monkeypatch):
+    monkeypatch.setattr(A, 'LLM_GLOBAL_CONCURRENCY', 1)
+    batch = [enqueue(control, 1, weight='app') for _ in range(4)]
+    other = enqueue(control, 2, weight='app')
+    order = [batch[0]]
+    while control.waiting:
+        order[-1].release()
+        order.append(next(t for t in batch + [other] if t.state == 'running'))
+    assert order.index(other) == 2
+
+
+def test_weights_favour_interactive_chat(A, control, monkeypatch):
+    monkeypatch.setattr(A, 'LLM_GLOBAL_CONCURRENCY', 1)
+    running = enqueue(control, 9)
+    summary = enqueue(control, 1, weight='background')
+    chat = enqueue(control, 2, weight='chat')
+    assert control.position(chat) < control.position(summary)
+    running.release()
+    assert (chat.state, summary.state) == ('running', 'waiting')
+
+
+def test_full_queues_are_rejected_with_a_retry_hint(A, control, monkeypatch):
+    monkeypatch.setattr(A, 'LLM_USER_CONCURRENCY', 1)
+    monkeypatch.setattr(A, 'LLM_USER_QUEUE_MAX', 2)
+    enqueue(control, 1)
+    enqueue(control, 1)
+    enqueue(control, 1)
+    with pytest.raises(A.AppError) as exc:
+        enqueue(control, 1)
+    assert exc.value.status == 429
+    assert 1 <= exc.value.retry_after <= 120
+    control.check(2)  # other users still fit
+
+    monkeypatch.setattr(A, 'LLM_QUEUE_MAX', 2)
+    with pytest.raises(A.AppError):
+        control.check(2)
+    assert control.stats()['rejected'] == 2
+
+
+def test_idle_users_are_forgotten(A, control, monkeypatch):
+    monkeypatch.setattr(A, 'LLM_USER_CONCURRENCY', 1)
+    mine = backend(A, 1)
+    first, second = enqueue(control, 1, mine), enqueue(control, 1, mine)
+    first.release()
+    assert 1 in control._last_tag
+    second.release()
+    assert (control._last_tag, control.user_running, control.backend_running) == ({}, {}, {})
+
+
+def test_waiting_reports_positions_and_closing_gives_the_place_back(A, control, monkeypatch):
+    monkeypatch.setattr(A, 'LLM_USER_CONCURRENCY', 1)
+    running = enqueue(control, 1)
+
+    async def run():
+        ticket = control.ticket(1)
+        async with contextlib.aclosing(ticket.wait()) as positions:
+            assert await positions.__anext__() == 1
+        return ticket
+
+    ticket = asyncio.run(run())
+    assert ticket.state == 'done'
+    assert control.waiting == []
+    running.release()
+    assert control.stats()['running'] == 0
+
+
+def test_chat_streams_its_queue_position_until_admitted(A, control, client, upstream, monkeypatch):
+    monkeypatch.setattr(A, 'LLM_USER_CONCURRENCY', 1)
+    blocker = enqueue(control, client.user_id)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(body=client.post(
+        '/api/chat', json={'message': 'hi', 'model': 'llama3.2'}).get_data(as_text=True)))
+    thread.start()
+    deadline = time.monotonic() + 3
+    while not control.waiting and time.monotonic() < deadline:
+        time.sleep(0.01)
+    blocker.release()
+    thread.join(5)
+
+    events = parse_sse(result['body'])
+    assert {'status': 'queued', 'position': 1} in events
+    assert ''.join(e.get('token', '') for e in events) == 'Hello world!'
+    deadline = time.monotonic() + 2  # the slot is freed just after the last event
+    while control.stats()['running'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert control.stats()['running'] == 0
+
+
+def test_chat_and_app_streams_answer_429_when_the_queue_is_full(A, control, client, monkeypatch):
+    monkeypatch.setattr(A, 'LLM_USER_QUEUE_MAX', 0)
+    resp = client.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'})
+    assert resp.status_code == 429
+    assert int(resp.headers['Retry-After']) == resp.get_json()['retry_after']
+    with A.app.app_context():
+        assert A.Conversation.query.filter_by(user_id=client.user_id).count() == 0
+
+    resp = client.post('/api/apps/translator/run', json={'text': 'hola'})
+    assert resp.status_code == 429
+    assert 'Retry-After' in resp.headers
@@ -0,0 +1,155 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from conftest import AppSandbox
+
+BACKEND = '''
+import time
+from flask import jsonify
+
+with open({marker!r}, 'a') as f:
+    f.write('x')
+time.sleep({delay})
+
+
+def register(app, platform):
+    @app.route('{prefix}/ping')
+    def ping():
+        return jsonify({{'pong': True}})
+
+
+def get_template_context():
+    return {{'greeting': 'hello'}}
+'''
+
+
+@pytest.fixture
+def backend(tmp_path):
+    """backend(prefix, delay) -> backend.py source that counts its imports; backend.imports() reads the count."""
+    marker = tmp_path / 'imports'
+
+    def make(prefix='/api/apps/notes', delay=0):
+        return BACKEND.format(marker=str(marker), delay=delay, prefix=prefix)
+
+    make.imports = lambda: len(marker.read_text()) if marker.exists() else 0
+    return make
+
+
+def test_backends_are_imported_on_first_use(sandbox, backend):
+    sandbox.write('notes', backend=backend())
+    client = sandbox.start()
+    assert backend.imports() == 0
+    assert sandbox.loader.report()['apps']['notes']['load_ms'] is None
+
+    assert client.get('/api/apps/notes/ping').get_json() == {'pong': True}
+    assert client.get('/api/apps/notes/ping').get_json() == {'pong': True}
+    assert backend.imports() == 1
+    assert sandbox.loader.report()['apps']['notes']['loaded'] is True
+
+
+def test_concurrent_first_requests_import_once(sandbox, backend):
+    sandbox.write('notes', backend=backend(delay=0.2))
+    client = sandbox.start()
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(client.get('/api/apps/notes/ping').status_code))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses == [200] * 4
+    assert backend.imports() == 1
+
+
+def test_the_page_loads_the_backend_for_its_template_context(sandbox, backend):
+    sandbox.write('notes', backend=backend(), template='{{ greeting }}')
+    client = sandbox.start()
+    assert client.get('/apps/notes').get_data(as_text=True) == 'hello'
+    assert backend.imports() == 1
+
+
+def test_apps_without_an_api_prefix_are_imported_at_startup(sandbox, backend):
+    sandbox.write('legacy', backend=backend(prefix='/legacy'), api_prefix=False)
+    client = sandbox.start()
+    assert backend.imports() == 1
+    assert client.get('/legacy/ping').get_json() == {'pong': True}
+
+
+def test_eager_mode_imports_everything_at_startup(A, sandbox, backend, monkeypatch):
+    monkeypatch.setattr(A, 'APPS_EAGER', True)
+    sandbox.write('notes', backend=backend())
+    client = sandbox.start()
+    assert backend.imports() == 1
+    assert client.get('/api/apps/notes/ping').get_json() == {'pong': True}
+
+
+def test_unknown_paths_under_the_catch_all_are_not_found(sandbox, backend):
+    sandbox.write('notes', backend=backend())
+    client = sandbox.start()
+    assert client.get('/api/apps/other/ping').status_code == 404
+    assert client.get('/apps/other').status_code == 404
+    assert client.get('/api/apps/notes/missing').status_code == 404
+    assert backend.imports() == 1
+
+
+def test_a_broken_backend_is_reported_and_retried(sandbox):
+    app_dir = sandbox.write('notes', backend='raise ImportError("missing dependency")')
+    client = sandbox.start()
+    with pytest.raises(ImportError):  # a 500 outside TESTING
+        client.get('/api/apps/notes/ping')
+    assert sandbox.loader.report()['apps']['notes']['error'] == 'ImportError: missing dependency'
+
+    (app_dir / 'backend.py').write_text(
+        'def register(app, platform):\n    app.add_url_rule("/api/apps/notes/ping", "ping", lambda: "ok")\n')
+    assert client.get('/api/apps/notes/ping').get_data(as_text=True) == 'ok'
+
+
+def test_manifest_cache_is_written_and_reused(A, sandbox, tmp_path, monkeypatch):
+    cache = tmp_path / 'manifests.json'
+    monkeypatch.setattr(A, 'APPS_MANIFEST_CACHE', str(cache))
+    sandbox.write('notes', template='x')
+    sandbox.start()
+    entries = json.loads(cache.read_text())
+    assert entries['notes']['manifest']['name'] == 'Notes'
+
+    entries['notes']['manifest']['name'] = 'From cache'  # same mtime, so the cached copy is used
+    cache.write_text(json.dumps(entries))
+    AppSandbox(A, sandbox.dir).start()
+    assert A.APPS.get('notes')['name'] == 'From cache'
+
+
+def test_startup_is_reported_per_app(sandbox, backend):
+    sandbox.write('notes', backend=backend())
+    sandbox.write('todo', template='x')
+    sandbox.start()
+    report = sandbox.loader.report()
+    assert report['startup_ms'] >= 0
+    assert set(report['apps']) == {'notes', 'todo'}
+    assert all(app['manifest_ms'] >= 0 for app in report['apps'].values())
+
+
+IMPORT_ONLY = """
+import threading
+import app
+print(sorted(t.name for t in threading.enumerate()))
+app.init_app()
+app.init_app()
+print(sorted(t.name for t in threading.enumerate()))
+"""
+
+
+def test_importing_the_app_does_no_startup_work(tmp_path):
+    db = tmp_path / 'fresh.db'
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db}', WEB_CACHE_PERSIST='1', APPS_HOT_RELOAD='1')
+    out = subprocess.run([sys.executable, '-c', IMPORT_ONLY], cwd=os.path.dirname(os.path.dirname(__file__)),
+                         env=env, capture_output=True, text=True, timeout=60, check=True).stdout.splitlines()
+    assert not {"'db-writer'", "'web-cache-writer'", "'app-watcher'"} & set(out[0].strip('[]').split(', '))
+    assert all(out[1].count(name) == 1 for name in ("'db-writer'", "'web-cache-writer'", "'app-watcher'"))
+    with sqlite3.connect(db) as conn:
+        assert 'user' in {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+from markupsafe import escape
+
+
+@pytest.fixture
+def registry(A):
+    registry = A.AppRegistry()
+    registry.add({'id': 'notes', 'name': 'notes', 'routes': {'page': '/apps/notes', 'api_prefix': '/api/apps/notes'}})
+    registry.add({'id': 'notes-pro', 'name': 'Notes Pro', 'icon': 'N',
+                  'routes': {'page': '/apps/notes-pro', 'api_prefix': '/api/apps/notes/pro'}})
+    registry.add({'id': 'atlas', 'name': 'Atlas', 'routes': {}})
+    return registry
+
+
+def test_cards_are_sorted_by_name(registry):
+    assert [card['id'] for card in registry.cards()] == ['atlas', 'notes', 'notes-pro']
+    assert registry.cards()[2] == {'id': 'notes-pro', 'name': 'Notes Pro', 'icon': 'N', 'description': '',
+                                   'page': '/apps/notes-pro'}
+
+
+def test_owner_matches_the_longest_prefix_on_segment_boundaries(registry):
+    assert registry.owner('/api/apps/notes') == 'notes'
+    assert registry.owner('/api/apps/notes/list') == 'notes'
+    assert registry.owner('/api/apps/notes/pro/run') == 'notes-pro'
+    assert registry.owner('/api/apps/notesy') is None
+
+
+def test_remove_reindexes(registry):
+    registry.remove('notes-pro')
+    assert 'notes-pro' not in registry
+    assert registry.owner('/api/apps/notes/pro/run') == 'notes'
+    assert len(registry.cards()) == 2
+
+
+def test_hub_lists_installed_apps(A, client):
+    html = client.get('/apps').get_data(as_text=True)
+    for card in A.APPS.cards():
+        assert str(escape(card['name'])) in html
+
+
+def test_app_templates_are_compiled_once(A, client, monkeypatch):
+    A.app_loader._purge_templates('translator')
+    loader = A.app_template_loader.mapping['translator']
+    reads = []
+    get_source = loader.get_source
+    monkeypatch.setattr(loader, 'get_source', lambda env, name: reads.append(name) or get_source(env, name))
+
+    for _ in range(3):
+        assert client.get('/apps/translator').status_code == 200
+    assert reads == ['templates/index.html']
+
+
+def test_template_edits_show_up_when_auto_reload_is_on(sandbox):
+    sandbox.write('notes', template='version one')
+    client = sandbox.start()
+    sandbox.flask_app.jinja_env.auto_reload = True
+    assert client.get('/apps/notes').get_data(as_text=True) == 'version one'
+
+    template = sandbox.dir / 'notes' / 'templates' / 'index.html'
+    template.write_text('version two')
+    stat = template.stat()
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert client.get('/apps/notes').get_data(as_text=True) == 'version two'
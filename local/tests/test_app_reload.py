@@ -0,0 +1,175 @@
+import shutil
+
+import pytest
+
+BACKEND = '''
+from flask import Response
+
+VERSION = {version!r}
+with open({imports!r}, 'a') as f:
+    f.write(VERSION + '\\n')
+
+
+def register(app, platform):
+    @app.route('/api/apps/notes/version')
+    def version():
+        return VERSION
+
+    @app.route('/api/apps/notes/stream')
+    def stream():
+        return Response(part for part in (VERSION, '-done'))
+
+
+def teardown():
+    with open({teardowns!r}, 'a') as f:
+        f.write(VERSION + '\\n')
+'''
+
+
+@pytest.fixture
+def notes(sandbox, tmp_path):
+    """notes(version) writes the notes app; notes.imports()/notes.teardowns() list versions in order."""
+    imports, teardowns = tmp_path / 'imports', tmp_path / 'teardowns'
+
+    def write(version, **manifest):
+        return sandbox.write('notes', backend=BACKEND.format(
+            version=version, imports=str(imports), teardowns=str(teardowns)), **manifest)
+
+    def lines(path):
+        return path.read_text().split() if path.exists() else []
+
+    write.imports = lambda: lines(imports)
+    write.teardowns = lambda: lines(teardowns)
+    return write
+
+
+@pytest.fixture
+def start(A, sandbox):
+    """Start the sandbox with the fingerprints watch() would take, without its thread."""
+    def run():
+        client = sandbox.start()
+        for installed in sandbox.loader.apps.values():
+            installed.fingerprint = A.app_fingerprint(installed.dir)
+        return client
+    return run
+
+
+def test_a_changed_backend_is_swapped_in(sandbox, notes, start):
+    notes('v1')
+    client = start()
+    assert client.get('/api/apps/notes/version').text == 'v1'
+
+    notes('v22')
+    sandbox.loader.sync()
+    assert client.get('/api/apps/notes/version').text == 'v22'
+    assert notes.teardowns() == ['v1']
+    assert sandbox.loader.report()['reloads'] == 1
+
+
+def test_an_unused_app_is_swapped_without_importing_it(sandbox, notes, start):
+    notes('v1')
+    client = start()
+    notes('v22')
+    sandbox.loader.sync()
+    assert notes.imports() == []
+    assert client.get('/api/apps/notes/version').text == 'v22'
+
+
+def test_unchanged_apps_are_left_alone(sandbox, notes, start):
+    notes('v1')
+    client = start()
+    client.get('/api/apps/notes/version')
+    sandbox.loader.sync()
+    assert sandbox.loader.report()['reloads'] == 0
+    assert notes.imports() == ['v1']
+
+
+def test_apps_are_added_and_removed(A, sandbox, notes, start):
+    app_dir = notes('v1')
+    client = start()
+    sandbox.write('todo', template='todo page')
+    sandbox.loader.sync()
+    assert client.get('/apps/todo').text == 'todo page'
+    assert 'todo' in A.APPS
+
+    client.get('/api/apps/notes/version')
+    shutil.rmtree(app_dir)
+    sandbox.loader.sync()
+    assert client.get('/api/apps/notes/version').status_code == 404
+    assert client.get('/apps/notes').status_code == 404
+    assert 'notes' not in A.APPS
+    assert notes.teardowns() == ['v1']
+
+
+def test_in_flight_streams_finish_on_the_old_version(sandbox, notes, start):
+    notes('v1')
+    client = start()
+    resp = client.get('/api/apps/notes/stream', buffered=False)
+    body = iter(resp.response)
+    assert next(body) == b'v1'
+
+    notes('v22')
+    sandbox.loader.sync()
+    assert client.get('/api/apps/notes/version').text == 'v22'
+    assert notes.teardowns() == []
+
+    assert b''.join(body) == b'-done'
+    resp.close()
+    assert notes.teardowns() == ['v1']
+
+
+def test_a_broken_version_keeps_the_current_one_until_fixed(sandbox, notes, start, capsys):
+    app_dir = notes('v1')
+    client = start()
+    client.get('/api/apps/notes/version')
+
+    (app_dir / 'backend.py').write_text('raise RuntimeError("typo")')
+    sandbox.loader.sync()
+    assert client.get('/api/apps/notes/version').text == 'v1'
+    assert sandbox.loader.report()['apps']['notes']['error'] == 'RuntimeError: typo'
+    assert 'reload failed' in capsys.readouterr().err
+
+    sandbox.loader.sync()  # same files: not retried
+    assert capsys.readouterr().err == ''
+
+    notes('v333')
+    sandbox.loader.sync()
+    assert client.get('/api/apps/notes/version').text == 'v333'
+    assert notes.teardowns() == ['v1']
+
+
+def test_routes_outside_the_catch_alls_need_a_restart(A, sandbox, notes, start, capsys):
+    notes('v1')
+    start()
+    app_dir = sandbox.write('custom', backend='', api_prefix='/api/custom')
+    sandbox.loader.sync()
+    assert 'custom' not in A.APPS
+    assert sandbox.loader.failed[str(app_dir)] == A.app_fingerprint(str(app_dir))
+    assert 'restart to apply' in capsys.readouterr().err
+
+    sandbox.loader.sync()
+    assert capsys.readouterr().err == ''
+
+
+def test_eager_apps_are_not_reloaded(sandbox, start, capsys):
+    sandbox.write('legacy', backend='VERSION = 1\n', api_prefix=False)
+    start()
+    old = sandbox.loader.apps['legacy']
+    sandbox.write('legacy', backend='VERSION = 22\n', api_prefix=False)
+    sandbox.loader.sync()
+    assert sandbox.loader.apps['legacy'] is old
+    assert 'restart to reload' in capsys.readouterr().err
+
+
+def test_asgi_routing_follows_the_serving_version(sandbox, notes, start):
+    notes('v1')
+    start()
+    loader = sandbox.loader
+    assert loader.for_endpoint('app_api', '/api/apps/notes/version') is loader.apps['notes']
+    assert loader.for_endpoint('app_page', '/apps/notes') is None
+    assert loader.for_endpoint('app_api', '/api/apps/other/version') is None
+
+    old = loader.apps['notes']
+    notes('v22')
+    loader.sync()
+    assert loader.for_endpoint('app_api', '/api/apps/notes/version') is loader.apps['notes'] is not old
@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+from conftest import parse_sse
+
+
+@pytest.fixture
+def monitor(A):
+    return A.BackendMonitor(ttl=60, interval=3600)
+
+
+@pytest.fixture
+def backend(A, upstream):
+    return A.BackendInfo(1, 'Local', 'ollama', upstream.url, '', True, '')
+
+
+@pytest.fixture
+def dead(A):
+    return A.BackendInfo(2, 'Gone', 'ollama', 'http://127.0.0.1:9', '', False, '')
+
+
+def tags_requests(upstream):
+    return [r for r in upstream.requests if r[1] == '/api/tags']
+
+
+def test_model_lists_are_served_from_memory(monitor, backend, upstream):
+    assert monitor.models(backend) == (monitor.models(backend)[0], None)
+    assert monitor.models(backend)[0][0]['name'] == 'llama3.2'
+    assert len(tags_requests(upstream)) == 1
+    assert monitor.health(backend.id)['latency_ms'] is not None
+
+
+def test_invalidate_forces_a_refetch(monitor, backend, upstream):
+    monitor.models(backend)
+    upstream.models = [{'name': 'qwen3', 'size': 1e9, 'details': {}}]
+    monitor.invalidate(backend.id)
+    assert [m['name'] for m in monitor.models(backend)[0]] == ['qwen3']
+
+
+def test_breaker_opens_after_repeated_failures_and_stops_calling(A, monitor, dead):
+    for _ in range(A.BREAKER_THRESHOLD):
+        assert monitor.models(dead) == ([], 'Gone not running')
+    assert monitor.health(dead.id)['state'] == 'open'
+    assert monitor.allow(dead.id) is False
+
+    started = time.monotonic()
+    assert monitor.models(dead) == ([], 'Gone not running')
+    assert time.monotonic() - started < 0.05
+
+
+def open_breaker(A, monitor, backend, cooled=False):
+    monitor.track(backend)
+    for _ in range(A.BREAKER_THRESHOLD):
+        monitor.record_failure(backend.id, ConnectionRefusedError('refused'))
+    if cooled:
+        monitor.status[backend.id].opened_at -= A.BREAKER_COOLDOWN
+
+
+def test_half_open_breaker_admits_a_single_probe(A, monitor, backend):
+    open_breaker(A, monitor, backend, cooled=True)
+    assert monitor.health(backend.id)['state'] == 'half-open'
+    assert monitor.allow(backend.id) == 'probe'
+    assert monitor.allow(backend.id) is False
+
+    monitor.end_probe(backend.id)
+    assert monitor.allow(backend.id) == 'probe'
+    monitor.record_success(backend.id)
+    assert monitor.health(backend.id)['state'] == 'closed'
+    assert monitor.allow(backend.id) is True
+
+
+def test_failed_probe_reopens_the_breaker(A, monitor, backend):
+    open_breaker(A, monitor, backend, cooled=True)
+    assert monitor.allow(backend.id) == 'probe'
+    monitor.record_failure(backend.id, ConnectionRefusedError('still down'))
+    assert monitor.health(backend.id)['state'] == 'open'
+    assert monitor.allow(backend.id) is False
+
+
+def test_rank_puts_open_backends_last(A, monitor, backend, dead):
+    monitor.track(backend)
+    monitor.record_success(backend.id, latency_ms=50)
+    open_breaker(A, monitor, dead)
+    assert monitor.rank([dead, backend]) == [backend, dead]
+
+
+def test_model_list_endpoint_uses_the_cache(client, upstream):
+    for _ in range(3):
+        body = client.get('/api/models').get_json()
+    assert [m['name'] for m in body['models']] == ['llama3.2']
+    assert body['health']['state'] == 'closed'
+    assert len(tags_requests(upstream)) == 1
+
+
+def test_chat_skips_a_backend_whose_breaker_is_open(A, client, upstream):
+    backend_id = client.get('/api/backends').get_json()['backends'][0]['id']
+    with A.app.app_context():
+        open_breaker(A, A.backend_monitor, A.db.session.get(A.Backend, backend_id).info())
+    try:
+        events = parse_sse(client.post('/api/chat', json={'message': 'hi'}).get_data(as_text=True))
+        assert not [r for r in upstream.requests if r[1] == '/api/chat']
+        assert any('error' in e for e in events)
+    finally:
+        A.backend_monitor.record_success(backend_id)
+
+
+def test_stats_show_users_only_their_own_backends(client, make_client, upstream):
+    client.get('/api/models')
+    make_client().get('/api/models')
+    backend_id = client.get('/api/backends').get_json()['backends'][0]['id']
+    assert list(client.get('/api/stats').get_json()['backends']) == [str(backend_id)]
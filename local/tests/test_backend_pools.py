@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from conftest import parse_sse
+
+DEAD_URL = 'http://127.0.0.1:9'
+
+
+@pytest.fixture
+def monitor(A):
+    return A.BackendMonitor(ttl=60, interval=3600)
+
+
+def settled(monitor, *backend_ids, timeout=2):
+    """True once no stream is in flight on the backends (streams release them just after their last event)."""
+    deadline = time.monotonic() + timeout
+    while any(monitor.health(b)['inflight'] for b in backend_ids) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return not any(monitor.health(b)['inflight'] for b in backend_ids)
+
+
+def member(A, backend_id, url=DEAD_URL):
+    return A.BackendInfo(backend_id, f'Box {backend_id}', 'ollama', url, '', False, 'gpu')
+
+
+def test_rank_prefers_the_least_loaded_member(A, monitor):
+    busy, idle, unseen = member(A, 1), member(A, 2), member(A, 3)
+    monitor.acquire(busy)
+    monitor.acquire(busy)
+    monitor.acquire(idle)
+    assert monitor.rank((busy, idle, unseen)) == [unseen, idle, busy]
+
+    monitor.release(busy.id)
+    monitor.release(busy.id)
+    assert monitor.rank((busy, idle)) == [busy, idle]
+
+
+def test_rank_by_latency(A, monitor, monkeypatch):
+    monkeypatch.setattr(A, 'BALANCE_STRATEGY', 'latency')
+    slow, fast = member(A, 1), member(A, 2)
+    monitor.track(slow)
+    monitor.track(fast)
+    monitor.record_success(slow.id, 300)
+    monitor.record_success(fast.id, 20)
+    monitor.acquire(fast)
+    assert monitor.rank((slow, fast)) == [fast, slow]
+
+
+def test_members_with_an_open_breaker_go_last(A, monitor):
+    broken, busy = member(A, 1), member(A, 2)
+    monitor.track(broken)
+    for _ in range(A.BREAKER_THRESHOLD):
+        monitor.record_failure(broken.id, ConnectionRefusedError('refused'))
+    monitor.acquire(busy)
+    assert monitor.rank((broken, busy)) == [busy, broken]
+
+
+def test_counters_track_requests_in_flight_and_failovers(A, monitor):
+    backend = member(A, 1)
+    monitor.acquire(backend)
+    assert monitor.health(backend.id)['inflight'] == 1
+    monitor.release(backend.id, failed_over=True)
+    monitor.release(backend.id)
+    assert {k: monitor.health(backend.id)[k] for k in ('inflight', 'requests', 'failovers')} == {
+        'inflight': 0, 'requests': 1, 'failovers': 1}
+
+
+def make_pool(client, *urls):
+    """Put the client's default backend and one new backend per url into pool 'gpu'; the first url's becomes default."""
+    [local] = client.get('/api/backends').get_json()['backends']
+    client.put(f"/api/backends/{local['id']}", json={'pool': 'gpu'})
+    ids = [client.post('/api/backends', json={'kind': 'ollama', 'name': f'Box {i}', 'base_url': url,
+                                              'pool': 'gpu'}).get_json()['id'] for i, url in enumerate(urls)]
+    client.put(f'/api/backends/{ids[0]}', json={'is_default': True})
+    return ids, local['id']
+
+
+def test_pool_members_know_their_peers(A, client):
+    (dead,), local = make_pool(client, DEAD_URL)
+    client.post('/api/backends', json={'kind': 'ollama', 'name': 'Solo', 'base_url': DEAD_URL})
+    with A.app.app_context():
+        backends = {b.name: b for b in A.backend_directory.get(client.user_id).backends}
+    assert [p.id for p in backends['Box 0'].peers] == [local]
+    assert [p.id for p in backends['Ollama'].peers] == [dead]
+    assert backends['Solo'].peers == ()
+    assert {b['pool'] for b in client.get('/api/backends').get_json()['backends']} == {'gpu', ''}
+
+
+def test_chat_fails_over_before_the_first_token(A, client, upstream):
+    (dead,), local = make_pool(client, DEAD_URL)
+    events = parse_sse(client.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'}).get_data(as_text=True))
+    assert ''.join(e.get('token', '') for e in events) == 'Hello world!'
+
+    assert A.backend_monitor.health(dead)['failovers'] == 1
+    assert A.backend_monitor.health(local)['requests'] == 1
+    assert settled(A.backend_monitor, dead, local)
+
+
+def test_chat_reports_the_pool_when_every_member_is_down(A, client):
+    make_pool(client, DEAD_URL)
+    [local] = [b for b in client.get('/api/backends').get_json()['backends'] if b['name'] == 'Ollama']
+    client.put(f"/api/backends/{local['id']}", json={'base_url': 'http://127.0.0.1:10'})
+    events = parse_sse(client.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'}).get_data(as_text=True))
+    assert events[-1] == {'error': 'Cannot connect to any backend in pool "gpu"'}
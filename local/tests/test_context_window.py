@@ -0,0 +1,69 @@
+import pytest
+
+
+@pytest.fixture
+def context(A, conversation):
+    """context(system_prompt, model) -> build_context() for the fixture conversation."""
+    def build(system_prompt, model, summary=''):
+        with A.app.app_context():
+            convo = A.db.session.get(A.Conversation, conversation.id)
+            convo.summary = summary
+            return A.build_context(convo, system_prompt, model)
+    return build
+
+
+def test_context_limit_uses_the_longest_prefix(A):
+    assert A.context_limit('gpt-4o-mini') == 128000
+    assert A.context_limit('gpt-4') == 8192
+    assert A.context_limit('library/llama3.2:3b') == 8192
+    assert A.context_limit('unknown-model') == A.CONTEXT_DEFAULT_TOKENS
+
+
+def test_short_history_is_sent_whole(conversation, context):
+    conversation.add('user', 'hi')
+    conversation.add('assistant', '<think>pondering</think>hello')
+
+    messages, oldest_id = context('be nice', 'llama3.2')
+    assert messages == [
+        {'role': 'system', 'content': 'be nice'},
+        {'role': 'user', 'content': 'hi'},
+        {'role': 'assistant', 'content': 'hello'},
+    ]
+    assert oldest_id is None
+
+
+def test_long_history_keeps_the_newest_messages_within_budget(A, conversation, context, monkeypatch):
+    monkeypatch.setitem(A.CONTEXT_LIMITS, 'tiny', A.CONTEXT_RESPONSE_TOKENS + 300)
+    ids = [conversation.add('user', f'{i:02d}' + 'x' * 198) for i in range(20)]
+
+    messages, oldest_id = context('system prompt', 'tiny')
+    assert messages[0] == {'role': 'system', 'content': 'system prompt'}
+    kept = [m['content'][:2] for m in messages[1:]]
+    assert 0 < len(kept) < 20
+    assert kept == [f'{i:02d}' for i in range(20 - len(kept), 20)]
+    assert oldest_id == ids[20 - len(kept)]
+    assert sum(A.approx_tokens(m['content']) for m in messages) <= 300
+
+
+def test_summary_follows_the_system_prompt(conversation, context):
+    conversation.add('user', 'hi')
+
+    messages, _ = context('be nice', 'llama3.2', summary='they like tea')
+    assert [m['role'] for m in messages] == ['system', 'system', 'user']
+    assert 'they like tea' in messages[1]['content']
+
+
+def test_reads_at_most_the_message_cap(A, conversation, context, monkeypatch):
+    monkeypatch.setattr(A, 'CONTEXT_MAX_MESSAGES', 3)
+    for i in range(6):
+        conversation.add('user', str(i))
+
+    messages, oldest_id = context('sys', 'llama3.2')
+    assert [m['content'] for m in messages[1:]] == ['3', '4', '5']
+    assert oldest_id is not None
+
+
+def test_ollama_requests_carry_the_context_size(client, upstream):
+    client.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'}).get_data()
+    body = next(body for method, path, body in upstream.requests if path == '/api/chat')
+    assert body['options']['num_ctx'] == 8192
@@ -0,0 +1,94 @@
+import re
+
+import pytest
+from sqlalchemy import event
+
+from conftest import parse_sse
+
+USER_OR_BACKEND = re.compile(r'^\s*SELECT\b.*\bFROM "?(user|backend)"?(\s|$)', re.S | re.I)
+
+
+@pytest.fixture
+def lookups(A):
+    """SELECTs against the user and backend tables, collected while the test runs."""
+    with A.app.app_context():
+        engine = A.db.engine
+    found = []
+
+    def record(conn, cursor, statement, params, context, executemany):
+        if USER_OR_BACKEND.match(statement):
+            found.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield found
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def chat(client, **data):
+    return parse_sse(client.post('/api/chat', json={'message': 'hi', **data}).get_data(as_text=True))
+
+
+def chat_model(upstream):
+    return [body for _, path, body in upstream.requests if path == '/api/chat'][-1]['model']
+
+
+def test_warm_chat_requests_do_not_query_users_or_backends(client, upstream, lookups):
+    chat(client)
+    lookups.clear()
+    chat(client)
+    client.get('/api/models')
+    client.get('/api/backends')
+    assert lookups == []
+
+
+def test_settings_changes_apply_at_once(client, upstream):
+    chat(client)
+    assert chat_model(upstream) == 'llama3.2'
+    client.put('/api/settings', json={'default_model': 'qwen3'})
+    chat(client)
+    assert chat_model(upstream) == 'qwen3'
+
+
+def test_backend_changes_apply_at_once(client, upstream):
+    first = client.get('/api/backends').get_json()['backends'][0]
+    new_id = client.post('/api/backends', json={'kind': 'ollama', 'name': 'Second',
+                                               'base_url': upstream.url}).get_json()['id']
+    names = [b['name'] for b in client.get('/api/backends').get_json()['backends']]
+    assert names == [first['name'], 'Second']
+
+    client.put(f'/api/backends/{new_id}', json={'is_default': True, 'name': 'Renamed'})
+    backends = client.get('/api/backends').get_json()['backends']
+    assert [(b['name'], b['is_default']) for b in backends] == [(first['name'], False), ('Renamed', True)]
+
+    client.delete(f'/api/backends/{new_id}')
+    backends = client.get('/api/backends').get_json()['backends']
+    assert [(b['id'], b['is_default']) for b in backends] == [(first['id'], True)]
+
+
+def test_backend_cache_is_per_user(make_client, client, upstream):
+    client.post('/api/backends', json={'kind': 'ollama', 'name': 'Mine', 'base_url': upstream.url})
+    other = make_client()
+    assert 'Mine' not in [b['name'] for b in other.get('/api/backends').get_json()['backends']]
+
+
+def test_user_snapshots_expire(A, client, lookups):
+    directory = A.UserDirectory(ttl=60)
+    with A.app.app_context():
+        first = directory.get(client.user_id)
+        assert directory.get(client.user_id) is first
+        assert len(lookups) == 1
+
+        directory.ttl = 0
+        directory.invalidate(client.user_id)
+        directory.get(client.user_id)
+        directory.get(client.user_id)
+        assert len(lookups) == 3
+        assert directory.get(10**9) is None
+
+
+def test_user_snapshots_work_as_the_login_user(A, client):
+    with A.app.app_context():
+        user = A.load_user(str(client.user_id))
+    assert user.username == client.username
+    assert user.is_authenticated
+    assert user.get_id() == str(client.user_id)
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+import requests
+
+
+@pytest.fixture
+def pools(A):
+    pools = A.HttpPools(pool_size=4, retries=0, connect_timeout=1.0)
+    yield pools
+    for key in list(pools._sessions):
+        pools.drop(key)
+
+
+def test_requests_on_one_key_reuse_a_connection(pools, upstream):
+    for _ in range(3):
+        assert pools.get('backend:1', f'{upstream.url}/api/tags').ok
+    assert len(upstream.peers) == 1
+    assert pools.stats()['pools']['backend:1']['requests'] == 3
+
+
+def test_keepalive_off_opens_a_connection_per_request(A, upstream):
+    pools = A.HttpPools(pool_size=4, retries=0, connect_timeout=1.0, keepalive=False)
+    for _ in range(2):
+        pools.get('backend:1', f'{upstream.url}/api/tags')
+    assert len(upstream.peers) == 2
+
+
+def test_each_key_has_its_own_session(pools):
+    assert pools.session('backend:1') is pools.session('backend:1')
+    assert pools.session('backend:1') is not pools.session('sd')
+
+
+def test_connection_errors_are_counted(pools):
+    with pytest.raises(requests.ConnectionError):
+        pools.get('search', 'http://127.0.0.1:9/', timeout=1)
+    assert pools.stats()['pools']['search']['errors'] == 1
+
+
+def test_drop_forgets_the_pool(pools, upstream):
+    first = pools.session('backend:1')
+    pools.drop('backend:1')
+    assert 'backend:1' not in pools.stats()['pools']
+    assert pools.session('backend:1') is not first
+
+
+def test_async_client_is_shared_per_loop(pools, upstream):
+    async def fetch_twice():
+        for _ in range(2):
+            async with pools.stream('backend:1', 'GET', f'{upstream.url}/api/tags') as resp:
+                await resp.aread()
+        await pools.async_client('backend:1').aclose()
+
+    asyncio.run(fetch_twice())
+    assert len(upstream.peers) == 1
+    assert pools.stats()['pools']['backend:1']['requests'] == 2
+
+
+def test_changing_a_backend_url_drops_its_pool(A, client, upstream):
+    client.get('/api/models')
+    backend_id = client.get('/api/backends').get_json()['backends'][0]['id']
+    assert f'backend:{backend_id}' in A.http_pools.stats()['pools']
+
+    client.put(f'/api/backends/{backend_id}', json={'base_url': upstream.url + '/'})
+    assert f'backend:{backend_id}' not in A.http_pools.stats()['pools']
+
+
+def test_pool_stats_are_only_shown_to_stats_admins(A, client, monkeypatch):
+    client.get('/api/models')
+    assert 'http' not in client.get('/api/stats').get_json()
+
+    monkeypatch.setattr(A, 'STATS_ADMINS', frozenset({client.username}))
+    backend_id = client.get('/api/backends').get_json()['backends'][0]['id']
+    assert f'backend:{backend_id}' in client.get('/api/stats').get_json()['http']['pools']
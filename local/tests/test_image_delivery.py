@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+
+def stored(A, saved):
+    """(bytes, seed) for each saved (filename, seed)."""
+    return [(open(os.path.join(A.IMAGES_DIR, name), 'rb').read(), seed) for name, seed in saved]
+
+
+def test_multipart_parts_are_written_to_disk(A, sd_upstream):
+    saved, info = A.sd_txt2img({'prompt': 'cat'})
+    assert stored(A, saved) == sd_upstream.images
+    assert all(name.endswith('.png') for name, _ in saved)
+    assert info['all_seeds'] == [11, 12]
+    assert sorted(os.listdir(A.IMAGES_DIR)) == sorted(name for name, _ in saved)
+
+    _, headers, _ = sd_upstream.requests[-1]
+    assert headers['Accept'] == A.SD_ACCEPT
+
+
+def test_raw_image_responses_keep_their_format(A, sd_upstream):
+    sd_upstream.mode, sd_upstream.content_type = 'raw', 'image/webp'
+    [(name, seed)], info = A.sd_txt2img({'prompt': 'cat'})
+    assert name.endswith('.webp')
+    assert seed == 11
+    assert info['seed'] == 11
+
+
+def test_base64_json_servers_still_work(A, sd_upstream):
+    sd_upstream.mode = 'json'
+    saved, _ = A.sd_txt2img({'prompt': 'cat'})
+    assert stored(A, saved) == sd_upstream.images
+
+
+def test_a_truncated_body_leaves_no_partial_file(A, sd_upstream):
+    sd_upstream.truncate = True
+    with pytest.raises(IOError):
+        A.sd_txt2img({'prompt': 'cat'})
+    assert not [name for name in os.listdir(A.IMAGES_DIR) if name.endswith('.part')]
+
+
+def test_configured_encoder_is_sent(A, sd_upstream, monkeypatch):
+    monkeypatch.setattr(A, 'SD_IMAGE_FORMAT', 'webp')
+    monkeypatch.setattr(A, 'SD_IMAGE_QUALITY', 80)
+    A.sd_txt2img({'prompt': 'cat'})
+    _, _, body = sd_upstream.requests[-1]
+    assert body['encoder'] == {'format': 'webp', 'quality': 80, 'compress_level': A.SD_PNG_COMPRESS_LEVEL}
+
+
+def test_save_image_stream_writes_chunks_atomically(A, sd_upstream):
+    name = A.save_image_stream([b'ab', b'cd'], 'image/jpeg')
+    assert name.endswith('.jpg')
+    assert open(os.path.join(A.IMAGES_DIR, name), 'rb').read() == b'abcd'
+
+    def failing():
+        yield b'ab'
+        raise ConnectionError('reset')
+
+    with pytest.raises(ConnectionError):
+        A.save_image_stream(failing(), 'image/png')
+    assert os.listdir(A.IMAGES_DIR) == [name]
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from conftest import parse_sse
+
+
+def wait_for(job_status, client, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        snap = client.get(f'/api/sd/jobs/{job_id}').get_json()
+        if job_status(snap):
+            return snap
+        time.sleep(0.02)
+    raise AssertionError(f'job {job_id} stuck at {snap}')
+
+
+def test_jobs_run_in_the_background_and_store_their_images(A, client, sd_upstream):
+    resp = client.post('/api/sd/jobs', json={'prompt': 'a red fox', 'seed': 11})
+    assert resp.status_code == 202
+    job_id = resp.get_json()['job_id']
+
+    snap = wait_for(lambda s: s['status'] == 'done', client, job_id)
+    assert [img['seed'] for img in snap['images']] == [11, 12]
+    listed = client.get('/api/sd/images').get_json()['images']
+    assert {img['url'] for img in listed} == {img['url'] for img in snap['images']}
+
+    [body] = [body for path, _, body in sd_upstream.requests if path == '/sdapi/v1/txt2img']
+    assert body['force_task_id'] == job_id
+
+
+def test_jobs_are_private_to_their_user(make_client, client, sd_upstream):
+    job_id = client.post('/api/sd/jobs', json={'prompt': 'fox'}).get_json()['job_id']
+    assert make_client().get(f'/api/sd/jobs/{job_id}').status_code == 404
+
+
+def test_progress_is_mirrored_from_the_sd_server(client, sd_upstream):
+    sd_upstream.gate = threading.Event()
+    sd_upstream.progress = {'progress': 0.5, 'eta_relative': 3,
+                            'state': {'status': 'running', 'sampling_step': 10, 'sampling_steps': 20},
+                            'current_image': 'AAAA'}
+    job_id = client.post('/api/sd/jobs', json={'prompt': 'fox'}).get_json()['job_id']
+
+    snap = wait_for(lambda s: s['step'] == 10, client, job_id)
+    assert snap['status'] == 'running'
+    assert snap['progress'] == 0.5
+    assert snap['preview'] == 'data:image/jpeg;base64,AAAA'
+    sd_upstream.gate.set()
+    assert wait_for(lambda s: s['status'] == 'done', client, job_id)['preview'] is None
+
+
+def test_events_stream_until_the_images_exist(client, sd_upstream):
+    job_id = client.post('/api/sd/jobs', json={'prompt': 'fox'}).get_json()['job_id']
+    events = parse_sse(client.get(f'/api/sd/jobs/{job_id}/events').get_data(as_text=True))
+    assert events[-1]['status'] == 'done'
+    assert len(events[-1]['images']) == 2
+
+
+def test_generate_answers_with_the_images_when_they_are_quick(client, sd_upstream):
+    resp = client.post('/api/sd/generate', json={'prompt': 'fox'})
+    assert resp.status_code == 200
+    assert len(resp.get_json()['images']) == 2
+
+
+def test_generate_hands_back_the_job_when_it_is_slow(A, client, sd_upstream, monkeypatch):
+    monkeypatch.setattr(A, 'SD_GENERATE_WAIT', 0.1)
+    sd_upstream.gate = threading.Event()
+    resp = client.post('/api/sd/generate', json={'prompt': 'fox'})
+    assert resp.status_code == 202
+    body = resp.get_json()
+    assert body['poll'] == f"/api/sd/jobs/{body['job_id']}"
+    sd_upstream.gate.set()
+    wait_for(lambda s: s['status'] == 'done', client, body['job_id'])
+
+
+def test_unreachable_sd_server_is_a_bad_gateway(A, client, sd_upstream, monkeypatch):
+    monkeypatch.setattr(A, 'SD_BASE', 'http://127.0.0.1:9')
+    resp = client.post('/api/sd/generate', json={'prompt': 'fox'})
+    assert resp.status_code == 502
+    assert resp.get_json()['error'] == 'Cannot connect to Stable Diffusion server.'
+
+
+def test_invalid_parameters_are_rejected_before_queueing(A, client, sd_upstream):
+    assert client.post('/api/sd/jobs', json={'prompt': ''}).status_code == 400
+    assert client.post('/api/sd/jobs', json={'prompt': 'fox', 'steps': 'many'}).status_code == 400
+    assert A.image_jobs.jobs == {}
+
+
+def test_chat_image_tags_stream_the_job_result(client, upstream, sd_upstream):
+    upstream.tokens = ['Here you go ', '[IMG: a fox]']
+    events = parse_sse(client.post('/api/chat', json={'message': 'draw a fox'}).get_data(as_text=True))
+    assert {'status': 'generating_image'} in events
+    [images] = [e['images'] for e in events if 'images' in e]
+    assert [img['seed'] for img in images] == [11, 12]
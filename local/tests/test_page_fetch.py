@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from conftest import parse_sse
+
+
+def page_html(text):
+    return f'<html><body><main><p>{text}</p></main></body></html>'
+
+
+def fetch_all(A, results, **kwargs):
+    async def run():
+        return [(r['url'], text) async for r, text in A.fetch_pages(results, **kwargs)]
+    return asyncio.run(run())
+
+
+def test_pages_are_fetched_concurrently(A, web):
+    results = [{'url': web.page(f'/p{i}', page_html(f'page {i}'), delay=0.3)} for i in range(3)]
+    started = time.monotonic()
+    pages = fetch_all(A, results, want=3, deadline=5)
+    assert time.monotonic() - started < 0.8
+    assert sorted(text for _, text in pages) == ['page 0', 'page 1', 'page 2']
+
+
+def test_pages_arrive_in_completion_order(A, web):
+    slow = web.page('/slow', page_html('slow'), delay=0.3)
+    fast = web.page('/fast', page_html('fast'))
+    assert [url for url, _ in fetch_all(A, [{'url': slow}, {'url': fast}], want=2)] == [fast, slow]
+
+
+def test_stragglers_are_cancelled_once_enough_pages_landed(A, web):
+    results = [{'url': web.page('/slow', page_html('slow'), delay=3)},
+               {'url': web.page('/fast', page_html('fast'))}]
+    started = time.monotonic()
+    assert [text for _, text in fetch_all(A, results, want=1)] == ['fast']
+    assert time.monotonic() - started < 1
+
+
+def test_the_deadline_bounds_the_whole_stage(A, web):
+    results = [{'url': web.page(f'/slow{i}', page_html('slow'), delay=3)} for i in range(2)]
+    started = time.monotonic()
+    assert fetch_all(A, results, want=2, deadline=0.2) == []
+    assert time.monotonic() - started < 1
+
+
+def test_empty_and_failed_pages_do_not_count(A, web):
+    results = [{'url': web.page('/empty', '<html></html>')},
+               {'url': web.page('/gone', 'missing', status=404)},
+               {'url': web.page('/binary', b'\x00' * 100, content_type='application/octet-stream')},
+               {'url': web.page('/ok', page_html('useful'))},
+               {'title': 'no url'}]
+    assert [text for _, text in fetch_all(A, results, want=2)] == ['useful']
+
+
+def test_malformed_urls_are_skipped(A, web):
+    results = [{'url': 'http://exämple..com/'}, {'url': 'http://\x00bad/'}, {'url': 'javascript:void(0)'},
+               {'url': web.page('/ok', page_html('useful'))}]
+    assert [text for _, text in fetch_all(A, results, want=2)] == ['useful']
+
+
+def test_reads_stop_at_the_byte_cap(A, monkeypatch):
+    monkeypatch.setattr(A, 'PAGE_MAX_BYTES', 4096)
+    reader = A.PageReader('text/plain; charset=utf-8', max_chars=10**6)
+    for _ in range(3):
+        reader.feed(b'x' * 2048)
+    assert reader.done
+    assert reader.bytes_read == 6144
+
+
+def test_search_chat_streams_pages_as_they_are_read(A, client, upstream, web, monkeypatch):
+    pages = {'/a': 'alpha facts', '/b': 'beta facts'}
+    results = [{'title': path, 'snippet': '', 'url': web.page(path, page_html(text))} for path, text in pages.items()]
+    monkeypatch.setattr(A, 'web_search', lambda query, num_results=5: results)
+
+    resp = client.post('/api/chat', json={'message': 'facts?', 'search': True})
+    events = parse_sse(resp.get_data(as_text=True))
+    assert {'status': 'fetching', 'pages': 2} in events
+    assert sorted(e['page_read']['url'] for e in events if 'page_read' in e) == sorted(r['url'] for r in results)
+
+    _, _, body = next(r for r in upstream.requests if r[1] == '/api/chat')
+    prompt = body['messages'][-1]['content']
+    assert prompt.index('alpha facts') < prompt.index('beta facts')
@@ -0,0 +1,73 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def conversations(A, client):
+    """Seven conversations: three share one timestamp, so the id breaks the tie. Returns ids newest first."""
+    stamps = [T0 + timedelta(minutes=m) for m in (0, 1, 2, 2, 2, 3, 4)]
+    with A.app.app_context():
+        rows = [A.Conversation(user_id=client.user_id, title=f'c{i}', updated_at=ts) for i, ts in enumerate(stamps)]
+        A.db.session.add_all(rows)
+        A.db.session.commit()
+        return [r.id for r in sorted(rows, key=lambda r: (r.updated_at, r.id), reverse=True)]
+
+
+def walk(client, url, key, limit):
+    """Follow `next` cursors; returns the ids of every page."""
+    pages, cursor = [], ''
+    while True:
+        body = client.get(url, query_string={'limit': limit, 'before': cursor}).get_json()
+        pages.append([item['id'] for item in body[key]])
+        cursor = body['next']
+        if not cursor:
+            return pages
+
+
+def test_conversation_pages_cover_every_row_once(client, conversations):
+    pages = walk(client, '/api/conversations', 'conversations', limit=3)
+    assert pages == [conversations[0:3], conversations[3:6], conversations[6:]]
+
+
+def test_message_pages_are_newest_first_and_each_page_oldest_first(A, client, conversation):
+    ids = [conversation.add('user', f'm{i}') for i in range(5)]
+    with A.app.app_context():
+        A.Message.query.filter(A.Message.id.in_(ids)).update({'created_at': T0}, synchronize_session=False)
+        A.db.session.commit()
+
+    pages = walk(client, f'/api/conversations/{conversation.id}/messages', 'messages', limit=2)
+    assert pages == [ids[3:5], ids[1:3], ids[0:1]]
+
+
+def test_page_size_is_clamped(A, client, conversations):
+    assert len(client.get('/api/conversations?limit=0').get_json()['conversations']) == 1
+    with A.app.test_request_context(f'/?limit={A.MAX_PAGE + 50}'):
+        assert A.page_limit(A.CONVERSATION_PAGE) == A.MAX_PAGE
+
+
+def test_a_malformed_cursor_starts_from_the_newest(client, conversations):
+    body = client.get('/api/conversations?limit=2&before=garbage').get_json()
+    assert [c['id'] for c in body['conversations']] == conversations[:2]
+
+
+def test_messages_of_other_users_are_not_listed(make_client, conversation):
+    assert make_client().get(f'/api/conversations/{conversation.id}/messages').status_code == 404
+
+
+def test_chat_page_renders_only_the_first_page(A, client, conversations, monkeypatch):
+    monkeypatch.setattr(A.conversation_page, '__defaults__', (None, 2))  # the page size /chat renders
+    html = client.get('/chat').get_data(as_text=True)
+    cursor = re.search(r'id="convo-list" data-next="([^"]*)"', html).group(1)
+    assert cursor
+    body = client.get('/api/conversations', query_string={'before': cursor, 'limit': 10}).get_json()
+    assert [c['id'] for c in body['conversations']] == conversations[2:]
+
+
+def test_cursor_round_trip(A):
+    assert A.decode_cursor(A.encode_cursor(T0, 42)) == (T0, 42)
+    assert A.decode_cursor('') is None
+    assert A.decode_cursor('2024-13-45_x') is None
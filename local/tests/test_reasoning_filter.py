@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from conftest import parse_sse
+
+THINK = (('<think>', '</think>'),)
+GRANITE = (('<think>', '</think>'), ('<reasoning>', '</reasoning>'))
+
+
+def split(A, text, size, tags=THINK):
+    """Feed text `size` characters at a time; returns the joined (answer, reasoning)."""
+    rf = A.ReasoningFilter(tags)
+    answer, reasoning = [], []
+    for i in range(0, len(text), size):
+        a, r = rf.feed(text[i:i + size])
+        answer.append(a)
+        reasoning.append(r)
+    a, r = rf.flush()
+    return ''.join(answer) + a, ''.join(reasoning) + r
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('<think>plan it</think>The answer', ('The answer', 'plan it')),
+    ('before<think>a</think>mid<think>b</think>after', ('beforemidafter', 'ab')),
+    ('x < y and <thin> is not a tag', ('x < y and <thin> is not a tag', '')),
+    ('<<think>>inside</think>>', ('<>', '>inside')),
+    ('answer cut at <thi', ('answer cut at <thi', '')),
+    ('<think>never closed </thi', ('', 'never closed </thi')),
+])
+def test_output_does_not_depend_on_how_tokens_are_split(A, text, expected):
+    assert {split(A, text, size) for size in range(1, len(text) + 1)} == {expected}
+
+
+def test_each_block_ends_at_its_own_close_tag(A):
+    text = '<reasoning>uses </think> literally</reasoning>done<think>b</think>'
+    assert split(A, text, 1, GRANITE) == ('done', 'uses </think> literallyb')
+    assert split(A, '[THINK]hm[/THINK]ok', 2, A.reasoning_tags('magistral-small')) == ('ok', 'hm')
+
+
+@pytest.mark.parametrize('size', [1, 2, 5])
+def test_a_tag_inside_a_longer_tags_prefix_is_found(A, size):
+    tags = (('x<think>!', '</x>'),) + THINK
+    assert split(A, 'ax<think>b</think>c', size, tags) == ('axc', 'b')
+    assert split(A, 'x<thin <think>b</think>c', size, tags) == ('x<thin c', 'b')
+
+
+def test_tags_are_chosen_by_model_prefix(A):
+    assert A.reasoning_tags('qwen3:8b') == THINK
+    assert A.reasoning_tags('granite3.3:2b') == GRANITE
+    assert A.reasoning_tags('llama3.2') == THINK
+
+
+def test_only_a_possible_partial_tag_is_held_back(A):
+    rf = A.ReasoningFilter(THINK)
+    assert rf.feed('plain text <th') == ('plain text ', '')
+    assert rf.feed('ink>deep thought </') == ('', 'deep thought ')
+    assert rf.feed('think>') == ('', '')
+    assert rf.held == ''
+
+
+def run_filter(A, items, keep):
+    async def source():
+        for item in items:
+            yield item
+
+    async def collect():
+        return [item async for item in A.filter_reasoning(source(), THINK, keep)]
+    return asyncio.run(collect())
+
+
+def test_filter_drops_or_tags_reasoning(A):
+    items = [(A.Reasoning('native '), False), ('<think>inline', False), ('</think>Hi', False), ('', True)]
+    assert run_filter(A, items, keep=False) == [('Hi', False), ('', True)]
+    kept = run_filter(A, items, keep=True)
+    assert kept == [('native ', False), ('inline', False), ('Hi', False), ('', True)]
+    assert [type(token) for token, _ in kept] == [A.Reasoning, A.Reasoning, str, str]
+
+
+def test_filter_flushes_held_text_when_the_stream_ends_without_done(A):
+    assert run_filter(A, [('Use a <', False), ('th', False)], keep=False) == [('Use a ', False), ('<th', False)]
+    assert run_filter(A, [('<think>cut </th', False)], keep=True) == [('cut ', False), ('</th', False)]
+
+
+def test_openai_compatible_streams_are_filtered(A, upstream):
+    upstream.tokens = ['<thi', 'nk>hidden</th', 'ink>Vis', 'ible']
+    backend = A.BackendInfo(1, 'Compat', 'openai', upstream.url, '', True, '')
+    tokens = list(A.engine.iterate(A.astream_backend(backend, 'qwen3', [{'role': 'user', 'content': 'hi'}])))
+    assert ''.join(token for token, _ in tokens) == 'Visible'
+
+
+def test_chat_forwards_reasoning_only_when_asked(A, client, upstream):
+    upstream.thinking = ['native ']
+    upstream.tokens = ['<think>inline</think>', 'Answer']
+
+    plain = parse_sse(client.post('/api/chat', json={'message': 'hi', 'model': 'qwen3'}).get_data(as_text=True))
+    assert not any('reasoning' in e for e in plain)
+    assert ''.join(e.get('token', '') for e in plain) == 'Answer'
+
+    events = parse_sse(client.post('/api/chat', json={
+        'message': 'hi', 'model': 'qwen3', 'reasoning': True}).get_data(as_text=True))
+    assert ''.join(e.get('reasoning', '') for e in events) == 'native inline'
+    assert ''.join(e.get('token', '') for e in events) == 'Answer'
+
+    convo_id = next(e['conversation_id'] for e in events if 'conversation_id' in e)
+    with A.app.app_context():
+        saved = A.Message.query.filter_by(conversation_id=convo_id, role='assistant').one().content
+    assert saved == '<think>native inline</think>\n\nAnswer'
+    assert A.THINK_BLOCK.sub('', saved) == 'Answer'
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def batches(sd, monkeypatch):
+    """Replaces generate() with one that records each batch's task ids and returns seed-coloured images."""
+    calls = []
+
+    def generate(batch):
+        calls.append([job.task_id for job in batch])
+        time.sleep(0.2)
+        return [Image.new('RGB', (8, 8), (seed % 256, 0, 0)) for job in batch for seed in job.seeds]
+
+    monkeypatch.setattr(sd, 'generate', generate)
+    sd.scheduler.start()
+    return calls
+
+
+@pytest.mark.parametrize('seed, expected', [('42', 42), (7, 7), (2**32 + 5, 5)])
+def test_seeds_are_integers_modulo_2_32(sd, seed, expected):
+    assert sd.Job({'seed': seed}).seed == expected
+
+
+@pytest.mark.parametrize('seed', [None, '', -1])
+def test_missing_or_negative_seeds_are_random(sd, seed):
+    assert 0 <= sd.Job({'seed': seed}).seed < 2**32
+
+
+def test_invalid_seed_is_a_bad_request(sd):
+    resp = sd.app.test_client().post('/sdapi/v1/txt2img', json={'prompt': 'x', 'seed': 'abc'})
+    assert resp.status_code == 400
+
+
+def test_batch_seeds_count_up_from_the_seed(sd):
+    assert sd.Job({'seed': 2**32 - 1, 'batch_size': 3}).seeds == [2**32 - 1, 0, 1]
+
+
+def test_a_lone_job_does_not_wait_for_the_window(sd, monkeypatch):
+    monkeypatch.setattr(sd, 'BATCH_WINDOW', 5)
+    sd.scheduler.queue.append(sd.Job({}))
+    started = time.monotonic()
+    assert len(sd.scheduler.take_batch()) == 1
+    assert time.monotonic() - started < 1
+
+
+def test_compatible_jobs_share_a_batch_and_others_keep_their_place(sd, monkeypatch):
+    monkeypatch.setattr(sd, 'BATCH_WINDOW', 0)
+    first, other, second = sd.Job({}), sd.Job({'steps': 30}), sd.Job({})
+    sd.scheduler.queue.extend([first, other, second])
+
+    assert sd.scheduler.take_batch() == [first, second]
+    assert list(sd.scheduler.queue) == [other]
+
+
+def test_batches_stop_at_max_batch_images(sd, monkeypatch):
+    monkeypatch.setattr(sd, 'BATCH_WINDOW', 0)
+    jobs = [sd.Job({'batch_size': 3}), sd.Job({'batch_size': 2}), sd.Job({'batch_size': 1})]
+    sd.scheduler.queue.extend(jobs)
+
+    assert sd.scheduler.take_batch() == [jobs[0], jobs[2]]
+    assert list(sd.scheduler.queue) == [jobs[1]]
+
+
+def test_concurrent_requests_are_batched_and_fanned_out(sd, batches, monkeypatch):
+    monkeypatch.setattr(sd, 'BATCH_WINDOW', 0.5)
+    client = sd.app.test_client()
+    results = {}
+
+    def post(seed):
+        resp = client.post('/sdapi/v1/txt2img', json={'prompt': 'cat', 'seed': seed, 'force_task_id': str(seed)})
+        results[seed] = resp.get_json()
+
+    threads = [threading.Thread(target=post, args=(seed,)) for seed in (10, 20, 30)]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)
+    for t in threads:
+        t.join()
+
+    assert len(batches) < 3
+    assert sorted(sum(batches, [])) == ['10', '20', '30']
+    for seed, body in results.items():
+        assert len(body['images']) == 1
+        assert f'"seed": {seed}' in body['info']
+
+    stats = client.get('/sdapi/v1/queue').get_json()
+    assert stats['images'] == 3
+    assert stats['batches'] == len(batches)
+    assert stats['queue_depth'] == 0
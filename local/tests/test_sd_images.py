@@ -0,0 +1,73 @@
+import base64
+import io
+import json
+
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def sd_client(sd, monkeypatch):
+    def generate(batch):
+        return [Image.new('RGB', (8, 8), (seed % 256, 0, 0)) for job in batch for seed in job.seeds]
+
+    monkeypatch.setattr(sd, 'generate', generate)
+    sd.scheduler.start()
+    return sd.app.test_client()
+
+
+def parts(resp):
+    """(headers, body) per part of a multipart/mixed response."""
+    boundary = resp.mimetype_params['boundary'].encode()
+    out = []
+    for chunk in resp.get_data().split(b'--' + boundary)[1:-1]:
+        head, _, body = chunk.strip(b'\r\n').partition(b'\r\n\r\n')
+        headers = dict(line.split(': ', 1) for line in head.decode().split('\r\n'))
+        assert int(headers['Content-Length']) == len(body)
+        out.append((headers, body))
+    return out
+
+
+def test_json_by_default(sd_client):
+    body = sd_client.post('/sdapi/v1/txt2img', json={'seed': 5}).get_json()
+    image = Image.open(io.BytesIO(base64.b64decode(body['images'][0])))
+    assert image.format == 'PNG'
+    assert json.loads(body['info'])['seed'] == 5
+
+
+def test_multipart_has_info_then_one_binary_part_per_image(sd_client):
+    resp = sd_client.post('/sdapi/v1/txt2img', json={'seed': 5, 'batch_size': 2},
+                       headers={'Accept': 'multipart/mixed'})
+    (info_headers, info), *images = parts(resp)
+    assert info_headers['Content-Type'] == 'application/json'
+    assert json.loads(info)['all_seeds'] == [5, 6]
+    assert [h['X-Seed'] for h, _ in images] == ['5', '6']
+    for headers, data in images:
+        assert headers['Content-Type'] == 'image/png'
+        assert Image.open(io.BytesIO(data)).format == 'PNG'
+
+
+def test_raw_image_uses_the_accepted_format(sd_client):
+    resp = sd_client.post('/sdapi/v1/txt2img', json={'seed': 5}, headers={'Accept': 'image/webp'})
+    assert resp.mimetype == 'image/webp'
+    assert resp.headers['X-Seed'] == '5'
+    assert json.loads(resp.headers['X-SD-Info'])['seed'] == 5
+    assert Image.open(io.BytesIO(resp.get_data())).format == 'WEBP'
+
+
+def test_raw_image_needs_a_single_image(sd_client):
+    resp = sd_client.post('/sdapi/v1/txt2img', json={'batch_size': 2}, headers={'Accept': 'image/png'})
+    assert resp.status_code == 406
+
+
+def test_request_encoder_overrides_the_default(sd_client):
+    resp = sd_client.post('/sdapi/v1/txt2img', json={'encoder': {'format': 'jpg', 'quality': 50}},
+                       headers={'Accept': 'multipart/mixed'})
+    _, (headers, data) = parts(resp)
+    assert headers['Content-Type'] == 'image/jpeg'
+    assert Image.open(io.BytesIO(data)).format == 'JPEG'
+
+
+def test_unknown_encoder_format_is_a_bad_request(sd_client):
+    resp = sd_client.post('/sdapi/v1/txt2img', json={'encoder': {'format': 'bmp'}})
+    assert resp.status_code == 400
@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def loads(sd, monkeypatch):
+    """Replaces checkpoint loading: records loaded paths; `loads.gate` (if set) holds loads until set."""
+    class Loads(list):
+        gate = None
+        fail = None
+        size = 100
+
+    loads = Loads()
+
+    def load_pipe(path):
+        loads.append(os.path.basename(path))
+        if loads.gate:
+            loads.gate.wait(5)
+        if loads.fail:
+            raise loads.fail
+        return path
+
+    monkeypatch.setattr(sd, 'load_pipe', load_pipe)
+    monkeypatch.setattr(sd, 'build_samplers', lambda pipe: {'Euler a': pipe})
+    monkeypatch.setattr(sd, 'pipeline_bytes', lambda pipe: loads.size)
+    return loads
+
+
+def add_checkpoint(sd, name, size=0):
+    with open(os.path.join(sd.models.models_dir, name), 'wb') as f:
+        f.write(b'\0' * size)
+    sd.models.scan()
+
+
+def test_scan_and_resolve(sd):
+    assert sd.models.default == 'alpha.safetensors'
+    assert sd.models.resolve('beta') == 'beta.safetensors'
+    assert sd.models.resolve('beta.safetensors [abc123]') == 'beta.safetensors'
+    assert sd.models.resolve(None) == 'alpha.safetensors'
+    assert sd.models.resolve('gamma') is None
+
+
+def test_resident_checkpoints_are_not_reloaded(sd, loads):
+    first = sd.models.get('alpha.safetensors')
+    assert sd.models.get('alpha.safetensors') is first
+    assert loads == ['alpha.safetensors']
+    assert sd.models.stats()['hits'] == 1
+
+
+def test_least_recently_used_checkpoint_is_evicted(sd, loads):
+    add_checkpoint(sd, 'gamma.safetensors')
+    sd.models.get('alpha.safetensors')
+    sd.models.get('beta.safetensors')
+    sd.models.get('alpha.safetensors')
+    sd.models.get('gamma.safetensors')
+
+    assert list(sd.models.resident) == ['alpha.safetensors', 'gamma.safetensors']
+    assert sd.models.evictions == 1
+
+
+def test_memory_budget_bounds_resident_weights_but_keeps_the_newest(sd, loads):
+    sd.models.memory_budget = 150
+    sd.models.get('alpha.safetensors')
+    sd.models.get('beta.safetensors')
+    assert list(sd.models.resident) == ['beta.safetensors']
+
+    loads.size = 500
+    add_checkpoint(sd, 'gamma.safetensors')
+    sd.models.get('gamma.safetensors')
+    assert list(sd.models.resident) == ['gamma.safetensors']
+
+
+def test_room_is_made_before_a_checkpoint_loads(sd, loads, monkeypatch):
+    sd.models.memory_budget = 250
+    for name in ('alpha.safetensors', 'beta.safetensors', 'gamma.safetensors'):
+        add_checkpoint(sd, name, size=100)
+    peaks = []
+    load_pipe = sd.load_pipe
+
+    def measured(path):
+        peaks.append((len(sd.models.resident) + 1, sd.models.resident_bytes() + os.path.getsize(path)))
+        return load_pipe(path)
+
+    monkeypatch.setattr(sd, 'load_pipe', measured)
+    for name in ('alpha', 'beta', 'gamma', 'alpha', 'beta'):
+        sd.models.get(f'{name}.safetensors')
+    assert len(peaks) == 5
+    assert all(count <= sd.models.max_resident and size <= 250 for count, size in peaks)
+    assert list(sd.models.resident) == ['alpha.safetensors', 'beta.safetensors']
+
+
+def test_pipelines_in_use_are_not_evicted(sd, loads):
+    sd.models.max_resident = 1
+    with sd.models.use('alpha.safetensors'):
+        sd.models.get('beta.safetensors')
+        assert list(sd.models.resident) == ['alpha.safetensors', 'beta.safetensors']
+    assert sd.models.in_use == {}
+    assert list(sd.models.resident) == ['beta.safetensors']
+
+
+def test_concurrent_callers_share_one_load_without_blocking_stats(sd, loads):
+    loads.gate = threading.Event()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sd.models.get('alpha.safetensors')))
+               for _ in range(3)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    assert sd.models.stats()['loading'] == ['alpha.safetensors']
+    assert sd.models.resolve('beta') == 'beta.safetensors'
+    assert time.monotonic() - started < 1
+
+    loads.gate.set()
+    for t in threads:
+        t.join(5)
+    assert loads == ['alpha.safetensors']
+    assert len(results) == 3 and all(r is results[0] for r in results)
+    assert sd.models.stats()['loading'] == []
+
+
+def test_a_failed_load_reaches_every_waiter_and_can_be_retried(sd, loads):
+    loads.gate = threading.Event()
+    loads.fail = OSError('corrupt file')
+    errors = []
+
+    def get():
+        try:
+            sd.models.get('alpha.safetensors')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=get) for _ in range(2)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    loads.gate.set()
+    for t in threads:
+        t.join(5)
+    assert len(errors) == 2
+    assert any(isinstance(e, OSError) for e in errors)
+    assert any('Loading alpha.safetensors failed' in str(e) for e in errors)
+
+    loads.gate, loads.fail = None, None
+    assert sd.models.get('alpha.safetensors')
+    assert loads == ['alpha.safetensors'] * 2
+
+
+def test_sd_models_lists_checkpoints_with_their_residency(sd, loads):
+    sd.models.get('beta.safetensors')
+    listing = sd.app.test_client().get('/sdapi/v1/sd-models').get_json()
+    assert {m['model_name']: m['loaded'] for m in listing} == {'alpha': False, 'beta': True}
+
+
+def test_options_are_read_only_by_default(sd, loads):
+    client = sd.app.test_client()
+    resp = client.post('/sdapi/v1/options', json={'sd_model_checkpoint': 'beta'})
+    assert resp.status_code == 403
+    assert 'override_settings' in resp.get_json()['error']
+    assert client.get('/sdapi/v1/options').get_json() == {'sd_model_checkpoint': 'alpha.safetensors'}
+    assert loads == []
+
+
+def test_writable_options_switch_the_default_and_preload_it(sd, loads, monkeypatch):
+    monkeypatch.setattr(sd, 'OPTIONS_WRITABLE', True)
+    client = sd.app.test_client()
+    assert client.post('/sdapi/v1/options', json={'sd_model_checkpoint': 'nope'}).status_code == 404
+
+    resp = client.post('/sdapi/v1/options', json={'sd_model_checkpoint': 'beta'})
+    assert resp.get_json() == {'sd_model_checkpoint': 'beta.safetensors'}
+    deadline = time.monotonic() + 5
+    while 'beta.safetensors' not in sd.models.resident and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert loads == ['beta.safetensors']
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+
+
+class RecordingPipeline:
+    """Stands in for StableDiffusionPipeline(**components)."""
+
+    def __init__(self, **components):
+        self.scheduler = components['scheduler']
+        self.components = components
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(images=['img'] * len(kwargs['prompt']))
+
+
+@pytest.fixture
+def base(sd, monkeypatch):
+    monkeypatch.setattr(sd, 'StableDiffusionPipeline', RecordingPipeline)
+    scheduler = sd.EulerAncestralDiscreteScheduler()
+    return SimpleNamespace(scheduler=scheduler, components={'unet': object(), 'scheduler': scheduler})
+
+
+def test_every_sampler_gets_its_own_scheduler(sd, base):
+    views = sd.build_samplers(base)
+    assert set(views) == set(sd.SCHEDULERS)
+    schedulers = [view.scheduler for view in views.values()]
+    assert len({id(s) for s in schedulers}) == len(schedulers)
+    assert base.scheduler not in schedulers
+    for name, view in views.items():
+        assert type(view.scheduler) is sd.SCHEDULERS[name][0]
+        assert view.components['unet'] is base.components['unet']
+
+
+def test_variants_carry_their_config(sd, base):
+    views = sd.build_samplers(base)
+    assert views['DPM++ 2M Karras'].scheduler.config['use_karras_sigmas'] is True
+    assert views['DDIM trailing'].scheduler.config['timestep_spacing'] == 'trailing'
+    assert views['DPM++ 2M SDE Karras'].scheduler.config['algorithm_type'] == 'sde-dpmsolver++'
+
+
+def test_building_samplers_leaves_the_base_pipeline_alone(sd, base):
+    scheduler = base.scheduler
+    sd.build_samplers(base)
+    assert base.scheduler is scheduler
+    assert base.components['scheduler'] is scheduler
+
+
+def test_unavailable_samplers_are_skipped(sd, base, monkeypatch):
+    class Broken:
+        @classmethod
+        def from_config(cls, config, **overrides):
+            raise ValueError('needs a newer diffusers')
+
+    monkeypatch.setitem(sd.SCHEDULERS, 'Broken', (Broken, {}))
+    views = sd.build_samplers(base)
+    assert 'Broken' not in views
+    assert 'Euler a' in views
+
+
+def test_generate_runs_the_requested_sampler(sd, monkeypatch):
+    views = {name: RecordingPipeline(scheduler=name) for name in ('Euler a', 'DDIM')}
+    monkeypatch.setattr(sd.models, 'get', lambda title, pin=False: views)
+
+    sd.generate([sd.Job({'sampler_name': 'DDIM', 'seed': 1})])
+    sd.generate([sd.Job({'sampler_name': 'no such sampler', 'seed': 1})])
+    assert len(views['DDIM'].calls) == 1
+    assert len(views['Euler a'].calls) == 1
+
+
+def test_samplers_endpoint_lists_the_variants(sd):
+    samplers = sd.app.test_client().get('/sdapi/v1/samplers').get_json()
+    by_name = {s['name']: s for s in samplers}
+    assert by_name['Euler Karras']['options'] == {'use_karras_sigmas': True}
+    assert set(by_name) == set(sd.SCHEDULERS)
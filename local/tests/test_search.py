@@ -0,0 +1,64 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def fts(A):
+    assert A.search_fts, 'these tests need SQLite with FTS5'
+
+
+def search(client, q):
+    return client.get('/api/search', query_string={'q': q}).get_json()['results']
+
+
+def test_fts_query_requires_every_word_and_prefixes_the_last(A):
+    assert A.fts_query('red apple') == '"red" "apple"*'
+    assert A.fts_query('"; DROP') == '"DROP"*'
+    assert A.fts_query('  ?! ') is None
+
+
+def test_messages_are_found_with_highlighted_snippets(client, conversation):
+    conversation.add('user', 'tell me about <b>tomato</b> soup recipes')
+    conversation.add('assistant', 'Nothing relevant here')
+
+    [hit] = search(client, 'tomato sou')
+    assert hit['conversation_id'] == conversation.id
+    assert hit['role'] == 'user'
+    assert 'tomato' in hit['snippet']
+    assert '<mark>tomato</mark>' in hit['snippet_html']
+    assert '&lt;b&gt;' in hit['snippet_html']
+
+
+def test_titles_are_matched(A, client, conversation):
+    with A.app.app_context():
+        A.db.session.get(A.Conversation, conversation.id).title = 'Garden planning'
+        A.db.session.commit()
+
+    [hit] = search(client, 'garden')
+    assert hit['role'] is None
+    assert hit['snippet_html'] == '<mark>Garden</mark> planning'
+
+
+def test_index_follows_updates_and_deletes(A, client, conversation):
+    message_id = conversation.add('user', 'original wording')
+    assert search(client, 'original')
+
+    with A.app.app_context():
+        A.db.session.get(A.Message, message_id).content = 'replacement wording'
+        A.db.session.commit()
+    assert search(client, 'original') == []
+    assert search(client, 'replacement')
+
+    with A.app.app_context():
+        A.db.session.delete(A.db.session.get(A.Message, message_id))
+        A.db.session.commit()
+    assert search(client, 'replacement') == []
+
+
+def test_results_are_scoped_to_the_user(make_client, client, conversation):
+    conversation.add('user', 'private zebra notes')
+    assert search(client, 'zebra')
+    assert search(make_client(), 'zebra') == []
+
+
+def test_short_queries_return_nothing(client):
+    assert search(client, 'a') == []
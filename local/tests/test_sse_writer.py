@@ -0,0 +1,108 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+
+from conftest import parse_sse
+
+
+def frames(A, writer, events, gap=0.0):
+    """The writer's chunks (decoded) for a list of events sent `gap` seconds apart."""
+    async def source():
+        for ev in events:
+            if gap:
+                await asyncio.sleep(gap)
+            if isinstance(ev, Exception):
+                raise ev
+            yield ev
+
+    async def collect():
+        return [chunk async for chunk in writer.frames(source())]
+    return asyncio.run(collect())
+
+
+def text(chunks):
+    return b''.join(chunks).decode()
+
+
+@pytest.mark.parametrize('headers, compact, gzipped', [
+    ({}, False, False),
+    ({'X-Stream-Format': 'compact'}, True, False),
+    ({'X-Stream-Format': 'Compact, gzip', 'Accept-Encoding': 'gzip, br'}, True, True),
+    ({'X-Stream-Format': 'gzip'}, False, False),  # no Accept-Encoding
+])
+def test_format_is_negotiated_by_request_headers(A, headers, compact, gzipped):
+    writer = A.SSEWriter.negotiate(headers)
+    assert (writer.compact, writer.gzip) == (compact, gzipped)
+    assert (('Content-Encoding', 'gzip') in writer.headers) == gzipped
+
+
+def test_gzip_can_be_disabled_server_side(A, monkeypatch):
+    monkeypatch.setattr(A, 'SSE_GZIP', False)
+    assert not A.SSEWriter.negotiate({'X-Stream-Format': 'gzip', 'Accept-Encoding': 'gzip'}).gzip
+
+
+def test_plain_streams_send_one_frame_per_event(A):
+    events = [{'token': 'a', 'conversation_id': 1}, {'token': 'b', 'conversation_id': 1}, {'done': True}]
+    assert text(frames(A, A.SSEWriter(), events)) == ''.join(A.sse_frame(ev) for ev in events)
+
+
+def test_compact_streams_merge_tokens_and_drop_repeated_keys(A):
+    events = [{'token': t, 'conversation_id': 7} for t in ('Hel', 'lo', ' world')] + [{'done': True}]
+    body = text(frames(A, A.SSEWriter(compact=True), events))
+    assert body == 'data: {"token":"Hello world","conversation_id":7}\n\ndata: {"done":true}\n\n'
+
+
+def test_compact_tokens_flush_by_size(A, monkeypatch):
+    monkeypatch.setattr(A, 'SSE_FLUSH_BYTES', 4)
+    events = [{'token': t, 'conversation_id': 7} for t in ('ab', 'cd', 'ef')]
+    assert parse_sse(text(frames(A, A.SSEWriter(compact=True), events))) == [
+        {'token': 'abcd', 'conversation_id': 7}, {'token': 'ef'}]
+
+
+def test_compact_tokens_flush_by_time(A, monkeypatch):
+    monkeypatch.setattr(A, 'SSE_FLUSH_MS', 10)
+    events = [{'token': t} for t in 'abc']
+    chunks = frames(A, A.SSEWriter(compact=True), events, gap=0.05)
+    assert [parse_sse(c.decode()) for c in chunks] == [[{'token': 'a'}], [{'token': 'b'}], [{'token': 'c'}]]
+
+
+def test_other_events_flush_pending_tokens_in_order(A):
+    events = [{'token': 'a'}, {'reasoning': 'r'}, {'token': 'b'}, {'status': 'x'}, {'token': 'c', 'conversation_id': 2}]
+    assert parse_sse(text(frames(A, A.SSEWriter(compact=True), events))) == [
+        {'token': 'a'}, {'reasoning': 'r'}, {'token': 'b'}, {'status': 'x'}, {'token': 'c', 'conversation_id': 2}]
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_errors_after_the_first_chunk_end_the_stream(A, compact):
+    body = text(frames(A, A.SSEWriter(compact=compact), [{'token': 'a'}, ValueError('lost backend')]))
+    assert parse_sse(body)[-1] == {'error': 'lost backend'}
+    with pytest.raises(ValueError):
+        frames(A, A.SSEWriter(compact=compact), [ValueError('bad input')])
+
+
+def test_gzip_chunks_decode_as_they_arrive(A):
+    events = [{'token': 'a'}, {'status': 'x'}, {'done': True}]
+    chunks = frames(A, A.SSEWriter(gzip=True), events)
+    inflate = zlib.decompressobj(31)
+    assert [inflate.decompress(c).decode() for c in chunks[:3]] == [A.sse_frame(ev) for ev in events]
+    assert gzip.decompress(b''.join(chunks)).decode() == ''.join(A.sse_frame(ev) for ev in events)
+
+
+def test_chat_negotiates_compact_gzip(client, upstream):
+    resp = client.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'},
+                       headers={'X-Stream-Format': 'compact, gzip', 'Accept-Encoding': 'gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert resp.headers['X-Stream-Format'] == 'compact'
+    events = parse_sse(gzip.decompress(resp.get_data()).decode())
+    assert ''.join(e.get('token', '') for e in events) == 'Hello world!'
+    assert sum('conversation_id' in e for e in events if 'token' in e) == 1
+
+
+def test_chat_without_negotiation_keeps_the_old_frames(client, upstream):
+    resp = client.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'})
+    assert 'Content-Encoding' not in resp.headers
+    tokens = [e for e in parse_sse(resp.get_data(as_text=True)) if 'token' in e]
+    assert [e['token'] for e in tokens] == ['Hel', 'lo', ' world', '!']
+    assert all('conversation_id' in e for e in tokens)
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+
+import pytest
+import sqlalchemy
+from sqlalchemy import event
+
+from conftest import parse_sse
+
+
+@pytest.fixture
+def engine(A):
+    with A.app.app_context():
+        return A.db.engine
+
+
+@pytest.fixture
+def batcher(A, tmp_path):
+    """A WriteBatcher on its own database with a one-column table `t`."""
+    engine = sqlalchemy.create_engine(f'sqlite:///{tmp_path}/writes.db')
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text('CREATE TABLE t (v INTEGER UNIQUE)'))
+    batcher = A.WriteBatcher(max_batch=8)
+    batcher.start(engine)
+    batcher.engine = engine
+    batcher.commits = []
+    event.listen(engine, 'commit', lambda conn: batcher.commits.append(1))
+    return batcher
+
+
+def hold(batcher):
+    """Occupy the writer thread until the returned event is set."""
+    running, release = threading.Event(), threading.Event()
+    batcher.submit(lambda conn: running.set() or release.wait(5))
+    assert running.wait(5)
+    return release
+
+
+def insert(value):
+    def write(conn):
+        conn.execute(sqlalchemy.text('INSERT INTO t VALUES (:v)'), {'v': value})
+        return value
+    return write
+
+
+def rows(batcher):
+    with batcher.engine.connect() as conn:
+        return sorted(v for (v,) in conn.execute(sqlalchemy.text('SELECT v FROM t')))
+
+
+def test_connections_use_wal_and_the_configured_pragmas(A, engine):
+    with engine.connect() as conn:
+        pragma = lambda name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()  # noqa: E731
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('busy_timeout') == A.SQLITE_BUSY_TIMEOUT_MS
+        assert pragma('cache_size') == -A.SQLITE_CACHE_MB * 1024
+
+
+def test_hot_path_indexes_exist(engine):
+    inspector = sqlalchemy.inspect(engine)
+    indexes = {table: {i['name']: i['column_names'] for i in inspector.get_indexes(table)}
+               for table in ('message', 'conversation', 'generated_image')}
+    assert indexes['message']['ix_message_conversation_created'] == ['conversation_id', 'created_at']
+    assert indexes['conversation']['ix_conversation_user_updated'] == ['user_id', 'updated_at']
+    assert indexes['generated_image']['ix_generated_image_user_created'] == ['user_id', 'created_at']
+
+
+def test_queued_writes_share_a_transaction(batcher):
+    release = hold(batcher)
+    futures = [batcher.submit(insert(i)) for i in range(5)]
+    release.set()
+    assert [f.result(5) for f in futures] == list(range(5))
+    assert len(batcher.commits) == 2  # the held batch, then all five
+    assert rows(batcher) == list(range(5))
+
+
+def test_batches_are_capped(batcher):
+    release = hold(batcher)
+    futures = [batcher.submit(insert(i)) for i in range(10)]
+    release.set()
+    for f in futures:
+        f.result(5)
+    assert len(batcher.commits) == 3  # the held batch, then 8 and 2
+
+
+def test_a_failing_write_does_not_sink_its_batch(batcher):
+    release = hold(batcher)
+    good, duplicate, other = batcher.submit(insert(1)), batcher.submit(insert(1)), batcher.submit(insert(2))
+    release.set()
+    assert good.result(5) == 1 and other.result(5) == 2
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        duplicate.result(5)
+    assert rows(batcher) == [1, 2]
+
+
+def test_arun_awaits_the_write(batcher):
+    assert asyncio.run(batcher.arun(insert(7))) == 7
+
+
+def test_a_chat_turn_commits_at_most_twice(client, upstream, engine):
+    commits = []
+    listener = lambda conn: commits.append(1)  # noqa: E731
+    client.post('/api/chat', json={'message': 'warm up'}).get_data()
+    event.listen(engine, 'commit', listener)
+    try:
+        events = parse_sse(client.post('/api/chat', json={'message': 'hi'}).get_data(as_text=True))
+    finally:
+        event.remove(engine, 'commit', listener)
+    assert events[-1]['done'] is True
+    assert len(commits) <= 2
@@ -0,0 +1,95 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+import pytest
+
+from conftest import parse_sse
+
+
+def test_iterate_yields_items_in_order(A):
+    async def numbers():
+        for i in range(5):
+            await asyncio.sleep(0)
+            yield i
+
+    assert list(A.engine.iterate(numbers())) == [0, 1, 2, 3, 4]
+
+
+def test_iterate_reraises_errors_in_the_consumer(A):
+    async def broken():
+        yield 1
+        raise ValueError('upstream broke')
+
+    items = A.engine.iterate(broken())
+    assert next(items) == 1
+    with pytest.raises(ValueError, match='upstream broke'):
+        next(items)
+
+
+def test_closing_the_iterator_closes_the_async_side(A):
+    closed = []
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield 'x'
+        finally:
+            closed.append(True)
+
+    items = A.engine.iterate(endless())
+    next(items)
+    items.close()
+    deadline = time.monotonic() + 2
+    while not closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert closed
+
+
+def test_a_stalled_consumer_stalls_the_producer(A, monkeypatch):
+    monkeypatch.setattr(A, 'ENGINE_READ_AHEAD', 3)
+    produced = []
+
+    async def fast():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    items = A.engine.iterate(fast())
+    next(items)
+    time.sleep(0.2)
+    assert len(produced) <= 3 + 2  # read-ahead slots, the item in hand and the one awaiting a slot
+    assert sum(1 for _ in items) == 99
+
+
+def test_chat_streams_tokens_over_wsgi(client, upstream):
+    resp = client.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'})
+    events = parse_sse(resp.get_data(as_text=True))
+    assert ''.join(e.get('token', '') for e in events) == 'Hello world!'
+    assert events[-1]['done'] is True
+
+
+def test_app_stream_route_rejects_bad_input_before_streaming(client):
+    resp = client.post('/api/apps/translator/run', json={'text': ''})
+    assert resp.status_code == 400
+    assert resp.get_json() == {'error': 'No text'}
+
+
+def test_chat_and_app_routes_stream_under_asgi(A, upstream):
+    async def run():
+        transport = httpx.ASGITransport(app=A.asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as c:
+            await c.post('/register', data={'username': f'asgi-{uuid.uuid4().hex[:8]}', 'password': 'pw1234'})
+            chat = await c.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'})
+            app_run = await c.post('/api/apps/translator/run', json={'text': 'hola'})
+            anonymous = await httpx.AsyncClient(transport=transport, base_url='http://test').post(
+                '/api/chat', json={'message': 'hi'})
+        return chat, app_run, anonymous
+
+    chat, app_run, anonymous = asyncio.run(run())
+    assert chat.headers['content-type'].startswith('text/event-stream')
+    assert ''.join(e.get('token', '') for e in parse_sse(chat.text)) == 'Hello world!'
+    assert parse_sse(app_run.text)[-1] == {'done': True}
+    assert anonymous.status_code == 302
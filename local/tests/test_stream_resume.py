@@ -0,0 +1,138 @@
+import asyncio
+import contextlib
+import json
+import time
+
+from conftest import parse_sse
+
+RESUME = {'X-Stream-Id': 'r1', 'X-Stream-Resume': '1'}
+
+
+def frames(text):
+    """(id, data) for each SSE frame."""
+    out = []
+    for block in text.split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n') if ': ' in line)
+        if 'data' in lines:
+            out.append((lines.get('id'), json.loads(lines['data'])))
+    return out
+
+
+def follow(gen, after=0, limit=None):
+    async def collect():
+        events = []
+        async with contextlib.aclosing(gen.follow(after)) as followed:  # leaving early detaches now
+            async for ev in followed:
+                events.append((getattr(ev, 'id', None), dict(ev)))
+                if limit and len(events) == limit:
+                    break
+        return events
+    return collect()
+
+
+async def tokens(n, delay=0.0, closed=None):
+    try:
+        for i in range(1, n + 1):
+            await asyncio.sleep(delay)
+            yield {'token': f't{i}'}
+        yield {'done': True}
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+def test_followers_replay_after_their_last_event(A):
+    async def run():
+        gen = A.Generations().start(1, 's', tokens(3))
+        whole = await follow(gen)
+        resumed = await follow(gen, after=gen.parse_event_id('s:2'))
+        return whole, resumed
+
+    whole, resumed = asyncio.run(run())
+    assert whole == [('s:1', {'token': 't1'}), ('s:2', {'token': 't2'}), ('s:3', {'token': 't3'}),
+                     ('s:4', {'done': True})]
+    assert resumed == whole[2:]
+
+
+def test_event_ids_from_other_streams_replay_everything(A):
+    gen = A.Generation(A.Generations(), (1, 's'), None)
+    assert gen.parse_event_id('other:5') == 0
+    assert gen.parse_event_id('s:x') == 0
+    assert gen.parse_event_id(None) == 0
+    assert gen.parse_event_id('s:7') == 7
+
+
+def test_followers_behind_the_buffer_get_a_resync(A, monkeypatch):
+    monkeypatch.setattr(A, 'STREAM_BUFFER_EVENTS', 3)
+
+    async def run():
+        gen = A.Generations().start(1, 's', tokens(5))
+        await follow(gen)
+        return await follow(gen, after=1)
+
+    assert asyncio.run(run()) == [
+        (None, {'resync': {'text': 't1t2t3', 'reasoning': ''}}),
+        ('s:4', {'token': 't4'}), ('s:5', {'token': 't5'}), ('s:6', {'done': True})]
+
+
+def test_detached_generations_run_through_the_grace_period(A, monkeypatch):
+    monkeypatch.setattr(A, 'STREAM_RESUME_GRACE', 0.3)
+
+    async def run():
+        gen = A.Generations().start(1, 's', tokens(4, delay=0.02))
+        first = await follow(gen, limit=1)
+        await asyncio.sleep(0.15)
+        return first, await follow(gen, after=1)
+
+    first, rest = asyncio.run(run())
+    assert first + rest == [(f's:{i}', {'token': f't{i}'}) for i in range(1, 5)] + [('s:5', {'done': True})]
+
+
+def test_abandoned_generations_are_cancelled_after_the_grace_period(A, monkeypatch):
+    monkeypatch.setattr(A, 'STREAM_RESUME_GRACE', 0.05)
+    closed = []
+
+    async def run():
+        registry = A.Generations()
+        gen = registry.start(1, 's', tokens(100, delay=0.02, closed=closed))
+        await follow(gen, limit=1)
+        assert registry.stats() == {'live': 1, 'detached': 1}
+        await asyncio.sleep(0.3)
+        return gen, registry
+
+    gen, registry = asyncio.run(run())
+    assert closed == [True]
+    assert gen.finished and gen.seq < 100
+    assert registry.get(1, 's') is None
+
+
+def test_chat_resumes_from_last_event_id(client, upstream):
+    upstream.tokens = [f't{i} ' for i in range(30)]
+    upstream.delay = 0.03
+    resp = client.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'}, headers=RESUME, buffered=False)
+    chunks = iter(resp.response)
+    seen = frames(next(chunks).decode())
+    resp.close()  # the connection drops mid-reply
+    time.sleep(0.1)
+
+    resumed = client.get('/api/streams/r1', headers={'Last-Event-ID': seen[-1][0]})
+    replay = frames(resumed.get_data(as_text=True))
+    events = [ev for _, ev in seen + replay]
+    assert ''.join(ev.get('token', '') for ev in events) == ''.join(upstream.tokens)
+    assert events[-1]['done'] is True
+    assert [path for _, path, _ in upstream.requests].count('/api/chat') == 1
+    assert upstream.aborted == 0
+
+
+def test_resume_is_opt_in(client, upstream):
+    body = client.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'},
+                       headers={'X-Stream-Id': 'r2'}).get_data(as_text=True)
+    assert all(event_id is None for event_id, _ in frames(body))
+    assert client.get('/api/streams/r2').status_code == 404
+
+
+def test_streams_resume_only_for_their_owner(make_client, client, upstream):
+    client.post('/api/chat', json={'message': 'hi', 'model': 'llama3.2'}, headers=RESUME).get_data()
+    assert make_client().get('/api/streams/r1').status_code == 404
+    replay = parse_sse(client.get('/api/streams/r1').get_data(as_text=True))
+    assert ''.join(e.get('token', '') for e in replay) == 'Hello world!'
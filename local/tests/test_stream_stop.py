@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+
+def eventually(check, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not check() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return check()
+
+
+@pytest.fixture
+def slow(upstream):
+    upstream.tokens = [f't{i} ' for i in range(100)]
+    upstream.delay = 0.05
+    return upstream
+
+
+def open_stream(client, path, body, stream_id='s1'):
+    """Start an SSE request and read its first event; returns (response, body iterator, first event)."""
+    resp = client.post(path, json=body, headers={'X-Stream-Id': stream_id}, buffered=False)
+    chunks = iter(resp.response)
+    first = next(chunks).decode()
+    return resp, chunks, json.loads(first[first.index('data: ') + 6:])
+
+
+def rest(chunks):
+    return [json.loads(line[6:]) for line in b''.join(chunks).decode().split('\n') if line.startswith('data: ')]
+
+
+def assistant_messages(A, convo_id):
+    with A.app.app_context():
+        return [m.content for m in A.Message.query.filter_by(conversation_id=convo_id, role='assistant')]
+
+
+def test_stop_ends_the_chat_and_keeps_the_partial_reply(A, client, slow):
+    resp, chunks, first = open_stream(client, '/api/chat', {'message': 'hi', 'model': 'llama3.2'})
+    assert client.post('/api/streams/s1/stop').get_json() == {'success': True}
+
+    events = rest(chunks)
+    resp.close()
+    assert events[-1]['done'] is True and events[-1]['stopped'] is True
+    tokens = [first['token']] + [e['token'] for e in events if 'token' in e]
+    assert len(tokens) < 100
+    assert assistant_messages(A, first['conversation_id']) == [''.join(tokens)]
+    assert eventually(lambda: slow.aborted == 1)
+    assert len(A.active_streams) == 0
+
+
+def test_stop_only_reaches_the_owners_streams(make_client, client, slow):
+    resp, chunks, _ = open_stream(client, '/api/chat', {'message': 'hi', 'model': 'llama3.2'})
+    assert make_client().post('/api/streams/s1/stop').status_code == 404
+    assert client.post('/api/streams/other/stop').status_code == 404
+    client.post('/api/streams/s1/stop')
+    rest(chunks)
+    resp.close()
+
+
+def test_app_streams_can_be_stopped(client, slow):
+    resp, chunks, first = open_stream(client, '/api/apps/translator/run', {'text': 'hola'})
+    assert 'token' in first
+    client.post('/api/streams/s1/stop')
+    assert rest(chunks)[-1] == {'done': True, 'stopped': True}
+    resp.close()
+    assert eventually(lambda: slow.aborted == 1)
+
+
+def test_disconnect_aborts_the_upstream_and_keeps_the_partial_reply(A, client, slow):
+    resp, chunks, first = open_stream(client, '/api/chat', {'message': 'hi', 'model': 'llama3.2'})
+    next(chunks)
+    resp.close()
+    assert eventually(lambda: slow.aborted == 1)
+    assert eventually(lambda: assistant_messages(A, first['conversation_id']))
+    [saved] = assistant_messages(A, first['conversation_id'])
+    assert saved.startswith('t0 t1 ') and len(saved) < len(''.join(slow.tokens))
+
+
+def test_stoppable_closes_the_interrupted_generator(A):
+    closed = []
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield 'x'
+        finally:
+            closed.append(True)
+
+    async def run():
+        handle = A.StreamHandle(1, 's')
+        items = []
+        async for item in A.stoppable(endless(), handle):
+            items.append(item)
+            if len(items) == 3:
+                handle.stop()
+        return items
+
+    assert asyncio.run(run()) == ['x'] * 3
+    assert closed == [True]
@@ -0,0 +1,107 @@
+import codecs
+
+import pytest
+
+
+@pytest.fixture
+def extract(A):
+    """extract(html, max_chars=3000, chunk=None) -> text, feeding `chunk` characters at a time."""
+    def run(html, max_chars=3000, chunk=None):
+        parser = A.TextExtractor(max_chars)
+        chunk = chunk or max(len(html), 1)
+        for i in range(0, len(html), chunk):
+            parser.feed(html[i:i + chunk])
+        parser.close()
+        return parser.text()
+    return run
+
+
+def test_scripts_styles_and_chrome_are_dropped(extract):
+    html = """<html><head><title>T</title><style>p {color: red}</style></head><body>
+        <nav><a href="/">Home</a></nav><div class="cookie-banner">We use cookies</div>
+        <p>Real content.</p><script>var x = "<p>not text</p>";</script>
+        <footer>Copyright</footer></body></html>"""
+    assert extract(html) == 'Real content.'
+
+
+def test_hidden_elements_are_dropped(extract):
+    assert extract('<p>shown</p><div hidden>gone</div><span aria-hidden="true">gone</span>') == 'shown'
+
+
+def test_main_content_is_preferred_when_long_enough(extract):
+    body = 'word ' * 60
+    html = f'<div>intro text</div><article>{body}</article><div>outro</div>'
+    assert extract(html) == body.strip()
+    assert extract('<div>intro</div><main>short</main>') == 'intro short'
+
+
+def test_text_stops_at_max_chars(A, extract):
+    assert extract('<p>' + 'abcd ' * 100 + '</p>', max_chars=12) == 'abcd abcd ab'
+
+    parser = A.TextExtractor(max_chars=10)
+    parser.feed('<main><p>' + 'x' * 20)
+    assert parser.done
+
+
+def test_chunked_input_gives_the_same_text(extract):
+    html = '<div class="sidebar">menu</div><main><p>Caf&eacute; <b>bold</b> text</p><script>x</script></main>'
+    assert {extract(html, chunk=n) for n in (1, 3, 7, len(html))} == {'Café bold text'}
+
+
+# Implicitly closed elements: an element skipped for its attributes must end
+# where the browser would end it, not swallow the rest of the page.
+
+def test_skipped_list_item_ends_at_the_next_item(extract):
+    html = '<ul><li>one<li class="share">Share this<li>two</ul><p>After the list stays</p>'
+    assert extract(html) == 'one Share this two After the list stays'
+
+
+def test_skipped_element_ends_with_its_parent(extract):
+    html = '<div><section class="promo"><p>Buy now</div><p>Body text after promo</p>'
+    assert extract(html) == 'Body text after promo'
+
+
+def test_optional_end_tags_are_never_skipped_for_attributes(extract):
+    html = '<div><p class="promo">Buy now<div>Body text after promo</div></div>'
+    assert extract(html) == 'Buy now Body text after promo'
+
+
+def test_unclosed_head_ends_at_body(extract):
+    assert extract('<html><head><title>Title<body><p>Hello body</p>') == 'Hello body'
+
+
+def test_unclosed_children_of_skipped_elements_do_not_leak(extract):
+    html = '<aside class="sidebar"><ul><li>link<li>link</aside><p>kept</p><script>x</script><p>end</p>'
+    assert extract(html) == 'kept end'
+
+
+def test_stray_end_tags_are_ignored(extract):
+    assert extract('<p>a</span></div>b</p><nav>menu</nav>c') == 'a b c'
+
+
+@pytest.mark.parametrize('content_type, body, expected', [
+    ('text/html; charset=iso-8859-1', 'café'.encode('latin-1'), 'café'),
+    ('text/html', b'<meta charset="windows-1252">' + 'naïve “quotes”'.encode('cp1252'), 'naïve “quotes”'),
+    ('text/html; charset=latin-1', codecs.BOM_UTF8 + 'über'.encode(), 'über'),
+    ('text/plain', 'ütf-8 plain'.encode(), 'ütf-8 plain'),
+])
+def test_page_reader_decodes_the_right_charset(A, content_type, body, expected):
+    reader = A.PageReader(content_type, max_chars=100)
+    reader.feed(body)
+    assert reader.text() == expected
+
+
+def test_page_reader_handles_characters_split_across_chunks(A, monkeypatch):
+    monkeypatch.setattr(A, 'SNIFF_BYTES', 4)
+    data = ('<p>' + 'é€' * 50 + '</p>').encode()
+    reader = A.PageReader('text/html; charset=utf-8', max_chars=1000)
+    for i in range(0, len(data), 5):
+        reader.feed(data[i:i + 5])
+    assert reader.text() == 'é€' * 50
+
+
+def test_page_reader_ignores_binary_bodies(A):
+    reader = A.PageReader('image/png', max_chars=100)
+    assert reader.done
+    reader.feed(b'\x89PNG')
+    assert reader.text() == ''
@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import pytest
+
+
+@pytest.fixture
+def cache(A):
+    return A.WebCache(max_entries=3, max_bytes=2**20, stale=60)
+
+
+def test_entries_expire_after_their_ttl(cache):
+    cache.put('a', 'value', ttl=60)
+    cache.put('b', 'value', ttl=-1)
+    assert cache.get('a') == 'value'
+    assert cache.get('b') is None
+    assert 'b' not in cache.entries
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted_by_count(cache):
+    for key in 'abc':
+        cache.put(key, key, ttl=60)
+    cache.get('a')
+    cache.put('d', 'd', ttl=60)
+    assert list(cache.entries) == ['c', 'a', 'd']
+    assert cache.evictions == 1
+
+
+def test_entries_are_evicted_by_size(A):
+    cache = A.WebCache(max_entries=100, max_bytes=250, stale=60)
+    for key in 'abc':
+        cache.put(key, 'x' * 100, ttl=60)
+    assert list(cache.entries) == ['b', 'c']
+    assert cache.size <= 250
+
+
+def test_expired_entries_with_validators_are_kept_for_revalidation(cache):
+    cache.put('page', 'text', ttl=-1, etag='"v1"')
+    entry, fresh = cache.lookup('page')
+    assert entry.etag == '"v1"' and not fresh
+    assert cache.refresh('page', entry, 60) == 'text'
+    assert cache.get('page') == 'text'
+    assert cache.revalidated == 1
+
+
+def test_cache_keys_are_normalized(A):
+    assert A.search_cache_key('  Rust   LIFETIMES ', 5) == A.search_cache_key('rust lifetimes', 5)
+    assert A.page_cache_key('HTTPS://Example.com:443/a?b=2&utm_source=x&a=1#top', 3000) == \
+        A.page_cache_key('https://example.com/a?a=1&b=2', 3000)
+    assert A.page_cache_key('http://example.com:8080/', 3000) != A.page_cache_key('http://example.com/', 3000)
+
+
+def test_urls_without_a_cache_key_are_skipped(A):
+    assert A.fetch_page_text('http://[bad') == ''
+    assert asyncio.run(A.afetch_page_text('http://example.com:port/')) == ''
+
+
+def test_pages_are_served_from_the_cache(A, web):
+    url = web.page('/doc', '<p>cached text</p>')
+    assert A.fetch_page_text(url + '?utm_source=feed') == 'cached text'
+    assert A.fetch_page_text(url) == 'cached text'
+    assert len(web.requests) == 1
+
+
+def test_stale_pages_are_revalidated_with_a_conditional_request(A, web, monkeypatch):
+    url = web.page('/doc', '<p>cached text</p>', ETag='"v1"')
+    monkeypatch.setattr(A, 'PAGE_CACHE_TTL', -1)  # expires at once, kept for revalidation
+    A.fetch_page_text(url)
+    monkeypatch.setattr(A, 'PAGE_CACHE_TTL', 60)
+
+    assert A.fetch_page_text(url) == 'cached text'
+    assert web.requests[-1][1]['If-None-Match'] == '"v1"'
+    assert A.web_cache.revalidated == 1
+    assert A.fetch_page_text(url) == 'cached text'
+    assert len(web.requests) == 2
+
+
+def test_no_store_pages_are_not_cached(A, web):
+    url = web.page('/private', '<p>secret</p>', Cache_Control='no-store')
+    A.fetch_page_text(url)
+    A.fetch_page_text(url)
+    assert len(web.requests) == 2
+
+
+def test_search_results_are_cached_but_errors_are_not(A, web, monkeypatch):
+    calls = []
+
+    def search(query, num_results):
+        calls.append(query)
+        return [{'title': 'Search error' if 'fail' in query else 'Result', 'url': '', 'snippet': ''}]
+
+    monkeypatch.setattr(A, 'search_duckduckgo', search)
+    A.web_search('Python GIL')
+    A.web_search('python  gil')
+    A.web_search('fail')
+    A.web_search('fail')
+    assert calls == ['Python GIL', 'fail', 'fail']
+
+
+def test_persisted_entries_survive_a_restart(A, web):
+    with A.app.app_context():
+        engine = A.db.engine
+    first = A.WebCache(max_entries=10, max_bytes=2**20, stale=60)
+    first.persist(engine)
+    key = f'page:test:{time.time()}'
+    first.put(key, 'kept', ttl=60, etag='"e"')
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        second = A.WebCache(max_entries=10, max_bytes=2**20, stale=60)
+        second.persist(engine)
+        if second.get(key):
+            break
+        time.sleep(0.05)
+    assert second.get(key) == 'kept'
+    assert second.lookup(key)[0].etag == '"e"'